@@ -0,0 +1,95 @@
+"""
+Garment catalog endpoints
+"""
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+import hashlib
+import time
+from typing import Optional
+from app.core.config import settings
+from app.models.schemas import CatalogSizeRequest, CatalogSizeResponse, GarmentListResponse
+from app.services.catalog_service import get_catalog_service
+from app.services.garment_assets import garment_assets
+from app.services.ml.catalog_sizes import get_catalog_size_index
+from app.services.person_sessions import person_sessions
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+catalog_service = get_catalog_service()
+catalog_size_index = get_catalog_size_index()
+catalog_service.add_listener(catalog_size_index.reload)
+
+
+@router.get("", response_model=GarmentListResponse)
+async def list_garments(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None, description="Filter by category (dress, shirt, ...)"),
+    gender: Optional[str] = Query(None, description="Filter by gender"),
+    size: Optional[str] = Query(None, description="Only garments available in this size"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(settings.CATALOG_PAGE_SIZE, ge=1, le=settings.CATALOG_MAX_PAGE_SIZE),
+    image_width: int = Query(settings.GARMENT_GALLERY_WIDTH, ge=16, le=4096,
+                             description="Display width; picks the smallest thumbnail that fits")
+):
+    """
+    List catalog garments with filters, pagination and facet counts
+    
+    Each garment gets a 'thumbnail' URL for the gallery. Responses carry an
+    ETag derived from the catalog and derivative versions and the query;
+    send it back in If-None-Match to get 304 Not Modified.
+    """
+    result = catalog_service.query(
+        category=category, gender=gender, size=size, page=page, page_size=page_size
+    )
+    result['items'] = [
+        {**item, 'thumbnail': garment_assets.gallery_url(item['image'], image_width)}
+        if item.get('image') else item
+        for item in result['items']
+    ]
+    
+    query_hash = hashlib.sha1(
+        f"{garment_assets.version}:{sorted(request.query_params.multi_items())}".encode()
+    ).hexdigest()[:8]
+    etag = f'"{result.pop("version")}-{query_hash}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return result
+
+
+@router.post("/sizes", response_model=CatalogSizeResponse)
+async def recommend_catalog_sizes(request: CatalogSizeRequest):
+    """
+    Recommend a size of every catalog garment for one person
+    
+    Pass the person_id returned in a try-on's metadata, or body measurements
+    in inches. No images are processed.
+    """
+    start_time = time.time()
+    
+    if request.measurements:
+        measurements = request.measurements
+    elif request.person_id:
+        measurements = person_sessions.get(request.person_id)
+        if measurements is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No measurements for person {request.person_id} (expired or unknown)"
+            )
+    else:
+        raise HTTPException(status_code=422, detail="Provide person_id or measurements")
+    
+    catalog_service.refresh()  # Re-indexes sizes if clothes.json changed
+    recommendations = catalog_size_index.recommend(measurements)
+    
+    return CatalogSizeResponse(
+        status="success",
+        time_taken=time.time() - start_time,
+        measurements=measurements,
+        recommendations=recommendations
+    )
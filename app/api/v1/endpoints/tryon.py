@@ -1,16 +1,30 @@
 """
 Try-on endpoints
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+import asyncio
+import contextvars
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header, Query, Response
 from datetime import datetime
+import os
 import uuid
 from pathlib import Path
+from typing import Optional
+from PIL import Image
 from app.models.schemas import TryOnResponse
-from app.services.ml.tryon_service import TryOnService
+from app.services.ml.tryon_service import get_tryon_service
 from app.services.ml.api_tryon_service import APITryOnService
-from app.utils.file_handler import save_upload_file, validate_file
-from app.utils.image_processor import load_image
+from app.services.ml.hedging import HedgedExecutor
+from app.services.person_sessions import person_sessions
+from app.services.catalog_service import get_catalog_service
+from app.services.garment_assets import garment_assets
+from app.utils.file_handler import save_upload_file, validate_file, delete_file
+from app.utils.image_processor import load_image, save_image
 from app.core.config import settings
+from app.core.timing import start_timer, stage
+from app.core.tracing import finish_trace, start_trace
+from app.core.profiling import RequestProfile, requested as profiling_requested
+from app.core.memory import estimate_request_bytes, memory_admission
+from app.core.metrics import metrics
 from app.core.exceptions import ImageProcessingError, PoseDetectionError
 import logging
 
@@ -18,26 +32,63 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 api_service = APITryOnService(provider="pixelcut")
-tryon_service = TryOnService()
+tryon_service = get_tryon_service()
 api_service = APITryOnService(provider="mock")  # Using mock for now (free)
+hedged_executor = HedgedExecutor(provider=api_service.provider)
+catalog_service = get_catalog_service()
+
+requests_total = metrics.counter(
+    "tryon_requests_total",
+    "Try-on requests by algorithm (basic, basic_fallback, api_*) and outcome",
+    ["algorithm", "status"]
+)
+request_latency = metrics.histogram(
+    "tryon_request_seconds",
+    "End-to-end try-on request latency",
+    ["algorithm"]
+)
+in_flight = metrics.gauge(
+    "tryon_requests_in_flight",
+    "Try-on requests currently being processed",
+    multiprocess_mode="sum"
+)
 
 
 @router.post("/process", response_model=TryOnResponse)
 async def process_tryon(
+    response: Response,
     user_image: UploadFile = File(..., description="User photo"),
-    cloth_image: UploadFile = File(..., description="Clothing image"),
+    cloth_image: Optional[UploadFile] = File(default=None, description="Clothing image"),
     use_api: str = Form(default="false"),
-    clothing_type: str = Form(default="", description="Type of clothing (dress, shirt, top, etc.)")
+    clothing_type: str = Form(default="", description="Type of clothing (dress, shirt, top, etc.)"),
+    garment_id: str = Form(default="", description="Catalog garment id (instead of cloth_image)"),
+    x_profile: Optional[str] = Header(default=None, include_in_schema=False),
+    profile: Optional[str] = Query(default=None, include_in_schema=False)
 ):
     """
     Process virtual try-on with size recommendation
     
     Upload user photo and clothing image to generate try-on result.
+    For catalog garments send garment_id instead of cloth_image; the smallest
+    prebuilt working-size derivative that covers the photo is used.
     Set use_api=true for better quality (may have costs with commercial APIs)
     Provide clothing_type for size recommendations (dress, shirt, top, tshirt, blouse, jacket, blazer)
+    
+    A per-stage time breakdown (ms) is returned in the Server-Timing header
+    and metadata.timings unless REQUEST_TIMING_ENABLED is off.
+    
+    Sending PROFILING_SECRET in the X-Profile header or ?profile= profiles the
+    request; the saved profile's id is returned in metadata.profile_id.
     """
     import time
     start_time = time.time()
+    timer = start_timer()
+    trace = start_trace("tryon.process", use_api=use_api, garment_id=garment_id or None)
+    algorithm_used = ""
+    status = "error"
+    in_flight.inc()
+    profiler = RequestProfile() if profiling_requested(x_profile, profile) else None
+    reservation = 0
     
     try:
         logger.info(f"=== Try-on Request Received ===")
@@ -45,13 +96,41 @@ async def process_tryon(
         logger.info(f"Cloth image: {cloth_image.filename if cloth_image else 'None'}, content_type: {cloth_image.content_type if cloth_image else 'None'}")
         logger.info(f"Use API: {use_api}")
         
+        if cloth_image is None and not garment_id:
+            raise HTTPException(status_code=422, detail="Provide cloth_image or garment_id")
+        
         # Validate files
-        validate_file(user_image)
-        validate_file(cloth_image)
+        with stage("validate"):
+            validate_file(user_image)
+            if cloth_image is not None:
+                validate_file(cloth_image)
         
         # Save uploaded files
-        user_id, user_path = await save_upload_file(user_image, settings.UPLOAD_DIR)
-        cloth_id, cloth_path = await save_upload_file(cloth_image, settings.UPLOAD_DIR)
+        with stage("upload"):
+            user_id, user_path = await save_upload_file(user_image, settings.UPLOAD_DIR)
+            if cloth_image is not None:
+                cloth_id, cloth_path = await save_upload_file(cloth_image, settings.UPLOAD_DIR)
+        if cloth_image is None:
+            with stage("catalog"):
+                garment = catalog_service.get(garment_id)
+                if garment is None or not garment.get('image'):
+                    raise HTTPException(status_code=404, detail=f"Unknown garment: {garment_id}")
+                # The cloth is scaled to the torso region, which is never larger than the photo
+                try:
+                    with Image.open(user_path) as person:
+                        person_w, person_h = person.size
+                except OSError as e:
+                    raise ImageProcessingError(f"Error loading image: {e}")
+                cloth_path = garment_assets.working_path(garment['image'], person_w, person_h)
+        
+        # Hold or reject the request if its working memory would exceed the budget
+        with stage("admission"):
+            try:
+                with Image.open(user_path) as person, Image.open(cloth_path) as cloth:
+                    estimate = estimate_request_bytes(person.size, cloth.size)
+            except OSError:
+                estimate = 0  # Unreadable image: let the pipeline report it
+            reservation = await memory_admission.acquire(estimate)
         
         # Generate output path
         result_id = str(uuid.uuid4())
@@ -65,21 +144,72 @@ async def process_tryon(
         # Convert string to boolean
         use_api_bool = use_api.lower() in ('true', '1', 'yes')
         
+        clothing_type_clean = clothing_type.strip() if clothing_type else None
+        
         if use_api_bool and api_service.is_available():
-            try:
-                # Use API service (better quality)
-                logger.info(f"Using API service: {api_service.provider}")
-                
-                # Load images
-                from app.utils.image_processor import load_image, save_image
+            logger.info(f"Using API service: {api_service.provider}")
+            
+            def run_api():
                 user_img = load_image(user_path)
                 cloth_img = load_image(cloth_path)
-                
-                # Process with API
-                result_img = api_service.process_tryon(user_img, cloth_img)
+                return api_service.process_tryon(user_img, cloth_img), user_img, cloth_img
+            
+            # Local branch writes to its own file so a late loser can't clobber the result
+            local_output_path = output_path.with_name(f"tryon_local_{result_id}.jpg")
+            
+            def run_local():
+                return tryon_service.process(
+                    user_path,
+                    cloth_path,
+                    str(local_output_path),
+                    clothing_type=clothing_type_clean
+                )
+            
+            if profiler is not None:
+                # The branches run on hedge worker threads
+                run_api = profiler.wrap(run_api)
+                run_local = profiler.wrap(run_local)
+            
+            def discard(branch, value):
+                if branch == "local":
+                    delete_file(value['output_path'])
+            
+            with stage("api"):
+                if settings.HEDGE_ENABLED:
+                    # A losing branch keeps running (and using memory) after we
+                    # answer, so the reservation is released once every branch stopped
+                    loop = asyncio.get_running_loop()
+                    held, reservation = reservation, 0
+                    
+                    def settled():
+                        try:
+                            loop.call_soon_threadsafe(
+                                lambda: asyncio.ensure_future(memory_admission.release(held))
+                            )
+                        except RuntimeError:
+                            pass  # Loop already closed (shutdown)
+                    
+                    hedge = await hedged_executor.run(
+                        run_api, run_local, on_discard=discard, on_settled=settled
+                    )
+                else:
+                    # Sequential: wait for the API, then fall back. Both block
+                    # (rate-limit waits, spend file, pipeline), so they run off the loop
+                    loop = asyncio.get_running_loop()
+                    try:
+                        result = await loop.run_in_executor(None, contextvars.copy_context().run, run_api)
+                        hedge = {'branch': 'remote', 'result': result, 'hedged': False}
+                    except Exception as e:
+                        logger.warning(f"API service failed, falling back to basic: {e}")
+                        result = await loop.run_in_executor(None, contextvars.copy_context().run, run_local)
+                        hedge = {'branch': 'local', 'result': result, 'hedged': True}
+            
+            if hedge['branch'] == "remote":
+                result_img, user_img, cloth_img = hedge['result']
                 
                 # Save result
-                save_image(result_img, str(output_path))
+                with stage("encode"):
+                    save_image(result_img, str(output_path))
                 
                 algorithm_used = f"api_{api_service.provider}"
                 
@@ -89,29 +219,23 @@ async def process_tryon(
                     "person_size": f"{user_img.shape[1]}x{user_img.shape[0]}",
                     "cloth_size": f"{cloth_img.shape[1]}x{cloth_img.shape[0]}"
                 }
-                
-            except Exception as e:
-                logger.warning(f"API service failed, falling back to basic: {e}")
-                # Fallback to basic
-                clothing_type_clean = clothing_type.strip() if clothing_type else None
+            else:
+                result = hedge['result']
+                os.replace(result['output_path'], output_path)
+                metadata = result['metadata']
+                size_recommendation = result.get('size_recommendation')
+                algorithm_used = "basic_fallback"
+            
+            metadata['hedged'] = hedge['hedged']
+        else:
+            # Use basic algorithm with size recommendation
+            with stage("pipeline"):
                 result = tryon_service.process(
                     user_path,
                     cloth_path,
                     str(output_path),
                     clothing_type=clothing_type_clean
                 )
-                metadata = result['metadata']
-                size_recommendation = result.get('size_recommendation')
-                algorithm_used = "basic_fallback"
-        else:
-            # Use basic algorithm with size recommendation
-            clothing_type_clean = clothing_type.strip() if clothing_type else None
-            result = tryon_service.process(
-                user_path,
-                cloth_path,
-                str(output_path),
-                clothing_type=clothing_type_clean
-            )
             metadata = result['metadata']
             
             # Extract size recommendation if available
@@ -123,11 +247,25 @@ async def process_tryon(
         # Add algorithm info to metadata
         metadata['algorithm'] = algorithm_used
         
+        # Keep the person's measurements for catalog-wide size recommendations
+        if 'body_measurements_inches' in metadata:
+            person_sessions.put(user_id, metadata['body_measurements_inches'])
+            metadata['person_id'] = user_id
+        
         # Add size recommendation to metadata if available
         if size_recommendation:
             metadata['size_recommendation'] = size_recommendation
             logger.info(f"Size recommendation: {size_recommendation['recommended_size']}")
         
+        if profiler is not None:
+            metadata['profile_id'] = profiler.profile_id
+        
+        if timer is not None:
+            metadata['timings'] = timer.as_dict()
+            response.headers['Server-Timing'] = timer.server_timing()
+        
+        status = "success"
+        
         # Return response
         return TryOnResponse(
             status="success",
@@ -139,18 +277,35 @@ async def process_tryon(
     except (ImageProcessingError, PoseDetectionError) as e:
         logger.error(f"Processing error (422): {e}")
         raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Try-on processing failed (500): {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        await memory_admission.release(reservation)
+        if timer is not None:
+            timer.close()
+        in_flight.dec()
+        requests_total.inc(algorithm=algorithm_used, status=status)
+        request_latency.observe(time.time() - start_time, algorithm=algorithm_used)
+        finish_trace(trace, status=status, algorithm=algorithm_used)
 
 
 @router.post("/try-on", response_model=TryOnResponse)
 async def try_on_alias(
+    response: Response,
     user_image: UploadFile = File(...),
     cloth_image: UploadFile = File(...)
 ):
     """
     Alias for /process endpoint (backward compatibility)
     """
-    return await process_tryon(user_image, cloth_image)
+    # Called directly, so every parameter needs a plain value (not its Form/Header default)
+    return await process_tryon(
+        response, user_image, cloth_image,
+        use_api="false", clothing_type="", garment_id="", x_profile=None, profile=None
+    )
 
@@ -2,11 +2,12 @@
 API v1 router
 """
 from fastapi import APIRouter
-from app.api.v1.endpoints import tryon
+from app.api.v1.endpoints import tryon, garments
 
 
 router = APIRouter()
 
 # Include endpoint routers
 router.include_router(tryon.router, prefix="/tryon", tags=["Try-On"])
+router.include_router(garments.router, prefix="/garments", tags=["Garments"])
 
@@ -15,22 +15,146 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 5500
     
+    # Request timing (Server-Timing header, metadata.timings, stage histograms)
+    REQUEST_TIMING_ENABLED: bool = True
+    
+    # Metrics (/metrics). With several worker processes point METRICS_MULTIPROC_DIR
+    # at a directory shared by all of them (emptied before the server starts)
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_FLUSH_INTERVAL: float = 5.0  # Seconds between per-process snapshots
+    
+    # Request tracing (JSONL spans of sampled and slow requests)
+    TRACING_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 0.01  # Fraction of requests traced regardless of latency
+    TRACE_SLOW_THRESHOLD: float = 2.0  # Seconds; slower requests are always traced
+    TRACE_FILE: str = "storage/traces/traces-{pid}.jsonl"  # {pid}: one file per worker process
+    TRACE_FILE_MAX_BYTES: int = 50 * 1024 * 1024
+    TRACE_FILE_BACKUPS: int = 5
+    
+    # On-demand profiling (X-Profile header or ?profile= carrying the secret; empty = off)
+    PROFILING_SECRET: str = ""
+    PROFILER_MODE: str = "sampling"  # "sampling" (collapsed stacks) or "cprofile" (pstats)
+    PROFILE_SAMPLE_INTERVAL: float = 0.002  # Seconds between stack samples
+    PROFILES_DIR: str = "storage/profiles"
+    
+    # Memory accounting and admission control
+    MEMORY_SAMPLE_RATE: float = 0.05  # Requests measured per stage with tracemalloc (needs request timing)
+    MEMORY_BUDGET_BYTES: int = 2 * 1024 * 1024 * 1024  # Process budget for admission (0 = off)
+    MEMORY_ESTIMATE_MARGIN: float = 1.25  # Safety factor on per-request estimates
+    MEMORY_ADMISSION_TIMEOUT: float = 10.0  # Seconds a request may wait for memory
+    
+    # Event loop lag monitor (stalls are logged and written to the trace log)
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL: float = 0.1  # Seconds between heartbeats
+    LOOP_BLOCK_THRESHOLD: float = 0.1  # Lag in seconds reported as a stall
+    LOOP_STALL_STACK_LIMIT: int = 60  # Frames kept per captured stack
+    
     # Storage
     UPLOAD_DIR: str = "storage/uploads"
     PROCESSED_DIR: str = "storage/processed"
     RESULTS_DIR: str = "storage/results"
+    CLOTHES_DIR: str = "frontend/assets/clothes"
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
     
     # ML Models
     POSE_MODEL_CONFIDENCE: float = 0.5
     SEGMENTATION_THRESHOLD: float = 0.5
     
+    # Garment catalog
+    CATALOG_RELOAD_INTERVAL: float = 2.0  # Seconds between clothes.json change checks
+    CATALOG_PAGE_SIZE: int = 24
+    CATALOG_MAX_PAGE_SIZE: int = 100
+    
+    # Garment image derivatives
+    GARMENT_DERIVATIVES_DIR: str = "frontend/assets/clothes/derived"
+    GARMENT_DERIVATIVES_URL: str = "/assets/clothes/derived"
+    GARMENT_THUMBNAIL_WIDTHS: list = [160, 320]  # Gallery WebP thumbnails
+    GARMENT_WORKING_SIZES: list = [384, 768, 1536]  # Pipeline PNGs, longest side
+    GARMENT_WEBP_QUALITY: int = 80
+    GARMENT_GALLERY_WIDTH: int = 320  # Default thumbnail width in catalog responses
+    GARMENT_BUILD_ON_STARTUP: bool = True  # Incremental; unchanged garments are skipped
+    
+    # Garment preparation (matte, bounding box, colour stats)
+    GARMENT_PREP_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    GARMENT_BG_TOLERANCE: int = 12  # Opaque images: max channel distance from the border colour
+    GARMENT_PYRAMID_MIN_SIDE: int = 32  # Smallest mip-map level kept per garment
+    
+    # Try-on render cache (warped garment + blend mask per garment and region size)
+    TRYON_RENDER_BUCKET: int = 16  # Body region sizes are rounded to this many pixels (0 = exact)
+    TRYON_RENDER_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    
+    # Person sessions (measurements reused across requests)
+    PERSON_SESSION_TTL: int = 3600  # Seconds
+    PERSON_SESSION_MAX_ENTRIES: int = 10000
+    
+    # VITON inference
+    VITON_BACKEND: str = "torch"  # "torch" or "onnxruntime"
+    VITON_LAZY_LOAD: bool = True  # Load on first use / warmup() instead of at construction
+    VITON_MMAP_WEIGHTS: bool = True  # Memory-map weights so workers share pages (CPU, fp32, no channels_last)
+    VITON_ONNX_PATH: str = "models/viton.onnx"
+    VITON_ORT_INTRA_OP_THREADS: int = 0  # 0 = onnxruntime default
+    VITON_ORT_INTER_OP_THREADS: int = 0
+    VITON_ORT_GRAPH_OPTIMIZATION: str = "all"  # disable, basic, extended, all
+    VITON_CPU_MODE: bool = False  # Serve the torch backend on CPU with the optimisations below
+    VITON_CHANNELS_LAST: bool = True
+    VITON_TORCH_COMPILE: str = "none"  # none, trace (TorchScript) or compile (torch.compile)
+    VITON_TORCH_INTRA_OP_THREADS: int = 0  # 0 = PyTorch default
+    VITON_TORCH_INTER_OP_THREADS: int = 0
+    VITON_QUANTIZATION: str = "none"  # none or static (INT8, CPU only)
+    VITON_QUANTIZATION_ENGINE: str = "x86"  # x86, fbgemm, qnnpack, onednn
+    VITON_CALIBRATION_IMAGES: int = 32
+    VITON_CALIBRATION_DIR: str = ""  # Person photos for INT8 calibration (empty = catalog garments only)
+    VITON_CLOTH_CACHE_ENABLED: bool = True  # Keep preprocessed garment tensors between requests
+    VITON_CLOTH_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # ~110 garments at 256x192 fp32
+    VITON_CLOTH_CACHE_PREWARM: bool = True  # Preprocess clothes.json garments when the model loads
+    VITON_BATCHING_ENABLED: bool = True
+    VITON_MAX_BATCH_SIZE: int = 8
+    VITON_BATCH_TIMEOUT_MS: float = 10.0  # Max wait for more requests after the first arrives
+    
     # CORS
     CORS_ORIGINS: list = ["*"]  # Allow all origins in development
     
     # Pixa API
     PIXA_API_KEY: Optional[str] = None
+
+    # Hedged API execution
+    TRYON_DEADLINE: float = 30.0  # Seconds before the request must be answered
+    HEDGE_ENABLED: bool = True
+    HEDGE_DELAY: float = 2.0  # Used until enough provider latencies are recorded
+    HEDGE_QUANTILE: float = 0.9  # Provider latency quantile that triggers the hedge
+    HEDGE_MIN_DELAY: float = 0.25
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_PREFERENCE: str = "quality"  # "quality" waits for the API until the deadline, "fastest" takes the first result
+    HEDGE_MAX_WORKERS: int = 4  # Threads for remote provider calls
+    HEDGE_LOCAL_WORKERS: int = 2  # Separate threads for the local hedge
+    
+    # API provider circuit breakers
+    BREAKER_WINDOW: float = 60.0  # Rolling window in seconds
+    BREAKER_MIN_REQUESTS: int = 5
+    BREAKER_ERROR_RATE: float = 0.5
+    BREAKER_LATENCY_QUANTILE: float = 0.95
+    BREAKER_LATENCY_THRESHOLD: float = 20.0  # Seconds
+    BREAKER_OPEN_SECONDS: float = 30.0
+    BREAKER_HALF_OPEN_CALLS: int = 1
     
+    # API rate limits and spend budget
+    API_RATE_LIMITS: dict = {"pixelcut": 2.0, "deepar": 2.0}  # Requests/second, unlisted providers are unlimited
+    API_RATE_BURST: int = 5
+    API_QUEUE_MAX_WAIT: float = 2.0  # Seconds to wait for a rate token before degrading
+    API_DAILY_BUDGET: float = 50.0  # USD, rolling 24h
+    API_MONTHLY_BUDGET: float = 1000.0  # USD, rolling 30 days
+    API_BUDGET_SOFT_LIMIT: float = 0.9  # Degrade to local once this fraction of a budget is spent
+    API_SPEND_FILE: str = "storage/api_spend.json"  # Shared by all workers, survives restarts
+    API_SPEND_RESERVATION_TTL: float = 300.0  # Seconds before an unsettled reservation is dropped
+    
+    # API payload shaping and response cache
+    API_MAX_SIDE: dict = {"pixelcut": 1024, "deepar": 1024}  # Provider working resolution (long side, px)
+    API_JPEG_QUALITIES: list = [90, 80, 70]  # Tried in order until the payload fits the target
+    API_JPEG_TARGET_KB: int = 300
+    API_CACHE_ENABLED: bool = True
+    API_CACHE_DIR: str = "storage/api_cache"
+    API_CACHE_MAX_BYTES: int = 536870912  # 512MB
+
     class Config:
         env_file = ".env"
         case_sensitive = True
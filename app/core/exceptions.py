@@ -1,6 +1,8 @@
 """
 Custom exceptions for the application
 """
+from typing import Optional
+
 from fastapi import HTTPException, status
 
 
@@ -33,3 +35,11 @@ class StorageError(VTOException):
     def __init__(self, detail: str = "Storage operation failed"):
         super().__init__(detail=detail, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class AdmissionError(VTOException):
+    """Raised when a request does not fit the memory budget"""
+    def __init__(self, detail: str = "Server is busy", status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE,
+                 retry_after: Optional[int] = None):
+        super().__init__(detail=detail, status_code=status_code)
+        if retry_after is not None:
+            self.headers = {"Retry-After": str(retry_after)}
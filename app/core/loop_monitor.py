@@ -0,0 +1,172 @@
+"""
+Event-loop lag monitor
+
+A heartbeat task sleeps LOOP_MONITOR_INTERVAL seconds on the event loop and
+records how late it wakes up (event_loop_lag_seconds). A watchdog thread
+notices when the heartbeat is overdue by half of LOOP_BLOCK_THRESHOLD and
+samples the loop thread's stack for as long as the stall lasts. When the loop
+recovers, the stall is counted (event_loop_stalls_total,
+event_loop_stall_seconds), logged with the application frame it spent most
+samples in and written to the trace log as an "event_loop_stall" record with
+the most frequent stack and the top blocking sites, so a multi-second stall
+is attributed to what consumed the time rather than where it started.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core import tracing
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop heartbeat woke up",
+    buckets=LAG_BUCKETS
+)
+loop_stalls = metrics.counter(
+    "event_loop_stalls_total",
+    "Event loop stalls longer than LOOP_BLOCK_THRESHOLD"
+)
+stall_duration = metrics.histogram(
+    "event_loop_stall_seconds",
+    "Duration of event loop stalls",
+    buckets=LAG_BUCKETS
+)
+
+
+def _format_stack(frame, limit: int) -> List[str]:
+    """Frames outermost first, as 'function (file:line)'"""
+    frames = []
+    while frame is not None and len(frames) < limit:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return list(reversed(frames))
+
+
+def _blocking_site(stack: Tuple[str, ...]) -> Optional[str]:
+    """Innermost frame in application code, the likeliest culprit"""
+    app_dir = str(Path(__file__).resolve().parents[1])
+    return next((frame for frame in reversed(stack) if app_dir in frame), stack[-1] if stack else None)
+
+
+class LoopMonitor:
+    """Measures event loop lag and captures stacks of blocking calls"""
+
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None):
+        """
+        Initialize loop monitor
+
+        Args:
+            interval: Seconds between heartbeats
+            threshold: Lag in seconds that counts as a stall
+        """
+        self.interval = settings.LOOP_MONITOR_INTERVAL if interval is None else interval
+        self.threshold = settings.LOOP_BLOCK_THRESHOLD if threshold is None else threshold
+        self._beats = 0
+        self._last_beat = time.monotonic()
+        # Stack samples of the stall in progress, for heartbeat number _sampled_beat
+        self._sampled_beat = -1
+        self._samples: Counter = Counter()
+        self._samples_lock = threading.Lock()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start monitoring the running event loop (call from the loop)"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeat and the watchdog"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._last_beat = time.monotonic()
+            self._beats += 1
+            await asyncio.sleep(self.interval)
+            # Back on the loop: stop the watchdog sampling this beat's stall
+            self._last_beat = time.monotonic()
+            lag = max(0.0, loop.time() - start - self.interval)
+            loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._report(lag)
+
+    def _watch(self) -> None:
+        """Watchdog thread: sample the loop's stack for the duration of a stall"""
+        idle_wait, stall_wait = self.threshold / 4, self.threshold / 10
+        wait = idle_wait
+        while not self._stop.wait(wait):
+            beats = self._beats
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue <= self.threshold / 2:
+                wait = idle_wait
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = tuple(_format_stack(frame, settings.LOOP_STALL_STACK_LIMIT))
+            with self._samples_lock:
+                if self._sampled_beat != beats:
+                    self._sampled_beat = beats
+                    self._samples = Counter()
+                if stack:
+                    self._samples[stack] += 1
+            wait = stall_wait
+
+    def _report(self, lag: float) -> None:
+        with self._samples_lock:
+            samples = self._samples if self._sampled_beat == self._beats else Counter()
+            self._samples = Counter()
+            self._sampled_beat = -1
+        loop_stalls.inc()
+        stall_duration.observe(lag)
+
+        sites = Counter()
+        for stack, count in samples.items():
+            sites[_blocking_site(stack)] += count
+        site = sites.most_common(1)[0][0] if sites else None
+        stack = list(samples.most_common(1)[0][0]) if samples else []
+
+        logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms"
+                       + (f" in {site}" if site else " (stall ended before a stack was captured)"))
+        tracing.export({
+            'type': 'event_loop_stall',
+            'at': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(lag * 1000, 2),
+            'pid': os.getpid(),
+            'samples': sum(samples.values()),
+            'blocking_site': site,
+            'top_sites': [
+                {'site': frame, 'samples': count} for frame, count in sites.most_common(5)
+            ],
+            'stack': stack,
+        })
+
+
+loop_monitor = LoopMonitor()
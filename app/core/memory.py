@@ -0,0 +1,263 @@
+"""
+Request memory accounting and admission control
+
+Accounting: a sampled fraction of requests (MEMORY_SAMPLE_RATE) runs with
+tracemalloc on, and every stage(...) block of those requests reports its peak
+allocation above the stage's starting point in the tryon_stage_peak_bytes
+histogram (NumPy/OpenCV arrays are included). tracemalloc and its peak are
+process-wide: a stage is only recorded if no other sampled request started
+or was running while it ran (they would reset each other's peaks), and
+allocations of unsampled concurrent work still count, so the numbers are
+approximate - meant for trends and sizing, not exact attribution.
+
+Admission: each request's peak is estimated from the decoded image
+dimensions (estimate_request_bytes) and reserved against MEMORY_BUDGET_BYTES
+minus the process's idle RSS. Requests that do not fit wait up to
+MEMORY_ADMISSION_TIMEOUT for others to finish; requests that could never fit
+are rejected immediately.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import AdmissionError
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BUCKETS = tuple(2 ** power for power in range(20, 33))  # 1 MiB .. 4 GiB
+
+# Peak bytes of the local pipeline per pixel, measured with tracemalloc and
+# ru_maxrss on 0.3-12 MP photos and 0.2-5 MP garments: the person stages
+# (decode, lighting and blend float32 buffers) and the garment preparation
+# (matte, labels, LAB, pyramid) peak at different times.
+PERSON_BYTES_PER_PIXEL = 20
+GARMENT_BYTES_PER_PIXEL = 46
+PERSON_BYTES_DURING_PREP = 7
+BASE_REQUEST_BYTES = 8 * 1024 * 1024
+
+stage_peak = metrics.histogram(
+    "tryon_stage_peak_bytes",
+    "Approximate peak traced allocation per try-on stage (sampled requests, process-wide tracing)",
+    ["stage"],
+    buckets=MEMORY_BUCKETS
+)
+request_estimate = metrics.histogram(
+    "tryon_request_memory_estimate_bytes",
+    "Estimated peak memory of try-on requests at admission",
+    buckets=MEMORY_BUCKETS
+)
+resident_memory = metrics.gauge(
+    "process_resident_memory_bytes",
+    "Resident set size of the process"
+)
+reserved_memory = metrics.gauge(
+    "tryon_memory_reserved_bytes",
+    "Memory reserved by admitted in-flight try-on requests"
+)
+admission_decisions = metrics.counter(
+    "tryon_admission_total",
+    "Memory admission decisions",
+    ["decision"]
+)
+admission_wait = metrics.histogram(
+    "tryon_admission_wait_seconds",
+    "Time requests were held for memory"
+)
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def estimate_request_bytes(person_size: tuple, cloth_size: tuple) -> int:
+    """
+    Estimated peak memory of one try-on request
+
+    Args:
+        person_size: (width, height) of the decoded person image
+        cloth_size: (width, height) of the decoded garment image
+
+    Returns:
+        Bytes, including MEMORY_ESTIMATE_MARGIN
+    """
+    person_px = person_size[0] * person_size[1]
+    cloth_px = cloth_size[0] * cloth_size[1]
+    peak = max(
+        PERSON_BYTES_PER_PIXEL * person_px,
+        GARMENT_BYTES_PER_PIXEL * cloth_px + PERSON_BYTES_DURING_PREP * person_px
+    ) + BASE_REQUEST_BYTES
+    return int(peak * settings.MEMORY_ESTIMATE_MARGIN)
+
+
+class _Tracing:
+    """Reference-counted tracemalloc session shared by sampled requests"""
+
+    def __init__(self):
+        self._users = 0
+        self._owned = False
+        # Bumped whenever a request starts sampling, so scopes can tell they overlapped one
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owned = True
+            self._users += 1
+            self.generation += 1
+
+    def exclusive(self) -> bool:
+        """True while a single sampled request is using tracemalloc"""
+        return self._users == 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._owned:
+                tracemalloc.stop()
+                self._owned = False
+
+
+_tracing = _Tracing()
+
+
+class MemoryScope:
+    """Peak tracking for one stage; nested scopes hand their peaks to the parent"""
+    __slots__ = ("start", "peak", "generation", "exclusive")
+
+    def __init__(self):
+        self.start, self.peak = tracemalloc.get_traced_memory()
+        self.generation = _tracing.generation
+        self.exclusive = _tracing.exclusive()
+
+
+def begin_sampling() -> None:
+    """Turn tracemalloc on for a sampled request"""
+    _tracing.acquire()
+
+
+def end_sampling() -> None:
+    """Release the sampled request's share of tracemalloc"""
+    _tracing.release()
+
+
+def stage_begin(stack: List[MemoryScope]) -> MemoryScope:
+    """Start measuring a stage nested inside the scopes on `stack`"""
+    if _tracing.exclusive():
+        if stack:
+            # Keep the parent's peak so far before resetting the global peak
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    scope = MemoryScope()
+    stack.append(scope)
+    return scope
+
+
+def stage_end(stack: List[MemoryScope], scope: MemoryScope, name: str) -> None:
+    """Record the stage's peak above its starting allocation (skipped if another sampled request overlapped)"""
+    peak = max(scope.peak, tracemalloc.get_traced_memory()[1])
+    stack.pop()
+    if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+    if scope.exclusive and scope.generation == _tracing.generation:
+        stage_peak.observe(max(0, peak - scope.start), stage=name)
+
+
+class MemoryAdmission:
+    """Holds or rejects requests whose estimated memory exceeds the budget"""
+
+    def __init__(self, budget: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        Initialize admission controller
+
+        Args:
+            budget: Process memory budget in bytes (0 disables admission control)
+            timeout: Seconds a request may wait for memory before it is rejected
+        """
+        self.budget = settings.MEMORY_BUDGET_BYTES if budget is None else budget
+        self.timeout = settings.MEMORY_ADMISSION_TIMEOUT if timeout is None else timeout
+        self.reserved = 0
+        self.baseline = current_rss()
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _available(self) -> int:
+        return self.budget - self.baseline - self.reserved
+
+    async def acquire(self, nbytes: int) -> int:
+        """
+        Reserve `nbytes`, waiting for in-flight requests if needed
+
+        Args:
+            nbytes: Estimated peak memory of the request
+
+        Returns:
+            The reserved amount, to pass to release()
+
+        Raises:
+            AdmissionError: 413 if the request can never fit, 503 after the timeout
+        """
+        if self.budget <= 0:
+            return 0
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        request_estimate.observe(nbytes)
+
+        async with self._condition:
+            if self.reserved == 0:
+                # Idle: the process's own footprint (models, caches) right now
+                self.baseline = current_rss()
+                resident_memory.set(self.baseline)
+            if nbytes > self.budget - self.baseline:
+                admission_decisions.inc(decision="rejected_too_large")
+                raise AdmissionError(
+                    f"Images too large: needs ~{nbytes // 2**20} MiB, budget allows "
+                    f"{max(0, self.budget - self.baseline) // 2**20} MiB",
+                    status_code=413
+                )
+
+            start = time.monotonic()
+            if nbytes > self._available():
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: nbytes <= self._available()),
+                        self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    admission_decisions.inc(decision="rejected_timeout")
+                    raise AdmissionError(
+                        "Server is busy with other large requests, retry shortly",
+                        retry_after=max(1, round(self.timeout))
+                    )
+                admission_decisions.inc(decision="held")
+                admission_wait.observe(time.monotonic() - start)
+            else:
+                admission_decisions.inc(decision="admitted")
+
+            self.reserved += nbytes
+            reserved_memory.set(self.reserved)
+            return nbytes
+
+    async def release(self, nbytes: int) -> None:
+        """Return a reservation from acquire() and wake waiting requests"""
+        if not nbytes or self._condition is None:
+            return
+        async with self._condition:
+            self.reserved -= nbytes
+            reserved_memory.set(self.reserved)
+            resident_memory.set(current_rss())
+            self._condition.notify_all()
+
+
+memory_admission = MemoryAdmission()
@@ -0,0 +1,185 @@
+"""
+On-demand request profiling
+
+A try-on request carrying the PROFILING_SECRET in the ``X-Profile`` header or
+the ``profile`` query parameter runs under a profiler, and the profile is
+saved to PROFILES_DIR with its id returned in metadata.profile_id. Requests
+without the flag only pay for one comparison; with no secret configured
+profiling is off entirely.
+
+PROFILER_MODE selects the profiler:
+- "sampling": a background thread samples the request thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds and writes collapsed stacks (<id>.folded),
+  the input format of flamegraph.pl, speedscope and inferno
+- "cprofile": deterministic cProfile of the request thread (<id>.prof, a
+  pstats dump for snakeviz, flameprof or gprof2dot)
+
+Work the request hands to worker threads (the hedged API and local branches)
+is profiled too when the callable is wrapped with RequestProfile.wrap: the
+sampler also samples those threads while the branch runs (stacks are rooted
+at the thread name), and in cprofile mode each branch gets its own profiler
+whose stats are merged into the dump. A losing branch still running when the
+request returns is only covered up to that point.
+
+Both observe whole threads, so on the event loop thread work of other
+requests running concurrently can show up in the profile.
+"""
+import cProfile
+import functools
+import hmac
+import logging
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILER_MODES = ("sampling", "cprofile")
+
+
+def requested(*flags: Optional[str]) -> bool:
+    """True if any flag matches the configured profiling secret"""
+    secret = settings.PROFILING_SECRET
+    if not secret:
+        return False
+    return any(flag and hmac.compare_digest(flag.encode(), secret.encode()) for flag in flags)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class _StackSampler:
+    """Samples the Python stacks of a set of threads into collapsed-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._threads: Dict[int, str] = {thread_id: threading.current_thread().name}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def add_thread(self, thread_id: int, name: str) -> None:
+        with self._threads_lock:
+            self._threads[thread_id] = name
+
+    def remove_thread(self, thread_id: int) -> None:
+        with self._threads_lock:
+            self._threads.pop(thread_id, None)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self._threads.items())
+            for thread_id, name in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    stack.append(name)
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class RequestProfile:
+    """Profiler running for one request"""
+
+    def __init__(self, mode: Optional[str] = None):
+        """
+        Start profiling the calling thread
+
+        Args:
+            mode: "sampling" or "cprofile" (default PROFILER_MODE)
+        """
+        self.mode = mode or settings.PROFILER_MODE
+        if self.mode not in PROFILER_MODES:
+            raise ValueError(f"Unknown profiler mode: {self.mode}")
+        self.profile_id = uuid.uuid4().hex
+        self.start_time = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        # cprofile mode: profilers of finished worker thread branches, merged on stop
+        self._branch_profilers: List[cProfile.Profile] = []
+
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = _StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+            self._profiler.start()
+
+    def wrap(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """
+        Profile `fn` on whichever thread runs it
+
+        Use for request work submitted to executors; calling the wrapper on
+        the request thread itself just calls `fn`.
+        """
+        @functools.wraps(fn)
+        def run():
+            thread_id = threading.get_ident()
+            if thread_id == self.thread_id:
+                return fn()
+
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    return fn()
+                finally:
+                    profiler.disable()
+                    self._branch_profilers.append(profiler)
+
+            self._profiler.add_thread(thread_id, threading.current_thread().name)
+            try:
+                return fn()
+            finally:
+                self._profiler.remove_thread(thread_id)
+        return run
+
+    def stop(self) -> Optional[Path]:
+        """
+        Stop profiling and save the profile
+
+        Returns:
+            Path of the saved profile, or None if it could not be written
+        """
+        elapsed = time.perf_counter() - self.start_time
+        directory = Path(settings.PROFILES_DIR)
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            if self.mode == "cprofile":
+                self._profiler.disable()
+                path = directory / f"{self.profile_id}.prof"
+                stats = pstats.Stats(self._profiler)
+                for profiler in list(self._branch_profilers):
+                    stats.add(profiler)
+                stats.dump_stats(str(path))
+            else:
+                self._profiler.stop()
+                path = directory / f"{self.profile_id}.folded"
+                lines = [f"{stack} {count}" for stack, count in self._profiler.stacks.most_common()]
+                path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        except OSError as e:
+            logger.error(f"Could not save profile {self.profile_id}: {e}")
+            return None
+
+        logger.info(f"Saved {self.mode} profile {path} ({elapsed * 1000:.0f} ms request)")
+        return path
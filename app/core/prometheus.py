@@ -0,0 +1,225 @@
+"""
+Prometheus text exposition of the metrics registry
+
+In a single process /metrics renders the in-process registry. With
+METRICS_MULTIPROC_DIR set (several server workers), every process writes a
+snapshot of its registry to <dir>/<pid>.json - from a background thread every
+METRICS_FLUSH_INTERVAL seconds and just before it serves a scrape - and
+/metrics merges all snapshots:
+- counters and histograms are summed over every file, including exited
+  workers, so totals never go backwards
+- gauges are combined over live processes per their multiprocess_mode
+  ("all" adds a pid label; "sum", "max", "min")
+
+Recording stays a dict update under an uncontended per-metric lock; all the
+file work happens off the request path.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import Gauge, Histogram, MetricsRegistry, metrics
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def snapshot(registry: MetricsRegistry = metrics) -> Dict:
+    """JSON-serialisable copy of every metric in the registry"""
+    data = {}
+    for metric in registry.collect():
+        entry = {
+            'type': metric.type,
+            'help': metric.documentation,
+            'labelnames': list(metric.labelnames),
+        }
+        if isinstance(metric, Histogram):
+            entry['buckets'] = list(metric.buckets)
+            entry['samples'] = [[list(key), counts, total] for key, counts, total in metric.samples()]
+        else:
+            entry['samples'] = [[list(key), value] for key, value in metric.samples()]
+        if isinstance(metric, Gauge):
+            entry['mode'] = metric.multiprocess_mode
+        data[metric.name] = entry
+    return data
+
+
+# The flush thread and scrapes both write the snapshot; one at a time, so the newest wins
+_snapshot_lock = threading.Lock()
+
+
+def write_snapshot(directory: str, registry: MetricsRegistry = metrics) -> None:
+    """Atomically write this process's snapshot to <directory>/<pid>.json"""
+    path = Path(directory) / f"{os.getpid()}.json"
+    tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    with _snapshot_lock:
+        tmp_path.write_text(json.dumps(snapshot(registry)), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshots(directory: str) -> List[Tuple[int, bool, Dict]]:
+    """(pid, alive, snapshot) for every worker snapshot in the directory"""
+    snapshots = []
+    for path in Path(directory).glob("*.json"):
+        try:
+            pid = int(path.stem)
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        snapshots.append((pid, _pid_alive(pid), data))
+    return snapshots
+
+
+def merge(snapshots: List[Tuple[int, bool, Dict]]) -> Dict:
+    """Combine worker snapshots into one snapshot (see module docstring)"""
+    merged: Dict[str, Dict] = {}
+    for pid, alive, data in sorted(snapshots, key=lambda item: item[0]):
+        for name, entry in data.items():
+            target = merged.setdefault(name, {**entry, 'samples': {}})
+            samples = target['samples']
+            mode = entry.get('mode')
+
+            if entry['type'] == "gauge":
+                if not alive:
+                    continue
+                if mode == "all":
+                    target['labelnames'] = entry['labelnames'] + ["pid"]
+                for labels, value in entry['samples']:
+                    if mode == "all":
+                        samples[tuple(labels) + (str(pid),)] = value
+                        continue
+                    key = tuple(labels)
+                    if key not in samples:
+                        samples[key] = value
+                    elif mode == "sum":
+                        samples[key] += value
+                    elif mode == "max":
+                        samples[key] = max(samples[key], value)
+                    elif mode == "min":
+                        samples[key] = min(samples[key], value)
+            elif entry['type'] == "histogram":
+                for labels, counts, total in entry['samples']:
+                    key = tuple(labels)
+                    if key in samples:
+                        previous_counts, previous_total = samples[key]
+                        counts = [a + b for a, b in zip(previous_counts, counts)]
+                        total += previous_total
+                    samples[key] = (counts, total)
+            else:
+                for labels, value in entry['samples']:
+                    key = tuple(labels)
+                    samples[key] = samples.get(key, 0.0) + value
+
+    for entry in merged.values():
+        entry['samples'] = [
+            [list(key), *value] if entry['type'] == "histogram" else [list(key), value]
+            for key, value in entry['samples'].items()
+        ]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names: List[str], values: List[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def render(data: Dict) -> str:
+    """Prometheus text format (version 0.0.4) of a snapshot"""
+    lines = []
+    for name in sorted(data):
+        entry = data[name]
+        names = entry['labelnames']
+        lines.append(f"# HELP {name} {_escape(entry['help'])}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for sample in entry['samples']:
+            values = sample[0]
+            if entry['type'] == "histogram":
+                counts, total = sample[1], sample[2]
+                cumulative = 0
+                for upper, count in zip(entry['buckets'] + [math.inf], counts):
+                    cumulative += count
+                    le = _labels(names, values, ("le", _number(upper)))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, values)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(names, values)} {_number(sample[1])}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_latest(registry: MetricsRegistry = metrics) -> str:
+    """Exposition for /metrics, merged across workers in multiprocess mode"""
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return render(snapshot(registry))
+
+    write_snapshot(directory, registry)
+    return render(merge(read_snapshots(directory)))
+
+
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def start_snapshot_writer(registry: MetricsRegistry = metrics) -> None:
+    """Periodically write this process's snapshot (multiprocess mode only; idempotent)"""
+    global _writer
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+
+    with _writer_lock:
+        if _writer is not None:
+            return
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+        def loop():
+            while True:
+                time.sleep(settings.METRICS_FLUSH_INTERVAL)
+                try:
+                    write_snapshot(directory, registry)
+                except OSError as e:
+                    logger.warning(f"Could not write metrics snapshot: {e}")
+
+        _writer = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+        _writer.start()
+
+
+def flush_snapshot(registry: MetricsRegistry = metrics) -> None:
+    """Write a final snapshot (on shutdown) so the last interval is not lost"""
+    if settings.METRICS_MULTIPROC_DIR:
+        try:
+            write_snapshot(settings.METRICS_MULTIPROC_DIR, registry)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
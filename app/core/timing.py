@@ -0,0 +1,115 @@
+"""
+Per-request stage timing
+
+The endpoint starts a StageTimer for the request; code anywhere below it wraps
+work in ``with stage("pose"):`` without passing the timer around (it travels
+in a context variable). The breakdown is reported in the Server-Timing header
+and in metadata.timings, and every stage is observed in the
+tryon_stage_seconds histogram. With REQUEST_TIMING_ENABLED off, or outside a
+request, ``stage`` returns a shared no-op context manager.
+
+When the request is traced (app.core.tracing), each stage is also a span;
+in memory-sampled requests (app.core.memory) each stage on the request's own
+thread reports its peak allocation. Work handed to other threads keeps the
+timer when it runs in a copy of the request context (contextvars.copy_context),
+as the hedged API branches do; stages of concurrent branches accumulate.
+"""
+import random
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core import memory, tracing
+
+_current: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+_noop = nullcontext()
+
+stage_latency = metrics.histogram(
+    "tryon_stage_seconds",
+    "Time spent in each try-on request stage",
+    ["stage"]
+)
+
+
+class _Stage:
+    """Context manager adding its elapsed time to a timer and tracing it as a span"""
+    __slots__ = ("timer", "name", "start", "span", "memory")
+
+    def __init__(self, timer: Optional["StageTimer"], name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.span = tracing.start_span(self.name)
+        self.memory = None
+        if (self.timer is not None and self.timer.memory_sampled
+                and self.timer.thread_id == threading.get_ident()):
+            self.memory = memory.stage_begin(self.timer.memory_scopes)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.timer is not None:
+            self.timer.record(self.name, time.perf_counter() - self.start)
+        if self.memory is not None:
+            memory.stage_end(self.timer.memory_scopes, self.memory, self.name)
+        tracing.end_span(self.span, exc)
+        return False
+
+
+class StageTimer:
+    """Accumulated seconds per stage for one request, in first-seen order"""
+
+    def __init__(self, memory_sampled: bool = False):
+        self.start = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.memory_sampled = memory_sampled
+        self.memory_scopes: List[memory.MemoryScope] = []
+        if memory_sampled:
+            memory.begin_sampling()
+
+    def close(self) -> None:
+        """End the request (stops memory sampling)"""
+        if self.memory_sampled:
+            self.memory_sampled = False
+            memory.end_sampling()
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add `seconds` to stage `name` (repeated stages accumulate)"""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        stage_latency.observe(seconds, stage=name)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Milliseconds per stage, plus the total so far"""
+        with self._lock:
+            timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        timings['total'] = round((time.perf_counter() - self.start) * 1000, 1)
+        return timings
+
+    def server_timing(self) -> str:
+        """Server-Timing header value"""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+def start_timer() -> Optional[StageTimer]:
+    """Begin timing the current request; None when timing is disabled"""
+    if not settings.REQUEST_TIMING_ENABLED:
+        return None
+    timer = StageTimer(memory_sampled=random.random() < settings.MEMORY_SAMPLE_RATE)
+    _current.set(timer)
+    return timer
+
+
+def stage(name: str):
+    """Context manager timing a stage of the current request"""
+    timer = _current.get()
+    if timer is None and not tracing.active():
+        return _noop
+    return _Stage(timer, name)
@@ -0,0 +1,195 @@
+"""
+Span-based request tracing
+
+The try-on endpoint opens a trace per request; every ``stage(...)`` block
+(app.core.timing) inside it becomes a nested span, and ``annotate(...)`` adds
+attributes (image sizes, ROI size, pose tier, cache misses) to the innermost
+open span. The trace travels in context variables, so work on other threads
+joins it when run in a copy of the request context (the hedged API branches
+nest under the endpoint's "api" span). Spans are collected for every request, and a finished trace is
+written as one JSON line when it was sampled (TRACE_SAMPLE_RATE) or took at
+least TRACE_SLOW_THRESHOLD seconds, so slow requests are always kept.
+
+Traces go to a size-rotated JSONL file per process (TRACE_FILE) through a
+background queue listener, so the request never waits for disk.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("span", default=None)
+
+
+class Span:
+    """Timed, named unit of work with attributes"""
+    __slots__ = ("trace", "span_id", "parent", "name", "start", "end", "attributes")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict):
+        self.trace = trace
+        self.span_id = trace.next_span_id()
+        self.parent = parent
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+
+    def to_dict(self) -> Dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent is not None else None,
+            'name': self.name,
+            'start_ms': round((self.start - self.trace.root.start) * 1000, 2),
+            'duration_ms': round((end - self.start) * 1000, 2),
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    """All spans of one request"""
+
+    def __init__(self, name: str, attributes: Dict):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.sampled = random.random() < settings.TRACE_SAMPLE_RATE
+        self.spans: List[Span] = []
+        self._span_ids = 0
+        self.root = Span(self, name, None, attributes)
+        self.spans.append(self.root)
+
+    def next_span_id(self) -> int:
+        self._span_ids += 1
+        return self._span_ids
+
+
+def start_trace(name: str, **attributes) -> Optional[Trace]:
+    """Open a trace (and its root span) for the current request; None when disabled"""
+    if not settings.TRACING_ENABLED:
+        return None
+    trace = Trace(name, attributes)
+    _current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+
+def active() -> bool:
+    """True inside a traced request"""
+    return _current_trace.get() is not None
+
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """Open a child of the innermost span; None outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    span = Span(trace, name, _current_span.get(), attributes)
+    trace.spans.append(span)
+    _current_span.set(span)
+    return span
+
+
+def end_span(span: Optional[Span], error: Optional[BaseException] = None) -> None:
+    """Close a span opened by start_span and make its parent current again"""
+    if span is None:
+        return
+    span.end = time.perf_counter()
+    if error is not None:
+        span.attributes['error'] = repr(error)
+    _current_span.set(span.parent)
+
+
+def annotate(**attributes) -> None:
+    """Add attributes to the innermost open span of the current trace"""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def finish_trace(trace: Optional[Trace], **attributes) -> None:
+    """
+    Close the root span and export the trace if sampled or slow
+
+    Args:
+        trace: Trace from start_trace
+        **attributes: Final root attributes (status, algorithm, ...)
+    """
+    if trace is None:
+        return
+    trace.root.attributes.update(attributes)
+    trace.root.end = time.perf_counter()
+    _current_trace.set(None)
+    _current_span.set(None)
+
+    duration = trace.root.end - trace.root.start
+    slow = duration >= settings.TRACE_SLOW_THRESHOLD
+    if not (trace.sampled or slow):
+        return
+
+    export({
+        'type': 'trace',
+        'trace_id': trace.trace_id,
+        'name': trace.root.name,
+        'started_at': trace.started_at,
+        'duration_ms': round(duration * 1000, 2),
+        'sampled': trace.sampled,
+        'slow': slow,
+        'pid': os.getpid(),
+        'spans': [span.to_dict() for span in trace.spans],
+    })
+
+
+def export(record: Dict) -> None:
+    """Append a record (trace or other diagnostic event) to the trace log"""
+    if settings.TRACING_ENABLED:
+        _get_exporter().info(json.dumps(record, default=str))
+
+
+_exporter: Optional[logging.Logger] = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter() -> logging.Logger:
+    """Logger writing bare JSON lines to the rotating trace file off-thread"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            # RotatingFileHandler is not safe across processes, so by default
+            # TRACE_FILE contains {pid} and every worker gets its own file
+            path = Path(settings.TRACE_FILE.format(pid=os.getpid()))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=settings.TRACE_FILE_MAX_BYTES,
+                backupCount=settings.TRACE_FILE_BACKUPS,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+
+            records: queue.Queue = queue.Queue(-1)
+            listener = logging.handlers.QueueListener(records, handler)
+            listener.start()
+            atexit.register(listener.stop)
+
+            exporter = logging.getLogger("tryon.traces")
+            exporter.setLevel(logging.INFO)
+            exporter.propagate = False
+            exporter.addHandler(logging.handlers.QueueHandler(records))
+            _exporter = exporter
+            logger.info(f"Writing request traces to {path}")
+        return _exporter
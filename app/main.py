@@ -1,17 +1,23 @@
 """
 FastAPI application - Virtual Try-On Backend
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from datetime import datetime
 from pathlib import Path
 
 from app.core.config import settings
 from app.core.middleware import setup_middleware
+from app.core.prometheus import CONTENT_TYPE, flush_snapshot, generate_latest, start_snapshot_writer
+from app.core.loop_monitor import loop_monitor
 from app.api.v1.router import router as api_v1_router
 from app.utils.file_handler import ensure_directories
 from app.models.schemas import HealthResponse
+from app.services.ml.circuit_breaker import get_breaker_snapshots
+from app.services.ml.response_cache import get_response_cache
+from app.services.garment_assets import build_derivatives
 
 
 # Create FastAPI app
@@ -66,10 +72,18 @@ async def api_info():
         "version": settings.VERSION,
         "status": "running",
         "docs": "/docs",
-        "api": "/api/v1"
+        "api": "/api/v1",
+        "providers": get_breaker_snapshots(),
+        "response_cache": get_response_cache().stats() if settings.API_CACHE_ENABLED else None
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE)
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
@@ -85,6 +99,16 @@ async def startup_event():
     """Startup event handler"""
     print(f"[*] {settings.APP_NAME} v{settings.VERSION} starting...")
     print(f"[*] API Documentation: http://{settings.HOST}:{settings.PORT}/docs")
+    start_snapshot_writer()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if settings.GARMENT_BUILD_ON_STARTUP:
+        try:
+            # Incremental and locked across workers; off the loop so it never blocks it
+            stats = await asyncio.get_running_loop().run_in_executor(None, build_derivatives)
+            print(f"[*] Garment derivatives: {stats['built']} built, {stats['skipped']} up to date")
+        except Exception as e:
+            print(f"[!] Garment derivative build failed: {e}")
     print(f"[*] Server ready!")
 
 
@@ -92,6 +116,8 @@ async def startup_event():
 async def shutdown_event():
     """Shutdown event handler"""
     print(f"[*] {settings.APP_NAME} shutting down...")
+    loop_monitor.stop()
+    flush_snapshot()
 
 
 if __name__ == "__main__":
@@ -36,6 +36,42 @@ class TryOnResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+class GarmentListResponse(BaseModel):
+    """Filtered, paginated garment catalog"""
+    items: List[Dict[str, Any]]
+    total: int
+    page: int
+    page_size: int
+    facets: Dict[str, Dict[str, int]]
+
+
+class CatalogSizeRequest(BaseModel):
+    """Catalog-wide size recommendation request"""
+    person_id: Optional[str] = Field(None, description="person_id from a previous try-on's metadata")
+    measurements: Optional[Dict[str, float]] = Field(
+        None, description="Body measurements in inches (chest, waist, shoulder, torso_length, hips)"
+    )
+
+
+class GarmentSizeRecommendation(BaseModel):
+    """Recommended size of one catalog garment"""
+    garment_id: Any
+    name: Optional[str] = None
+    category: Optional[str] = None
+    gender: Optional[str] = None
+    recommended_size: str
+    fit_score: float
+    alternative_sizes: List[str]
+
+
+class CatalogSizeResponse(BaseModel):
+    """Catalog-wide size recommendation response"""
+    status: str
+    time_taken: float
+    measurements: Dict[str, float]
+    recommendations: List[GarmentSizeRecommendation]
+
+
 class ErrorResponse(BaseModel):
     """Error response"""
     error: str
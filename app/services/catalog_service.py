@@ -0,0 +1,234 @@
+"""
+Server-side garment catalog
+
+clothes.json is loaded once and indexed by category, gender and available
+size, with facet counts precomputed, so listing and filtering is set
+intersection plus a page slice. The file is re-checked at most every
+CATALOG_RELOAD_INTERVAL seconds; when it changes only added, removed or
+edited garments are re-indexed.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Indexed garment fields; 'size' is taken from the keys of 'sizes'
+FACETS = ('category', 'gender', 'size')
+
+
+def _facet_values(item: Dict, facet: str) -> List[str]:
+    if facet == 'size':
+        return list((item.get('sizes') or {}).keys())
+    value = item.get(facet)
+    return [value] if value is not None else []
+
+
+def _fingerprint(item: Dict) -> str:
+    return hashlib.sha1(json.dumps(item, sort_keys=True).encode()).hexdigest()
+
+
+class CatalogService:
+    """Indexed, incrementally reloaded view of clothes.json"""
+
+    def __init__(self, clothes_dir: Optional[str] = None,
+                 reload_interval: Optional[float] = None):
+        """
+        Initialize catalog service
+
+        Args:
+            clothes_dir: Catalog directory containing clothes.json
+            reload_interval: Minimum seconds between file change checks
+        """
+        self.path = Path(clothes_dir or settings.CLOTHES_DIR) / "clothes.json"
+        self.reload_interval = (
+            settings.CATALOG_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        )
+        self.version = ""
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[Dict]], object]] = []
+        self._file_state = None
+        self._next_check = 0.0
+
+        # Garment key -> item; key order is catalog order
+        self._items: Dict[str, Dict] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._positions: Dict[str, int] = {}
+        self._index: Dict[str, Dict[str, Set[str]]] = {facet: {} for facet in FACETS}
+        self.facets: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS}
+
+        self.refresh(force=True)
+
+    def add_listener(self, callback: Callable[[List[Dict]], object]) -> None:
+        """Call `callback(items)` with the full catalog whenever it changes"""
+        self._listeners.append(callback)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload clothes.json if it changed on disk
+
+        Args:
+            force: Check the file even if the reload interval has not passed
+
+        Returns:
+            True if the catalog changed
+        """
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+
+        with self._lock:
+            if not force and now < self._next_check:
+                return False
+            self._next_check = now + self.reload_interval
+
+            try:
+                stat = os.stat(self.path)
+            except OSError as e:
+                logger.warning(f"Garment catalog unavailable: {e}")
+                return False
+            file_state = (stat.st_mtime_ns, stat.st_size)
+            if file_state == self._file_state:
+                return False
+
+            try:
+                data = self.path.read_bytes()
+                catalog = json.loads(data)
+            except (OSError, ValueError) as e:
+                # Keep serving the previous catalog (e.g. a half-written file)
+                logger.warning(f"Could not reload garment catalog: {e}")
+                return False
+
+            changed = self._apply(catalog)
+            self._file_state = file_state
+            self.version = hashlib.sha1(data).hexdigest()[:16]
+            items = list(self._items.values())
+
+        if changed:
+            logger.info(f"Garment catalog: {len(items)} garments ({changed} re-indexed)")
+            for callback in self._listeners:
+                try:
+                    callback(items)
+                except Exception as e:
+                    logger.error(f"Catalog listener failed: {e}")
+        return bool(changed)
+
+    def _apply(self, catalog: List[Dict]) -> int:
+        """Re-index only garments that were added, removed or edited"""
+        incoming: Dict[str, Dict] = {}
+        for position, item in enumerate(catalog):
+            key = str(item.get('id', f"#{position}"))
+            incoming[key] = item
+
+        changed = 0
+        for key in list(self._items):
+            if key not in incoming:
+                self._unindex(key)
+                changed += 1
+
+        for key, item in incoming.items():
+            fingerprint = _fingerprint(item)
+            if self._fingerprints.get(key) == fingerprint:
+                continue
+            if key in self._items:
+                self._unindex(key)
+            self._fingerprints[key] = fingerprint
+            self._items[key] = item
+            for facet in FACETS:
+                for value in _facet_values(item, facet):
+                    self._index[facet].setdefault(value, set()).add(key)
+            changed += 1
+
+        # Catalog order follows the file
+        self._items = {key: self._items[key] for key in incoming}
+        self._positions = {key: position for position, key in enumerate(incoming)}
+        self.facets = {
+            facet: {value: len(keys) for value, keys in sorted(values.items())}
+            for facet, values in self._index.items()
+        }
+        return changed
+
+    def _unindex(self, key: str) -> None:
+        item = self._items.pop(key)
+        self._fingerprints.pop(key, None)
+        for facet in FACETS:
+            for value in _facet_values(item, facet):
+                keys = self._index[facet].get(value)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._index[facet][value]
+
+    def query(self, category: Optional[str] = None, gender: Optional[str] = None,
+              size: Optional[str] = None, page: int = 1,
+              page_size: Optional[int] = None) -> Dict:
+        """
+        Filter and paginate the catalog
+
+        Args:
+            category: Only garments of this category
+            gender: Only garments for this gender
+            size: Only garments available in this size
+            page: 1-based page number
+            page_size: Garments per page
+
+        Returns:
+            Dictionary with items, total, page, page_size, facets and version
+        """
+        self.refresh()
+        page_size = page_size or settings.CATALOG_PAGE_SIZE
+
+        with self._lock:
+            filters = {'category': category, 'gender': gender, 'size': size}
+            selected: Optional[Set[str]] = None
+            for facet, value in filters.items():
+                if value:
+                    keys = self._index[facet].get(value, set())
+                    selected = keys.copy() if selected is None else selected & keys
+
+            if selected is None:
+                keys = list(self._items)
+            else:
+                keys = sorted(selected, key=self._positions.__getitem__)
+
+            start = (page - 1) * page_size
+            return {
+                'items': [self._items[key] for key in keys[start:start + page_size]],
+                'total': len(keys),
+                'page': page,
+                'page_size': page_size,
+                'facets': self.facets,
+                'version': self.version
+            }
+
+    def get(self, garment_id) -> Optional[Dict]:
+        """Garment by id, or None"""
+        self.refresh()
+        with self._lock:
+            return self._items.get(str(garment_id))
+
+    def all_items(self) -> List[Dict]:
+        """Every garment in catalog order"""
+        self.refresh()
+        with self._lock:
+            return list(self._items.values())
+
+
+_catalog: Optional[CatalogService] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog_service() -> CatalogService:
+    """Process-wide catalog service"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = CatalogService()
+        return _catalog
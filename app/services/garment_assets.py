@@ -0,0 +1,264 @@
+"""
+Garment image derivatives
+
+An asset build stage turns every catalog image into:
+- gallery thumbnails (WebP) at GARMENT_THUMBNAIL_WIDTHS
+- a full-size WebP variant
+- pipeline working sizes (lossless PNG) at GARMENT_WORKING_SIZES (longest side)
+
+Derivatives are named by the source's content hash, and a manifest records
+what was built, so a rebuild skips unchanged garments and drops derivatives
+of images that changed or disappeared. The catalog and try-on path then pick
+the smallest derivative that covers the size they need.
+
+Build with: python build_garment_assets.py (the server also builds
+incrementally at startup). Builds hold an flock on the output directory, so
+when several workers start together one builds and the rest find it done.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import ImageProcessingError
+from app.utils.image_processor import load_image
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds are not serialised across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".build.lock"
+
+
+def _content_hash(path: Path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=8).hexdigest()
+
+
+def _resize(img: np.ndarray, width: int, height: int) -> np.ndarray:
+    # INTER_AREA is the right filter for downscaling and much cheaper than LANCZOS4
+    return cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def _tmp_name(path: Path) -> Path:
+    # Dotfile (skipped by the stale sweep), unique per process and thread;
+    # the real suffix stays last so OpenCV picks the encoder
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+
+
+def _write(path: Path, img: np.ndarray, params: List[int]) -> None:
+    tmp_path = _tmp_name(path)
+    if not cv2.imwrite(str(tmp_path), img, params):
+        raise OSError(f"Could not write {path}")
+    os.replace(tmp_path, path)
+
+
+def _build_one(source: Path, content_hash: str, output_dir: Path) -> Dict:
+    """Write every derivative of one garment image"""
+    # Same decode as the pipeline: EXIF orientation applied, alpha kept, 8-bit
+    img = load_image(str(source), keep_alpha=True)
+    h, w = img.shape[:2]
+    webp = [cv2.IMWRITE_WEBP_QUALITY, settings.GARMENT_WEBP_QUALITY]
+    png = [cv2.IMWRITE_PNG_COMPRESSION, 3]
+
+    # (kind, width, height, extension, write params); never upscale
+    plans = []
+    for thumb_w in settings.GARMENT_THUMBNAIL_WIDTHS:
+        if thumb_w < w:
+            plans.append(("thumb", thumb_w, round(h * thumb_w / w), "webp", webp))
+    plans.append(("webp", w, h, "webp", webp))
+    for side in settings.GARMENT_WORKING_SIZES:
+        if side < max(h, w):
+            scale = side / max(h, w)
+            plans.append(("work", round(w * scale), round(h * scale), "png", png))
+
+    derivatives = []
+    for kind, width, height, ext, params in plans:
+        name = f"{content_hash}_{kind}{width}x{height}.{ext}"
+        path = output_dir / name
+        if not path.exists():
+            resized = img if (width, height) == (w, h) else _resize(img, width, height)
+            _write(path, resized, params)
+        derivatives.append({
+            'kind': kind,
+            'width': width,
+            'height': height,
+            'file': name,
+            'bytes': path.stat().st_size
+        })
+
+    return {'hash': content_hash, 'width': w, 'height': h, 'derivatives': derivatives}
+
+
+def build_derivatives(clothes_dir: Optional[str] = None,
+                      output_dir: Optional[str] = None,
+                      force: bool = False) -> Dict:
+    """
+    Build derivatives for every catalog image, skipping unchanged ones
+
+    Args:
+        clothes_dir: Catalog directory with clothes.json and source images
+        output_dir: Where derivatives and the manifest go
+        force: Rebuild every garment
+
+    Returns:
+        Dictionary with built/skipped/failed/removed counts
+    """
+    clothes_dir = Path(clothes_dir or settings.CLOTHES_DIR)
+    output_dir = Path(output_dir or settings.GARMENT_DERIVATIVES_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / LOCK_NAME, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            return _build_locked(clothes_dir, output_dir, force)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _build_locked(clothes_dir: Path, output_dir: Path, force: bool) -> Dict:
+    manifest_path = output_dir / MANIFEST_NAME
+
+    with open(clothes_dir / "clothes.json", encoding="utf-8") as f:
+        catalog = json.load(f)
+
+    try:
+        previous = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = {}
+    stats = {'built': 0, 'skipped': 0, 'failed': 0, 'removed': 0}
+    images = sorted({item['image'] for item in catalog
+                     if item.get('image') and not item['image'].startswith('data:')})
+
+    for image in images:
+        source = clothes_dir / image
+        try:
+            content_hash = _content_hash(source)
+            entry = previous.get(image)
+            up_to_date = (
+                not force and entry is not None and entry['hash'] == content_hash
+                and all((output_dir / d['file']).exists() for d in entry['derivatives'])
+            )
+            if up_to_date:
+                manifest[image] = entry
+                stats['skipped'] += 1
+            else:
+                manifest[image] = _build_one(source, content_hash, output_dir)
+                stats['built'] += 1
+        except (OSError, ValueError, cv2.error, ImageProcessingError) as e:
+            logger.warning(f"Skipping derivatives of {image}: {e}")
+            stats['failed'] += 1
+
+    # Drop derivatives no longer referenced (changed or removed garments)
+    referenced = {d['file'] for entry in manifest.values() for d in entry['derivatives']}
+    for path in output_dir.iterdir():
+        if path.name == MANIFEST_NAME or path.name.startswith(".") or path.name in referenced:
+            continue
+        try:
+            if path.is_file():
+                path.unlink()
+                stats['removed'] += 1
+        except FileNotFoundError:
+            pass
+
+    tmp_path = _tmp_name(manifest_path)
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+
+    logger.info(f"Garment derivatives: {stats}")
+    return stats
+
+
+class GarmentAssets:
+    """Chooses garment derivatives from the build manifest"""
+
+    def __init__(self, clothes_dir: Optional[str] = None, output_dir: Optional[str] = None):
+        """
+        Initialize derivative lookup
+
+        Args:
+            clothes_dir: Catalog directory with the source images
+            output_dir: Directory holding derivatives and the manifest
+        """
+        self.clothes_dir = Path(clothes_dir or settings.CLOTHES_DIR)
+        self.output_dir = Path(output_dir or settings.GARMENT_DERIVATIVES_DIR)
+        self._manifest: Dict = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+    def _entry(self, image: str) -> Optional[Dict]:
+        """Manifest entry for a source image, reloading the manifest if rebuilt"""
+        manifest_path = self.output_dir / MANIFEST_NAME
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                try:
+                    self._manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not read garment derivative manifest: {e}")
+                    return None
+                self._manifest_mtime = mtime
+            return self._manifest.get(image)
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the manifest is rebuilt"""
+        return str(self._manifest_mtime or 0)
+
+    def pick(self, image: str, kind: str, min_width: int = 0, min_height: int = 0) -> Optional[Dict]:
+        """
+        Smallest derivative of `kind` covering the requested size
+
+        Args:
+            image: Source image name as in clothes.json
+            kind: "thumb", "webp" or "work"
+            min_width: Required width in pixels
+            min_height: Required height in pixels
+
+        Returns:
+            Derivative record, or None if none is large enough (use the source)
+        """
+        entry = self._entry(image)
+        if entry is None:
+            return None
+
+        candidates = [
+            d for d in entry['derivatives']
+            if d['kind'] == kind and d['width'] >= min_width and d['height'] >= min_height
+        ]
+        return min(candidates, key=lambda d: d['width'] * d['height'], default=None)
+
+    def gallery_url(self, image: str, width: int) -> str:
+        """URL of the smallest gallery image at least `width` wide"""
+        derivative = self.pick(image, "thumb", min_width=width) or self.pick(image, "webp")
+        if derivative is None:
+            return f"/assets/clothes/{image}"
+        return f"{settings.GARMENT_DERIVATIVES_URL}/{derivative['file']}"
+
+    def working_path(self, image: str, min_width: int, min_height: int) -> str:
+        """Path of the smallest working-size image covering the pipeline target"""
+        derivative = self.pick(image, "work", min_width=min_width, min_height=min_height)
+        if derivative is None:
+            return str(self.clothes_dir / image)
+        return str(self.output_dir / derivative['file'])
+
+
+garment_assets = GarmentAssets()
@@ -15,10 +15,22 @@ from pathlib import Path
 from typing import Optional, Dict
 import logging
 import os
+import time
 from io import BytesIO
+from app.services.ml.circuit_breaker import get_breaker, OPEN
+from app.services.ml.rate_limiter import get_scheduler, COST_PER_IMAGE, ProviderDegradedError
+from app.services.ml.response_cache import get_response_cache, hash_image
+from app.core.config import settings
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+bytes_sent = metrics.counter(
+    "tryon_api_bytes_sent_total",
+    "Image payload bytes uploaded to API providers",
+    ["provider"]
+)
+
 
 class APITryOnService:
     """
@@ -46,10 +58,19 @@ class APITryOnService:
         if provider not in self.providers:
             raise ValueError(f"Unknown provider: {provider}. Choose from: {list(self.providers.keys())}")
         
+        self.breaker = get_breaker(provider)
+        self.scheduler = get_scheduler(provider)
+        
+        # Remote providers return encoded bytes, which are cached on disk
+        self.is_remote = provider != "mock"
+        self.cache = get_response_cache() if self.is_remote and settings.API_CACHE_ENABLED else None
+        
         logger.info(f"API Try-On Service initialized with provider: {provider}")
     
     def is_available(self) -> bool:
-        """Check if API service is available"""
+        """Check if API service is available (configured, breaker not open, within budget)"""
+        if self.breaker.state == OPEN or not self.scheduler.has_budget():
+            return False
         if self.provider == "mock":
             return True
         return self.api_key is not None
@@ -67,27 +88,71 @@ class APITryOnService:
         Returns:
             Try-on result image (H, W, 3) RGB
         """
-        if not self.is_available():
+        if self.is_remote and self.api_key is None:
             raise RuntimeError(
                 f"API key not found for {self.provider}. "
                 f"Set {self.provider.upper()}_API_KEY environment variable."
             )
         
+        cache_key = None
+        if self.is_remote:
+            # Never upload more pixels than the provider works at
+            person_img = self._shape_for_provider(person_img)
+            cloth_img = self._shape_for_provider(cloth_img)
+            
+            if self.cache is not None:
+                cache_key = self.cache.make_key(
+                    self.provider, hash_image(person_img), hash_image(cloth_img)
+                )
+                cached = self.cache.get(cache_key, self.provider)
+                if cached is not None:
+                    return self._bytes_to_img(cached)
+        
+        # An open breaker rejects before any rate token or budget is used
+        permit = self.breaker.allow_request()
+        if permit is None:
+            raise ProviderDegradedError(f"Circuit breaker open for {self.provider}")
+        
+        # Wait briefly for a rate token and reserve the cost, or degrade to the local pipeline
+        try:
+            reservation = self.scheduler.acquire()
+        except Exception:
+            self.breaker.cancel(permit)
+            raise
+        
+        start = time.perf_counter()
         try:
             # Call appropriate provider
             result = self.providers[self.provider](person_img, cloth_img)
-            return result
+            
+            # A 200 with an undecodable body is a failed call, never cached
+            if self.is_remote:
+                encoded = result
+                result = self._bytes_to_img(encoded)
             
         except Exception as e:
+            self.breaker.record_failure(time.perf_counter() - start, permit)
+            self.scheduler.release(reservation)
             logger.error(f"API try-on failed: {e}")
             raise
+        
+        self.breaker.record_success(time.perf_counter() - start, permit)
+        self.scheduler.record_call(reservation)
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, encoded)
+        
+        return result
     
-    def _pixelcut_tryon(self, person_img: np.ndarray, cloth_img: np.ndarray) -> np.ndarray:
+    def _pixelcut_tryon(self, person_img: np.ndarray, cloth_img: np.ndarray) -> bytes:
         """
         Use Pixelcut API for virtual try-on
         
         API: https://www.pixelcut.ai/
         Cost: ~$0.05 per image
+        
+        Returns:
+            Encoded result image as returned by the API
         """
         url = "https://api.pixelcut.ai/v1/virtual-tryon"
         
@@ -109,18 +174,21 @@ class APITryOnService:
         response = requests.post(url, files=files, headers=headers, timeout=30)
         
         if response.status_code == 200:
-            # Convert response to image
-            result_img = self._bytes_to_img(response.content)
-            return result_img
+            return response.content
         else:
+            if response.status_code == 429:
+                self._handle_throttling(response)
             raise Exception(f"Pixelcut API error: {response.status_code} - {response.text}")
     
-    def _deepar_tryon(self, person_img: np.ndarray, cloth_img: np.ndarray) -> np.ndarray:
+    def _deepar_tryon(self, person_img: np.ndarray, cloth_img: np.ndarray) -> bytes:
         """
         Use DeepAR API for virtual try-on
         
         API: https://www.deepar.ai/
         Cost: ~$0.03 per image
+        
+        Returns:
+            Encoded result image as returned by the API
         """
         url = "https://api.deepar.ai/v1/tryon"
         
@@ -142,60 +210,50 @@ class APITryOnService:
         response = requests.post(url, files=files, headers=headers, timeout=30)
         
         if response.status_code == 200:
-            result_img = self._bytes_to_img(response.content)
-            return result_img
+            return response.content
         else:
+            if response.status_code == 429:
+                self._handle_throttling(response)
             raise Exception(f"DeepAR API error: {response.status_code} - {response.text}")
     
     def _mock_tryon(self, person_img: np.ndarray, cloth_img: np.ndarray) -> np.ndarray:
         """
         Mock API for testing (uses enhanced basic algorithm)
         Free, no API key needed
-        """
-        from app.services.ml.tryon_service import TryOnService
-        from app.utils.image_processor import save_image, load_image
-        import tempfile
-        import uuid
         
-        # Use basic service for mock
-        basic_service = TryOnService()
-        
-        # Save images temporarily
-        temp_dir = Path(tempfile.gettempdir())
-        person_path = temp_dir / f"person_{uuid.uuid4()}.jpg"
-        cloth_path = temp_dir / f"cloth_{uuid.uuid4()}.jpg"
-        result_path = temp_dir / f"result_{uuid.uuid4()}.jpg"
+        Runs the shared warm pipeline directly on the arrays, so it is a
+        low-overhead local stand-in for load-testing the provider path.
+        """
+        from app.services.ml.tryon_service import get_tryon_service
         
-        try:
-            # Save images
-            save_image(person_img, str(person_path))
-            save_image(cloth_img, str(cloth_path))
-            
-            # Process
-            basic_service.process(str(person_path), str(cloth_path), str(result_path))
-            
-            # Load result
-            result_img = load_image(str(result_path))
-            
-            return result_img
-            
-        finally:
-            # Cleanup
-            for path in [person_path, cloth_path, result_path]:
-                if path.exists():
-                    path.unlink()
+        return get_tryon_service().process_images(person_img, cloth_img)['result']
+    
+    def _shape_for_provider(self, img: np.ndarray) -> np.ndarray:
+        """Downscale so the long side does not exceed the provider's working resolution"""
+        max_side = settings.API_MAX_SIDE.get(self.provider)
+        h, w = img.shape[:2]
+        if not max_side or max(h, w) <= max_side:
+            return img
+        
+        scale = max_side / max(h, w)
+        return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
     
     def _img_to_bytes(self, img: np.ndarray) -> bytes:
-        """Convert numpy image to bytes"""
+        """Convert numpy image to JPEG bytes, lowering quality until it fits the payload target"""
         # Convert RGB to BGR for OpenCV
         img_bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
         
-        # Encode to JPEG
-        success, buffer = cv2.imencode('.jpg', img_bgr, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        
-        if not success:
-            raise Exception("Failed to encode image")
+        target_bytes = settings.API_JPEG_TARGET_KB * 1024
+        for quality in settings.API_JPEG_QUALITIES:
+            success, buffer = cv2.imencode('.jpg', img_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            
+            if not success:
+                raise Exception("Failed to encode image")
+            
+            if buffer.nbytes <= target_bytes:
+                break
         
+        bytes_sent.inc(buffer.nbytes, provider=self.provider)
         return buffer.tobytes()
     
     def _bytes_to_img(self, img_bytes: bytes) -> np.ndarray:
@@ -223,9 +281,8 @@ class APITryOnService:
             Cost breakdown by provider
         """
         costs = {
-            "pixelcut": num_images * 0.05,
-            "deepar": num_images * 0.03,
-            "mock": 0.0
+            provider: num_images * price
+            for provider, price in COST_PER_IMAGE.items()
         }
         
         return costs
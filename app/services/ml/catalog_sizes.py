@@ -0,0 +1,173 @@
+"""
+Catalog-wide size recommendation
+
+The per-garment size ranges in clothes.json ("32-34" inches for bust/chest,
+waist, hip, shoulder and length) are compiled once into (garments, sizes, measurements) range
+arrays, so one person's measurements are scored against every size of every
+garment in a single vectorized pass - no image processing involved.
+"""
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ml.size_recommendation import SizeRecommendationService
+
+logger = logging.getLogger(__name__)
+
+# clothes.json size fields -> SizeRecommendationService body measurements
+# (sleeve has no body counterpart and is not scored)
+CATALOG_FIELDS = {
+    'bust': 'chest',
+    'chest': 'chest',
+    'waist': 'waist',
+    'hip': 'hips',
+    'shoulder': 'shoulder',
+    'length': 'torso_length',
+}
+
+
+def parse_range(value) -> Tuple[float, float]:
+    """Parse "32-34" or "36" into (low, high) inches; NaN if unparseable"""
+    try:
+        parts = [float(part) for part in str(value).split('-')]
+    except ValueError:
+        return np.nan, np.nan
+    if len(parts) == 1:
+        return parts[0], parts[0]
+    if len(parts) == 2:
+        return min(parts), max(parts)
+    return np.nan, np.nan
+
+
+class CatalogSizeIndex:
+    """Size ranges of every catalog garment, indexed for vectorized scoring"""
+
+    def __init__(self, clothes_dir: Optional[str] = None,
+                 size_recommender: Optional[SizeRecommendationService] = None):
+        """
+        Initialize catalog size index
+
+        Args:
+            clothes_dir: Catalog directory containing clothes.json
+            size_recommender: Supplies measurement order, tolerances and weights
+        """
+        self.clothes_dir = Path(clothes_dir or settings.CLOTHES_DIR)
+        self.size_recommender = size_recommender or SizeRecommendationService()
+        self._lock = threading.Lock()
+        self._index: Optional[Dict] = None
+        self.reload()
+
+    def reload(self, catalog: Optional[List[Dict]] = None) -> int:
+        """
+        (Re)compile the index
+
+        Args:
+            catalog: Garment entries; read from clothes.json when omitted
+
+        Returns:
+            Number of garments indexed
+        """
+        if catalog is None:
+            try:
+                with open(self.clothes_dir / "clothes.json", encoding="utf-8") as f:
+                    catalog = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read garment catalog for size index: {e}")
+                catalog = []
+
+        body_keys = self.size_recommender.body_keys
+        garments = [item for item in catalog if item.get('sizes')]
+        max_sizes = max((len(item['sizes']) for item in garments), default=0)
+
+        # NaN marks padding sizes and measurements a garment does not list
+        low = np.full((len(garments), max_sizes, len(body_keys)), np.nan)
+        high = np.full_like(low, np.nan)
+        valid = np.zeros((len(garments), max_sizes), dtype=bool)
+        size_labels = []
+
+        for g, item in enumerate(garments):
+            size_labels.append(list(item['sizes'].keys()))
+            for s, ranges in enumerate(item['sizes'].values()):
+                valid[g, s] = True
+                for field, body_key in CATALOG_FIELDS.items():
+                    if field in ranges:
+                        m = body_keys.index(body_key)
+                        low[g, s, m], high[g, s, m] = parse_range(ranges[field])
+
+        index = {
+            'garments': [
+                {key: item.get(key) for key in ('id', 'name', 'category', 'gender')}
+                for item in garments
+            ],
+            'sizes': size_labels,
+            'low': low,
+            'high': high,
+            'valid': valid,
+        }
+        with self._lock:
+            self._index = index
+
+        logger.info(f"Indexed size ranges of {len(garments)} garments")
+        return len(garments)
+
+    def recommend(self, body_inches: Dict) -> List[Dict]:
+        """
+        Recommend a size of every garment for one person
+
+        Args:
+            body_inches: Body measurements in inches (chest, waist, shoulder,
+                torso_length, hips; missing keys are ignored)
+
+        Returns:
+            One entry per garment with recommended_size, fit_score and
+            alternative_sizes, in catalog order
+        """
+        with self._lock:
+            index = self._index
+
+        body = np.array(
+            [body_inches.get(key, np.nan) for key in self.size_recommender.body_keys],
+            dtype=np.float64
+        )
+
+        # Distance outside the range; 0 anywhere inside it
+        with np.errstate(invalid='ignore'):
+            diff = np.maximum(np.maximum(index['low'] - body, body - index['high']), 0)
+        scores = self.size_recommender.score_differences(diff)
+        scores[~index['valid']] = -np.inf
+
+        # Stable sort keeps clothes.json size order between equal scores
+        order = np.argsort(-scores, axis=1, kind='stable')
+
+        recommendations = []
+        for g, garment in enumerate(index['garments']):
+            sizes = index['sizes'][g]
+            ranked = [s for s in order[g] if s < len(sizes)]
+            recommendations.append({
+                'garment_id': garment['id'],
+                'name': garment['name'],
+                'category': garment['category'],
+                'gender': garment['gender'],
+                'recommended_size': sizes[ranked[0]],
+                'fit_score': round(float(scores[g, ranked[0]]), 3),
+                'alternative_sizes': [sizes[s] for s in ranked[1:3]]
+            })
+        return recommendations
+
+
+_index: Optional[CatalogSizeIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_catalog_size_index() -> CatalogSizeIndex:
+    """Process-wide catalog size index, compiled on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CatalogSizeIndex()
+        return _index
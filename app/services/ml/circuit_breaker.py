@@ -0,0 +1,261 @@
+"""
+Circuit breakers and health scoring for API try-on providers
+
+Each provider gets a breaker fed with the outcome and latency of every call.
+While the rolling error rate or latency percentile is over its threshold the
+breaker is open and callers go straight to the local pipeline; after a cool-off
+a limited number of trial calls decide whether it closes again. Only calls
+admitted as trials of the current half-open period count as trials; a slow
+call started before the breaker opened is recorded but cannot close it.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = metrics.gauge(
+    "tryon_provider_breaker_state",
+    "Circuit breaker state by provider (0=closed, 1=half_open, 2=open)",
+    ["provider"]
+)
+breaker_transitions = metrics.counter(
+    "tryon_provider_breaker_transitions_total",
+    "Circuit breaker state transitions by provider",
+    ["provider", "state"]
+)
+provider_health = metrics.gauge(
+    "tryon_provider_health_score",
+    "Provider health score between 0 (failing) and 1 (healthy)",
+    ["provider"]
+)
+
+
+class Permit:
+    """Admission handed out by allow_request and passed back with the outcome"""
+    __slots__ = ("trial", "generation")
+
+    def __init__(self, trial: bool, generation: int):
+        self.trial = trial
+        self.generation = generation
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of calls"""
+
+    def __init__(self, name: str,
+                 window: Optional[float] = None,
+                 min_requests: Optional[int] = None,
+                 error_rate: Optional[float] = None,
+                 latency_threshold: Optional[float] = None,
+                 open_seconds: Optional[float] = None,
+                 half_open_calls: Optional[int] = None):
+        """
+        Initialize circuit breaker
+
+        Args:
+            name: Provider name
+            window: Rolling window length in seconds
+            min_requests: Calls needed in the window before the breaker can trip
+            error_rate: Error rate that opens the breaker
+            latency_threshold: Latency (at BREAKER_LATENCY_QUANTILE) that opens the breaker
+            open_seconds: Time spent open before allowing trial calls
+            half_open_calls: Successful trial calls needed to close again
+        """
+        self.name = name
+        self.window = settings.BREAKER_WINDOW if window is None else window
+        self.min_requests = settings.BREAKER_MIN_REQUESTS if min_requests is None else min_requests
+        self.error_rate_threshold = settings.BREAKER_ERROR_RATE if error_rate is None else error_rate
+        self.latency_threshold = (
+            settings.BREAKER_LATENCY_THRESHOLD if latency_threshold is None else latency_threshold
+        )
+        self.open_seconds = settings.BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.half_open_calls = (
+            settings.BREAKER_HALF_OPEN_CALLS if half_open_calls is None else half_open_calls
+        )
+
+        # (timestamp, success, latency)
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials_in_flight = 0
+        self._trial_successes = 0
+        # Bumped on every transition, so permits from an earlier state are recognisable
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        breaker_state.set(_STATE_VALUES[CLOSED], provider=name)
+        provider_health.set(1.0, provider=name)
+
+    @property
+    def state(self) -> str:
+        """Current state (an open breaker turns half-open once the cool-off elapses)"""
+        with self._lock:
+            self._refresh_state(time.monotonic())
+            return self._state
+
+    def allow_request(self) -> Optional[Permit]:
+        """
+        Reserve a call slot
+
+        Returns:
+            A permit to pass to record_success/record_failure (or cancel if
+            the call is not made), or None if the caller may not contact the
+            provider
+        """
+        with self._lock:
+            self._refresh_state(time.monotonic())
+
+            if self._state == CLOSED:
+                return Permit(False, self._generation)
+            if self._state == HALF_OPEN and self._trials_in_flight < self.half_open_calls:
+                self._trials_in_flight += 1
+                return Permit(True, self._generation)
+            return None
+
+    def cancel(self, permit: Optional[Permit]) -> None:
+        """Give back a permit whose call was never made"""
+        with self._lock:
+            if self._is_current_trial(permit):
+                self._trials_in_flight = max(0, self._trials_in_flight - 1)
+
+    def record_success(self, latency: float, permit: Optional[Permit] = None) -> None:
+        """Record a successful provider call"""
+        self._record(True, latency, permit)
+
+    def record_failure(self, latency: float, permit: Optional[Permit] = None) -> None:
+        """Record a failed provider call (errors, timeouts, throttling)"""
+        self._record(False, latency, permit)
+
+    def _is_current_trial(self, permit: Optional[Permit]) -> bool:
+        return (
+            permit is not None and permit.trial
+            and permit.generation == self._generation and self._state == HALF_OPEN
+        )
+
+    def _record(self, success: bool, latency: float, permit: Optional[Permit]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append((now, success, latency))
+            self._prune(now)
+
+            if self._is_current_trial(permit):
+                self._trials_in_flight = max(0, self._trials_in_flight - 1)
+                if not success:
+                    self._transition(OPEN, now)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        # Start the closed period from a clean window
+                        self._calls.clear()
+                        self._transition(CLOSED, now)
+            # Outcomes of calls admitted before this half-open period are not probes
+            elif self._state == CLOSED and self._should_trip():
+                self._transition(OPEN, now)
+
+            provider_health.set(self._health_score(), provider=self.name)
+
+    def _refresh_state(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, now)
+
+    def _transition(self, state: str, now: float) -> None:
+        if state == self._state:
+            return
+
+        logger.warning(f"Circuit breaker for {self.name}: {self._state} -> {state}")
+        self._state = state
+        self._generation += 1
+        if state == OPEN:
+            self._opened_at = now
+        self._trials_in_flight = 0
+        self._trial_successes = 0
+
+        breaker_state.set(_STATE_VALUES[state], provider=self.name)
+        breaker_transitions.inc(provider=self.name, state=state)
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._calls:
+            return 0.0
+        failures = sum(1 for _, success, _ in self._calls if not success)
+        return failures / len(self._calls)
+
+    def _latency_percentile(self) -> Optional[float]:
+        if not self._calls:
+            return None
+        latencies = sorted(latency for _, _, latency in self._calls)
+        index = min(len(latencies) - 1, int(settings.BREAKER_LATENCY_QUANTILE * len(latencies)))
+        return latencies[index]
+
+    def _should_trip(self) -> bool:
+        if len(self._calls) < self.min_requests:
+            return False
+        if self._error_rate() >= self.error_rate_threshold:
+            return True
+        return self._latency_percentile() >= self.latency_threshold
+
+    def _health_score(self) -> float:
+        """Blend of success rate and latency headroom, in [0, 1]"""
+        if self._state == OPEN:
+            return 0.0
+        if not self._calls:
+            return 1.0
+
+        latency = self._latency_percentile()
+        latency_factor = min(1.0, self.latency_threshold / latency) if latency > 0 else 1.0
+        return round((1.0 - self._error_rate()) * latency_factor, 3)
+
+    def snapshot(self) -> Dict:
+        """Breaker state and rolling statistics for reporting"""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_state(now)
+            self._prune(now)
+            latency = self._latency_percentile()
+            return {
+                'state': self._state,
+                'health_score': self._health_score(),
+                'window_requests': len(self._calls),
+                'error_rate': round(self._error_rate(), 3),
+                'latency_seconds': round(latency, 3) if latency is not None else None,
+                'retry_in': (
+                    round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                    if self._state == OPEN else 0.0
+                )
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Get the shared breaker for a provider"""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+
+def get_breaker_snapshots() -> Dict[str, Dict]:
+    """Snapshots of all provider breakers"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
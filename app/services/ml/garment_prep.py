@@ -0,0 +1,339 @@
+"""
+Per-garment preparation cache
+
+Everything about a garment image that does not depend on the person is
+computed once and cached by image content hash:
+- alpha matte (the PNG alpha channel, or the background connected to the
+  image border when the image is opaque)
+- tight content bounding box, so empty margins are never warped or blended
+- LAB mean/std over garment pixels, used for lighting matching
+- a mip-map pyramid (power-of-two levels) of the crop and matte, so each
+  request resizes from the nearest level with a cheap filter instead of
+  running LANCZOS4 over the full-size image
+
+GarmentRenderCache additionally keeps the warped garment and blend mask per
+(garment, body region size), with region sizes snapped to buckets.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ml.response_cache import hash_image
+
+logger = logging.getLogger(__name__)
+
+cache_requests = metrics.counter(
+    "garment_prep_cache_requests_total",
+    "Garment preparation cache lookups by result",
+    ["result"]
+)
+cache_size = metrics.gauge(
+    "garment_prep_cache_bytes",
+    "Bytes held by the garment preparation cache",
+    multiprocess_mode="sum"
+)
+render_cache_requests = metrics.counter(
+    "garment_render_cache_requests_total",
+    "Warped garment render cache lookups by result",
+    ["result"]
+)
+render_cache_size = metrics.gauge(
+    "garment_render_cache_bytes",
+    "Bytes held by the warped garment render cache",
+    multiprocess_mode="sum"
+)
+
+
+def _background_matte(bgr: np.ndarray, tolerance: int) -> np.ndarray:
+    """Opaque image: pixels close to the border colour and connected to the border are background"""
+    border = np.concatenate([bgr[0], bgr[-1], bgr[:, 0], bgr[:, -1]])
+    background_colour = np.median(border, axis=0)
+
+    candidate = (np.abs(bgr.astype(np.int16) - background_colour).max(axis=2) <= tolerance)
+    _, labels = cv2.connectedComponents(candidate.astype(np.uint8), connectivity=4)
+    border_labels = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    border_labels = border_labels[border_labels > 0]  # 0 = not a candidate
+
+    alpha = (~np.isin(labels, border_labels)).astype(np.float32)
+    if not alpha.any():
+        # Nothing distinguishable from the background - treat the image as all garment
+        return np.ones(bgr.shape[:2], dtype=np.float32)
+    # Soften the cut-out edge
+    return cv2.GaussianBlur(alpha, (3, 3), 0)
+
+
+def build_pyramid(cloth: np.ndarray, alpha: np.ndarray,
+                  min_side: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Power-of-two (cloth, alpha) levels, full size first
+
+    Args:
+        cloth: BGR garment crop
+        alpha: Matching float32 matte
+        min_side: Stop before the shorter side drops below this
+
+    Returns:
+        List of read-only (cloth, alpha) levels, each half the size of the previous
+    """
+    min_side = settings.GARMENT_PYRAMID_MIN_SIDE if min_side is None else min_side
+    levels = [(cloth, alpha)]
+    while min(cloth.shape[:2]) // 2 >= min_side:
+        # 2x2 box filter (classic mip-map), alias-free and sharper than pyrDown
+        size = (cloth.shape[1] // 2, cloth.shape[0] // 2)
+        cloth = cv2.resize(cloth, size, interpolation=cv2.INTER_AREA)
+        alpha = cv2.resize(alpha, size, interpolation=cv2.INTER_AREA)
+        cloth.setflags(write=False)
+        alpha.setflags(write=False)
+        levels.append((cloth, alpha))
+    return levels
+
+
+def resize_garment(garment: Dict, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Garment crop and matte at (width, height), resized from the nearest pyramid level
+
+    Uses the smallest level at least as large as the target and finishes
+    with INTER_AREA (downscale) or INTER_LINEAR (upscale past full size).
+
+    Args:
+        garment: Prepared garment from prepare_garment
+        width: Target width in pixels
+        height: Target height in pixels
+
+    Returns:
+        (cloth, alpha) at the target size; may be a read-only pyramid level
+    """
+    levels = garment['pyramid']
+    cloth, alpha = levels[0]
+    for level_cloth, level_alpha in levels[1:]:
+        level_h, level_w = level_cloth.shape[:2]
+        if level_w < width or level_h < height:
+            break
+        cloth, alpha = level_cloth, level_alpha
+
+    level_h, level_w = cloth.shape[:2]
+    if (level_w, level_h) == (width, height):
+        return cloth, alpha
+    interpolation = cv2.INTER_AREA if width <= level_w and height <= level_h else cv2.INTER_LINEAR
+    return (
+        cv2.resize(cloth, (width, height), interpolation=interpolation),
+        cv2.resize(alpha, (width, height), interpolation=interpolation)
+    )
+
+
+def prepare_garment(cloth_img: np.ndarray, tolerance: Optional[int] = None) -> Dict:
+    """
+    Compute matte, bounding box and colour statistics of a garment image
+
+    Args:
+        cloth_img: Garment image, BGR or BGRA (as read with IMREAD_UNCHANGED)
+        tolerance: Max channel difference from the border colour counted as background
+
+    Returns:
+        Dictionary with 'cloth' (BGR, cropped), 'alpha' (float32 in [0, 1],
+        cropped), 'pyramid' (see build_pyramid), 'bbox' (x, y, w, h in the
+        source), 'lab_mean', 'lab_std'
+    """
+    tolerance = settings.GARMENT_BG_TOLERANCE if tolerance is None else tolerance
+
+    if cloth_img.ndim == 2:
+        cloth_img = cv2.cvtColor(cloth_img, cv2.COLOR_GRAY2BGR)
+
+    bgr = np.ascontiguousarray(cloth_img[:, :, :3])
+    alpha = None
+    if cloth_img.shape[2] == 4:
+        alpha = cloth_img[:, :, 3].astype(np.float32) / 255.0
+        if alpha.min() >= 1.0:
+            alpha = None  # Fully opaque alpha carries no matte
+    if alpha is None:
+        alpha = _background_matte(bgr, tolerance)
+
+    x, y, w, h = cv2.boundingRect((alpha > 0.01).astype(np.uint8))
+    if w == 0 or h == 0:
+        x, y = 0, 0
+        h, w = bgr.shape[:2]
+
+    cloth = np.ascontiguousarray(bgr[y:y + h, x:x + w])
+    alpha = np.ascontiguousarray(alpha[y:y + h, x:x + w])
+    # Shared between requests through the cache
+    cloth.setflags(write=False)
+    alpha.setflags(write=False)
+
+    lab = cv2.cvtColor(cloth, cv2.COLOR_BGR2LAB).astype(np.float32)
+    garment_pixels = lab[alpha > 0.5]
+    if len(garment_pixels) == 0:
+        garment_pixels = lab.reshape(-1, 3)
+
+    return {
+        'cloth': cloth,
+        'alpha': alpha,
+        'pyramid': build_pyramid(cloth, alpha),
+        'bbox': (x, y, w, h),
+        'lab_mean': garment_pixels.mean(axis=0),
+        'lab_std': garment_pixels.std(axis=0)
+    }
+
+
+class _ByteLRU:
+    """Thread-safe LRU bounded by the total size of its values"""
+
+    def __init__(self, max_bytes: int, size_of: Callable[[object], int],
+                 requests_metric, bytes_metric):
+        self.max_bytes = max_bytes
+        self._size_of = size_of
+        self._requests = requests_metric
+        self._bytes = bytes_metric
+        self._entries: "OrderedDict[object, object]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, create: Callable[[], object]):
+        """Cached value for `key`, computing and storing it on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        self._requests.inc(result="miss" if value is None else "hit")
+        if value is not None:
+            return value
+
+        value = create()
+        size = self._size_of(value)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = value
+                    self._total += size
+                    while self._total > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._total -= self._size_of(evicted)
+                self._bytes.set(self._total)
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total, 'max_bytes': self.max_bytes}
+
+
+class GarmentPreparer:
+    """Size-bounded LRU cache of prepared garments, keyed by image content"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Initialize garment preparation cache
+
+        Args:
+            max_bytes: Maximum total size of cached crops, mattes and pyramids
+        """
+        max_bytes = settings.GARMENT_PREP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._cache = _ByteLRU(max_bytes, self._size, cache_requests, cache_size)
+
+    @staticmethod
+    def _size(entry: Dict) -> int:
+        # Level 0 is the crop itself
+        return sum(cloth.nbytes + alpha.nbytes for cloth, alpha in entry['pyramid'])
+
+    def prepare(self, cloth_img: np.ndarray) -> Dict:
+        """Prepared garment for `cloth_img`, computed once per distinct image"""
+        key = hash_image(cloth_img)
+
+        def create():
+            entry = prepare_garment(cloth_img)
+            entry['key'] = key
+            return entry
+
+        return self._cache.get_or_create(key, create)
+
+    def stats(self) -> Dict:
+        """Entry count and bytes held"""
+        return self._cache.stats()
+
+
+def snap_region(body_region: Dict, image_shape: Tuple[int, ...], bucket: int) -> Dict:
+    """
+    Round a body region's size to multiples of `bucket` pixels
+
+    The region stays centred horizontally and keeps its top edge (the garment
+    must never move up towards the face); it is shifted or trimmed to stay
+    inside the image.
+
+    Args:
+        body_region: Region with x1, y1, x2, y2, width, height
+        image_shape: Shape of the person image
+        bucket: Bucket size in pixels (0 or 1 leaves the region unchanged)
+
+    Returns:
+        Copy of the region with snapped coordinates
+    """
+    if bucket <= 1:
+        return body_region
+    img_h, img_w = image_shape[:2]
+
+    width = min(max(bucket, round(body_region['width'] / bucket) * bucket), img_w)
+    center_x = (body_region['x1'] + body_region['x2']) // 2
+    x1 = min(max(0, center_x - width // 2), img_w - width)
+
+    y1 = body_region['y1']
+    height = max(bucket, round(body_region['height'] / bucket) * bucket)
+    if y1 + height > img_h:
+        # Trim to whole buckets below the top edge where possible
+        height = (img_h - y1) // bucket * bucket or img_h - y1
+
+    return {**body_region, 'x1': x1, 'y1': y1, 'x2': x1 + width, 'y2': y1 + height,
+            'width': width, 'height': height}
+
+
+class GarmentRenderCache:
+    """
+    Warped garments and blend masks per (garment, region size)
+
+    A garment's warp and blend mask depend only on the region's width and
+    height, so with sizes snapped to buckets (snap_region) most requests
+    reuse a render and only colour matching and compositing remain.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Initialize render cache
+
+        Args:
+            max_bytes: Maximum total size of cached renders
+        """
+        max_bytes = settings.TRYON_RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._cache = _ByteLRU(max_bytes, self._size, render_cache_requests, render_cache_size)
+
+    @staticmethod
+    def _size(render: Tuple[np.ndarray, ...]) -> int:
+        return sum(array.nbytes for array in render)
+
+    def get_or_render(self, garment: Dict, width: int, height: int,
+                      render: Callable[[], Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+        """
+        Cached render of `garment` at (width, height)
+
+        Args:
+            garment: Prepared garment (from GarmentPreparer)
+            width: Region width in pixels
+            height: Region height in pixels
+            render: Produces the arrays to cache on a miss; they are made read-only
+
+        Returns:
+            The cached arrays
+        """
+        def create():
+            arrays = render()
+            for array in arrays:
+                array.setflags(write=False)
+            return arrays
+
+        return self._cache.get_or_create((garment['key'], width, height), create)
+
+    def stats(self) -> Dict:
+        """Entry count and bytes held"""
+        return self._cache.stats()
@@ -0,0 +1,271 @@
+"""
+Hedged execution of remote API try-on against the local pipeline
+
+The remote provider is started first. If it has not answered after the hedge
+delay (derived from the provider's recorded latency distribution), the local
+pipeline is started as well, and whichever result satisfies the quality
+preference within the request deadline is returned.
+
+Remote and local branches run in separate thread pools, so slow or abandoned
+provider calls can never queue the local hedge behind them. Each branch runs
+in a copy of the request's context, so its stage timings, trace spans and
+annotations land in the request that started it.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ml.rate_limiter import ProviderDegradedError
+
+logger = logging.getLogger(__name__)
+
+LOCAL_PROVIDER = "local"
+
+provider_latency = metrics.histogram(
+    "tryon_provider_latency_seconds",
+    "Latency of attempted try-on calls by provider, failed ones included",
+    ["provider"]
+)
+hedge_outcomes = metrics.counter(
+    "tryon_hedge_outcomes_total",
+    "Hedged try-on results by winning branch",
+    ["provider", "winner"]
+)
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(branch: str) -> ThreadPoolExecutor:
+    """Shared worker pool for the remote or the local branches"""
+    with _executors_lock:
+        executor = _executors.get(branch)
+        if executor is None:
+            workers = settings.HEDGE_LOCAL_WORKERS if branch == LOCAL_PROVIDER else settings.HEDGE_MAX_WORKERS
+            executor = _executors[branch] = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix=f"tryon-hedge-{branch}"
+            )
+        return executor
+
+
+class HedgedExecutor:
+    """Race a remote provider call against the local try-on pipeline"""
+
+    def __init__(self, provider: str,
+                 hedge_delay: Optional[float] = None,
+                 deadline: Optional[float] = None,
+                 preference: Optional[str] = None):
+        """
+        Initialize hedged executor
+
+        Args:
+            provider: Remote provider name (used as histogram label)
+            hedge_delay: Fallback delay before latency history exists
+            deadline: Overall request deadline in seconds
+            preference: "quality" (prefer the remote result) or "fastest"
+        """
+        self.provider = provider
+        self.hedge_delay = settings.HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.deadline = settings.TRYON_DEADLINE if deadline is None else deadline
+        self.preference = preference or settings.HEDGE_PREFERENCE
+
+        if self.preference not in ("quality", "fastest"):
+            raise ValueError(f"Unknown hedge preference: {self.preference}")
+
+    def compute_hedge_delay(self) -> float:
+        """
+        Derive the hedge delay from recorded latencies
+
+        Uses the configured quantile of the provider's latency, but starts the
+        local pipeline early enough that its own typical latency still fits
+        within the deadline.
+        """
+        delay = self.hedge_delay
+
+        if provider_latency.count(provider=self.provider) >= settings.HEDGE_MIN_SAMPLES:
+            delay = provider_latency.quantile(settings.HEDGE_QUANTILE, provider=self.provider)
+
+        if provider_latency.count(provider=LOCAL_PROVIDER) >= settings.HEDGE_MIN_SAMPLES:
+            local_latency = provider_latency.quantile(settings.HEDGE_QUANTILE, provider=LOCAL_PROVIDER)
+            delay = min(delay, self.deadline - local_latency)
+
+        return max(settings.HEDGE_MIN_DELAY, delay)
+
+    def _timed(self, provider: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """
+        Wrap a branch so every attempt feeds the latency histogram
+
+        Failed and abandoned (timed-out) calls are observed when they finish,
+        so slow failures keep the hedge delay honest; calls the scheduler or
+        breaker refused never reached the provider and are skipped.
+        """
+        def run():
+            start = time.perf_counter()
+            attempted = True
+            try:
+                return fn()
+            except ProviderDegradedError:
+                attempted = False
+                raise
+            finally:
+                if attempted:
+                    provider_latency.observe(time.perf_counter() - start, provider=provider)
+        return run
+
+    def _submit(self, provider: str, fn: Callable[[], Any]) -> Future:
+        branch = LOCAL_PROVIDER if provider == LOCAL_PROVIDER else "remote"
+        context = contextvars.copy_context()
+        return _get_executor(branch).submit(context.run, self._timed(provider, fn))
+
+    @staticmethod
+    def _wrap(future: Future) -> asyncio.Future:
+        """Awaitable view of a worker future whose errors never go unobserved"""
+        waiter = asyncio.wrap_future(future)
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return waiter
+
+    def _discard(self, future: Future, name: str,
+                 on_discard: Optional[Callable[[str, Any], None]]) -> None:
+        """
+        Cancel the losing branch
+
+        A branch already running in a worker thread cannot be interrupted; its
+        result is handed to ``on_discard`` once it completes so callers can
+        release anything it produced.
+        """
+        if future.cancel() or not on_discard:
+            return
+
+        def cleanup(f: Future):
+            if not f.cancelled() and f.exception() is None:
+                on_discard(name, f.result())
+        future.add_done_callback(cleanup)
+
+    async def run(self, remote: Callable[[], Any], local: Callable[[], Any],
+                  on_discard: Optional[Callable[[str, Any], None]] = None,
+                  on_settled: Optional[Callable[[], None]] = None) -> Dict:
+        """
+        Run the remote call, hedged by the local pipeline
+
+        Args:
+            remote: Blocking callable for the remote provider
+            local: Blocking callable for the local pipeline
+            on_discard: Called with (branch, result) for a losing branch that
+                completes anyway
+            on_settled: Called once run() has returned or raised and every
+                branch it started has finished (possibly later, from a worker
+                thread), e.g. to release resources a losing branch still uses
+
+        Returns:
+            Dictionary with winning 'branch' ("remote"/"local"), its 'result',
+            whether the local branch was started ('hedged') and 'hedge_delay'
+        """
+        # run() itself holds one count; every submitted branch holds another
+        outstanding = [1]
+        outstanding_lock = threading.Lock()
+
+        def branch_done(_=None) -> None:
+            with outstanding_lock:
+                outstanding[0] -= 1
+                settled = outstanding[0] == 0
+            if settled and on_settled is not None:
+                on_settled()
+
+        def submit(provider: str, fn: Callable[[], Any]) -> Future:
+            future = self._submit(provider, fn)
+            with outstanding_lock:
+                outstanding[0] += 1
+            future.add_done_callback(branch_done)
+            return future
+
+        try:
+            return await self._race(remote, local, on_discard, submit)
+        finally:
+            branch_done()
+
+    async def _race(self, remote: Callable[[], Any], local: Callable[[], Any],
+                    on_discard: Optional[Callable[[str, Any], None]],
+                    submit: Callable[[str, Callable[[], Any]], Future]) -> Dict:
+        """Race the branches for run(); `submit` starts a branch and tracks it"""
+        start = time.perf_counter()
+        deadline_at = start + self.deadline
+        delay = self.compute_hedge_delay()
+
+        remote_future = submit(self.provider, remote)
+        remote_waiter = self._wrap(remote_future)
+        local_future = None
+        local_result = None
+        local_done = False
+        last_error = None
+
+        def outcome(branch: str, result: Any) -> Dict:
+            hedge_outcomes.inc(provider=self.provider, winner=branch)
+            return {
+                'branch': branch,
+                'result': result,
+                'hedged': local_future is not None,
+                'hedge_delay': delay
+            }
+
+        # Give the remote provider a head start
+        await asyncio.wait({remote_waiter}, timeout=delay)
+        if remote_waiter.done() and remote_waiter.exception() is None:
+            return outcome("remote", remote_waiter.result())
+
+        if remote_waiter.done():
+            last_error = remote_waiter.exception()
+            logger.warning(f"API provider {self.provider} failed, using local pipeline: {last_error}")
+        else:
+            logger.info(f"API provider {self.provider} slower than {delay:.2f}s, starting local pipeline")
+
+        local_future = submit(LOCAL_PROVIDER, local)
+        local_waiter = self._wrap(local_future)
+        pending = {f for f in (remote_waiter, local_waiter) if not f.done()}
+
+        while pending:
+            remaining = deadline_at - time.perf_counter()
+            if remaining <= 0:
+                break
+
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    continue
+
+                if future is remote_waiter:
+                    self._discard(local_future, "local", on_discard)
+                    return outcome("remote", future.result())
+
+                local_result = future.result()
+                local_done = True
+
+            if local_done and (self.preference == "fastest" or remote_waiter.done()):
+                break
+
+        if local_done:
+            self._discard(remote_future, "remote", on_discard)
+            return outcome("local", local_result)
+
+        # Deadline passed without a usable result: the remote call is abandoned
+        # and the local pipeline is the floor, however long it takes
+        self._discard(remote_future, "remote", on_discard)
+        if not local_future.done():
+            logger.warning(f"Try-on deadline of {self.deadline:.1f}s exceeded, waiting for local pipeline")
+            await asyncio.wait({local_waiter})
+
+        if local_future.exception() is not None:
+            raise local_future.exception() from last_error
+        return outcome("local", local_future.result())
@@ -3,8 +3,10 @@ Pose detection service using MediaPipe
 """
 import cv2
 import numpy as np
+import threading
 from typing import List, Dict, Tuple, Optional
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.core.exceptions import PoseDetectionError
 
 try:
@@ -13,12 +15,21 @@ try:
 except ImportError:
     MEDIAPIPE_AVAILABLE = False
 
+pose_fallbacks = metrics.counter(
+    "pose_fallback_total",
+    "Detections answered by the simplified pose estimate, by reason",
+    ["reason"]
+)
+
 
 class PoseDetector:
     """Pose detection using MediaPipe"""
     
     def __init__(self):
         """Initialize pose detector"""
+        # MediaPipe graphs are not safe for concurrent process() calls
+        self._lock = threading.Lock()
+        
         if not MEDIAPIPE_AVAILABLE:
             print("Warning: MediaPipe not available. Using simplified pose detection.")
             self.mp_pose = None
@@ -53,16 +64,19 @@ class PoseDetector:
         try:
             # If MediaPipe not available, use simplified detection
             if not self.pose:
+                pose_fallbacks.inc(reason="unavailable")
                 return self._simplified_pose_detection(image)
             
             # Convert to RGB
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # Process
-            results = self.pose.process(image_rgb)
+            with self._lock:
+                results = self.pose.process(image_rgb)
             
             if not results.pose_landmarks:
                 # Fall back to simplified detection
+                pose_fallbacks.inc(reason="no_landmarks")
                 return self._simplified_pose_detection(image)
             
             # Extract landmarks
@@ -82,13 +96,15 @@ class PoseDetector:
                 'landmarks': landmarks,
                 'confidence': float(confidence),
                 'pose_detected': True,
-                'num_landmarks': len(landmarks)
+                'num_landmarks': len(landmarks),
+                'method': 'mediapipe'
             }
             
         except PoseDetectionError:
             raise
         except Exception as e:
             # Fall back to simplified detection
+            pose_fallbacks.inc(reason="error")
             return self._simplified_pose_detection(image)
     
     def _simplified_pose_detection(self, image: np.ndarray) -> Dict:
@@ -140,7 +156,8 @@ class PoseDetector:
             'landmarks': landmarks,
             'confidence': 0.9,
             'pose_detected': True,
-            'num_landmarks': 33
+            'num_landmarks': 33,
+            'method': 'simplified'
         }
     
     def get_keypoints(self, landmarks: List[Dict]) -> Dict[str, Tuple[float, float]]:
@@ -0,0 +1,428 @@
+"""
+Rate limiting and spend control for paid API try-on providers
+
+- TokenBucket: per-provider request rate limit
+- SpendTracker: rolling daily/monthly spend against configured caps, shared
+  by all workers through a JSON file
+- ProviderScheduler: admits a call, queues it briefly for a rate token, or
+  degrades it to the local pipeline when limits are near
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock only covers threads of one process
+    fcntl = None
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Published per-image prices (USD)
+COST_PER_IMAGE = {
+    "pixelcut": 0.05,
+    "deepar": 0.03,
+    "mock": 0.0
+}
+
+DAY_SECONDS = 24 * 3600
+MONTH_SECONDS = 30 * DAY_SECONDS
+# How stale the in-memory totals used by has_budget() may get
+SPEND_REFRESH_SECONDS = 5.0
+
+spend_total = metrics.counter(
+    "tryon_api_spend_dollars_total",
+    "Money spent on API try-on calls",
+    ["provider"]
+)
+budget_remaining = metrics.gauge(
+    "tryon_api_budget_remaining_dollars",
+    "Remaining API budget in the rolling period",
+    ["period"]
+)
+scheduler_decisions = metrics.counter(
+    "tryon_api_scheduler_decisions_total",
+    "API scheduler decisions by provider",
+    ["provider", "decision"]
+)
+queue_depth = metrics.gauge(
+    "tryon_api_queue_depth",
+    "Requests waiting for a provider rate-limit token",
+    ["provider"],
+    multiprocess_mode="sum"
+)
+
+
+class ProviderDegradedError(RuntimeError):
+    """Raised when a provider call is degraded to the local pipeline"""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available
+
+        Returns:
+            0.0 on success, otherwise seconds until a token will be available
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket and hold it empty for `seconds` (e.g. after a 429)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(0.0, self._tokens) - seconds * self.rate
+
+
+class SpendTracker:
+    """
+    Rolling spend over the last day and 30 days, in hourly buckets
+
+    The buckets live in a JSON file (API_SPEND_FILE) shared by all worker
+    processes and surviving restarts; every update is a locked
+    read-modify-write followed by an atomic replace. Calls reserve their cost
+    before contacting the provider and settle it afterwards, so concurrent
+    calls cannot overshoot the caps. Reservations of calls that never settle
+    (a crashed worker) expire after API_SPEND_RESERVATION_TTL.
+
+    headroom()/totals() answer from the totals last seen by this process,
+    re-read at most every SPEND_REFRESH_SECONDS and never waiting for the
+    lock, so they are safe to call on the event loop; reserve() enforces the
+    caps exactly.
+    """
+
+    def __init__(self, daily_cap: float, monthly_cap: float, path: Optional[str] = None):
+        self.daily_cap = daily_cap
+        self.monthly_cap = monthly_cap
+        self.path = Path(settings.API_SPEND_FILE if path is None else path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_path = self.path.with_suffix(self.path.suffix + ".lock")
+        self._lock = threading.Lock()
+        # (day, month, reserved) as of the last file access, and when (monotonic)
+        self._seen: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+        self._seen_at = float("-inf")
+
+    @contextmanager
+    def _locked(self, blocking: bool = True):
+        """
+        Exclusive access across threads and (where fcntl exists) processes
+
+        Yields:
+            False if `blocking` is off and the lock is held elsewhere
+        """
+        if not self._lock.acquire(blocking):
+            yield False
+            return
+        try:
+            with open(self._lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        yield False
+                        return
+                try:
+                    yield True
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+    def _load(self, now: float) -> Dict:
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            state = {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read spend file {self.path}, starting empty: {e}")
+            state = {}
+
+        # [hour index, amount], oldest first
+        oldest = int((now - MONTH_SECONDS) // 3600)
+        buckets = [bucket for bucket in state.get('buckets', []) if bucket[0] > oldest]
+        # id -> [expires at, amount]
+        reservations = {
+            key: value for key, value in state.get('reservations', {}).items() if value[0] > now
+        }
+        return {'buckets': buckets, 'reservations': reservations}
+
+    def _save(self, state: Dict) -> None:
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(state), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Could not write spend file {self.path}: {e}")
+
+    @staticmethod
+    def _spent_since(state: Dict, start: float) -> float:
+        first_hour = int(start // 3600)
+        return sum(amount for hour, amount in state['buckets'] if hour > first_hour)
+
+    def _totals(self, state: Dict, now: float) -> Tuple[float, float, float]:
+        """(day, month, reserved) of a loaded state, remembered for headroom()"""
+        reserved = sum(amount for _, amount in state['reservations'].values())
+        self._seen = (
+            self._spent_since(state, now - DAY_SECONDS),
+            self._spent_since(state, now - MONTH_SECONDS),
+            reserved
+        )
+        self._seen_at = time.monotonic()
+        return self._seen
+
+    def _fits(self, daily: float, monthly: float, amount: float, limit: float) -> bool:
+        if self.daily_cap > 0 and daily + amount > self.daily_cap * limit:
+            return False
+        if self.monthly_cap > 0 and monthly + amount > self.monthly_cap * limit:
+            return False
+        return True
+
+    def reserve(self, amount: float, limit: float = 1.0) -> Optional[str]:
+        """
+        Reserve `amount` for a call about to be made
+
+        Args:
+            amount: Expected cost of the call
+            limit: Fraction of each cap that spend plus reservations may reach
+
+        Returns:
+            Reservation id for settle()/release(), or None if it does not fit
+        """
+        now = time.time()
+        with self._locked():
+            state = self._load(now)
+            daily, monthly, reserved = self._totals(state, now)
+            if not self._fits(daily + reserved, monthly + reserved, amount, limit):
+                return None
+            reservation = uuid.uuid4().hex
+            state['reservations'][reservation] = [now + settings.API_SPEND_RESERVATION_TTL, amount]
+            self._save(state)
+            self._totals(state, now)
+        return reservation
+
+    def settle(self, reservation: Optional[str], provider: str, amount: float) -> None:
+        """Replace a reservation with the money actually spent"""
+        if reservation is None and amount <= 0:
+            return
+        now = time.time()
+        hour = int(now // 3600)
+        with self._locked():
+            state = self._load(now)
+            state['reservations'].pop(reservation, None)
+            if amount > 0:
+                buckets = state['buckets']
+                if buckets and buckets[-1][0] == hour:
+                    buckets[-1][1] += amount
+                else:
+                    buckets.append([hour, amount])
+            self._save(state)
+            self._totals(state, now)
+
+        if amount > 0:
+            spend_total.inc(amount, provider=provider)
+        self._publish()
+
+    def release(self, reservation: Optional[str]) -> None:
+        """Drop a reservation whose call was not billed"""
+        if reservation is None:
+            return
+        now = time.time()
+        with self._locked():
+            state = self._load(now)
+            if state['reservations'].pop(reservation, None) is not None:
+                self._save(state)
+            self._totals(state, now)
+
+    def record(self, provider: str, amount: float) -> None:
+        """Record money spent on a call that was not reserved"""
+        self.settle(None, provider, amount)
+
+    def _recent(self) -> Tuple[float, float, float]:
+        """Last seen (day, month, reserved), re-read if stale and the lock is free"""
+        if time.monotonic() - self._seen_at >= SPEND_REFRESH_SECONDS:
+            with self._locked(blocking=False) as acquired:
+                if acquired:
+                    now = time.time()
+                    self._totals(self._load(now), now)
+        return self._seen
+
+    def totals(self) -> Tuple[float, float]:
+        """Spend over the rolling (day, month), as of at most SPEND_REFRESH_SECONDS ago"""
+        daily, monthly, _ = self._recent()
+        return daily, monthly
+
+    def headroom(self) -> float:
+        """Smallest remaining fraction of either cap, counting reservations (1.0 = nothing spent)"""
+        daily, monthly, reserved = self._recent()
+        fractions = []
+        if self.daily_cap > 0:
+            fractions.append(1.0 - (daily + reserved) / self.daily_cap)
+        if self.monthly_cap > 0:
+            fractions.append(1.0 - (monthly + reserved) / self.monthly_cap)
+        return max(0.0, min(fractions)) if fractions else 1.0
+
+    def _publish(self) -> None:
+        daily, monthly, _ = self._recent()
+        budget_remaining.set(max(0.0, self.daily_cap - daily), period="day")
+        budget_remaining.set(max(0.0, self.monthly_cap - monthly), period="month")
+
+
+_spend_tracker: Optional[SpendTracker] = None
+_spend_lock = threading.Lock()
+
+
+def get_spend_tracker() -> SpendTracker:
+    """Process-wide spend tracker shared by all providers"""
+    global _spend_tracker
+    with _spend_lock:
+        if _spend_tracker is None:
+            _spend_tracker = SpendTracker(settings.API_DAILY_BUDGET, settings.API_MONTHLY_BUDGET)
+            _spend_tracker._publish()
+        return _spend_tracker
+
+
+class ProviderScheduler:
+    """Admission control for one provider: rate limit plus budget"""
+
+    def __init__(self, provider: str, spend: Optional[SpendTracker] = None):
+        self.provider = provider
+        self.cost = COST_PER_IMAGE.get(provider, 0.0)
+        self.spend = spend or get_spend_tracker()
+
+        rate = settings.API_RATE_LIMITS.get(provider)
+        self.bucket = TokenBucket(rate, settings.API_RATE_BURST) if rate else None
+
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def has_budget(self) -> bool:
+        """Cheap check used before a call is attempted"""
+        if self.cost <= 0:
+            return True
+        return self.spend.headroom() > 1.0 - settings.API_BUDGET_SOFT_LIMIT
+
+    def acquire(self, max_wait: Optional[float] = None) -> Optional[str]:
+        """
+        Admit a call, waiting up to `max_wait` seconds for a rate token
+
+        The call's cost is reserved against the budget first; pass the
+        returned reservation to record_call() or release().
+
+        Returns:
+            Spend reservation id (None for free providers)
+
+        Raises:
+            ProviderDegradedError: If the budget is near its cap or no token
+                became available in time
+        """
+        max_wait = settings.API_QUEUE_MAX_WAIT if max_wait is None else max_wait
+
+        reservation = None
+        if self.cost > 0:
+            reservation = self.spend.reserve(self.cost, settings.API_BUDGET_SOFT_LIMIT)
+            if reservation is None:
+                scheduler_decisions.inc(provider=self.provider, decision="degraded_budget")
+                raise ProviderDegradedError(f"API budget nearly exhausted, not calling {self.provider}")
+
+        try:
+            self._wait_for_token(max_wait)
+        except ProviderDegradedError:
+            self.spend.release(reservation)
+            raise
+        return reservation
+
+    def _wait_for_token(self, max_wait: float) -> None:
+        if self.bucket is None:
+            scheduler_decisions.inc(provider=self.provider, decision="admitted")
+            return
+
+        wait = self.bucket.try_acquire()
+        if wait == 0.0:
+            scheduler_decisions.inc(provider=self.provider, decision="admitted")
+            return
+
+        deadline = time.monotonic() + max_wait
+        with self._lock:
+            self._waiting += 1
+            queue_depth.set(self._waiting, provider=self.provider)
+        try:
+            while time.monotonic() + wait <= deadline:
+                time.sleep(wait)
+                wait = self.bucket.try_acquire()
+                if wait == 0.0:
+                    scheduler_decisions.inc(provider=self.provider, decision="queued")
+                    return
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                queue_depth.set(self._waiting, provider=self.provider)
+
+        scheduler_decisions.inc(provider=self.provider, decision="degraded_rate")
+        raise ProviderDegradedError(f"Rate limit for {self.provider} reached, not calling provider")
+
+    def record_call(self, reservation: Optional[str] = None) -> None:
+        """Charge a completed (billable) call, settling its reservation"""
+        self.spend.settle(reservation, self.provider, self.cost)
+
+    def release(self, reservation: Optional[str]) -> None:
+        """Return the reservation of a call that failed and was not billed"""
+        self.spend.release(reservation)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """Back off after the provider answered 429"""
+        if self.bucket is not None:
+            self.bucket.drain(retry_after or 1.0 / self.bucket.rate)
+        logger.warning(f"{self.provider} returned 429, backing off")
+
+    def snapshot(self) -> Dict:
+        """Current limiter and spend state for reporting"""
+        daily, monthly = self.spend.totals()
+        return {
+            'cost_per_image': self.cost,
+            'rate_limit': self.bucket.rate if self.bucket else None,
+            'queued': self._waiting,
+            'spent_day': round(daily, 2),
+            'spent_month': round(monthly, 2),
+            'budget_headroom': round(self.spend.headroom(), 3)
+        }
+
+
+_schedulers: Dict[str, ProviderScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """Get the shared scheduler for a provider"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider)
+        if scheduler is None:
+            scheduler = _schedulers[provider] = ProviderScheduler(provider)
+        return scheduler
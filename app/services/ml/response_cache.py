@@ -0,0 +1,158 @@
+"""
+Disk-backed cache of API try-on responses
+
+Results are keyed by (provider, person image hash, garment image hash) and
+stored as the raw bytes the provider returned. Total size is bounded; the
+least recently used entries are evicted first.
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+cache_requests = metrics.counter(
+    "tryon_api_cache_requests_total",
+    "API response cache lookups by result",
+    ["provider", "result"]
+)
+cache_size = metrics.gauge(
+    "tryon_api_cache_bytes",
+    "Bytes held by the API response cache",
+    multiprocess_mode="sum"
+)
+
+
+def hash_image(img: np.ndarray) -> str:
+    """Content hash of an image array (shape included)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(img.shape).encode())
+    digest.update(np.ascontiguousarray(img).data)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of provider responses on disk"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Initialize response cache
+
+        Args:
+            directory: Cache directory
+            max_bytes: Maximum total size of cached responses
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Entry sizes, ordered oldest access first
+        self._entries: Dict[str, int] = {}
+        files = sorted(self.directory.glob("*.bin"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            self._entries[path.stem] = path.stat().st_size
+        self._total = sum(self._entries.values())
+        cache_size.set(self._total)
+
+    @staticmethod
+    def make_key(provider: str, person_hash: str, garment_hash: str) -> str:
+        return hashlib.sha1(f"{provider}:{person_hash}:{garment_hash}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def get(self, key: str, provider: str = "") -> Optional[bytes]:
+        """
+        Look up a cached response
+
+        Returns:
+            Response bytes, or None on a miss
+        """
+        with self._lock:
+            known = key in self._entries
+            if known:
+                # Move to most recently used
+                self._entries[key] = self._entries.pop(key)
+
+        data = None
+        if known:
+            try:
+                data = self._path(key).read_bytes()
+                os.utime(self._path(key))
+            except OSError:
+                with self._lock:
+                    self._total -= self._entries.pop(key, 0)
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        cache_requests.inc(provider=provider, result="miss" if data is None else "hit")
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store a response, evicting least recently used entries if needed"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write API cache entry: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._total -= self._entries.pop(oldest)
+                evicted.append(oldest)
+            cache_size.set(self._total)
+
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        """Hit rate and size for reporting"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(settings.API_CACHE_DIR, settings.API_CACHE_MAX_BYTES)
+        return _cache
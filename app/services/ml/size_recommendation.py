@@ -2,7 +2,7 @@
 Size recommendation service based on body measurements
 """
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Sequence, Tuple, Optional, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -75,9 +75,49 @@ class SizeRecommendationService:
     # Assuming average person is 5'6" (66 inches) and takes up ~80% of image height
     PIXELS_PER_INCH_ESTIMATE = 10  # Will be calibrated per image
     
+    # Scored measurements: (body key, size chart key, tolerance inches, weight)
+    MEASUREMENTS = (
+        ('chest', 'chest', 4, 3),  # Most important
+        ('waist', 'waist', 4, 2),
+        ('shoulder', 'shoulder', 2, 2),
+        ('torso_length', 'length', 3, 1),
+        ('hips', 'hips', 4, 2),  # Only scored when a hip measurement is supplied
+    )
+    
+    TYPE_MAPPING = {
+        'dresses': 'dress',
+        'shirts': 'shirt',
+        'tops': 'top',
+        'tshirts': 'tshirt',
+        't-shirt': 'tshirt',
+        'blouses': 'blouse',
+        'jackets': 'jacket',
+        'blazers': 'blazer'
+    }
+    
+    # Rows scored per chunk in recommend_sizes (bounds the (N, sizes, measurements) temporaries)
+    BATCH_CHUNK_SIZE = 65536
+    
     def __init__(self):
         """Initialize size recommendation service"""
-        pass
+        self.body_keys = [body_key for body_key, _, _, _ in self.MEASUREMENTS]
+        self.tolerances = np.array([tol for _, _, tol, _ in self.MEASUREMENTS], dtype=np.float64)
+        self.weights = np.array([weight for _, _, _, weight in self.MEASUREMENTS], dtype=np.float64)
+        
+        # Compile each chart once: sizes x measurements matrix, NaN where the
+        # chart has no value for a measurement
+        self.compiled_charts = {
+            clothing_type: self._compile_chart(chart)
+            for clothing_type, chart in self.SIZE_CHARTS.items()
+        }
+    
+    def _compile_chart(self, size_chart: Dict) -> Dict:
+        sizes = list(size_chart.keys())
+        values = np.array([
+            [size_chart[size].get(chart_key, np.nan) for _, chart_key, _, _ in self.MEASUREMENTS]
+            for size in sizes
+        ], dtype=np.float64)
+        return {'sizes': sizes, 'values': values, 'chart': size_chart}
     
     def recommend_size(self, body_measurements: Dict, clothing_type: str,
                       image_height: int) -> Dict:
@@ -93,20 +133,18 @@ class SizeRecommendationService:
             Dictionary with size recommendation and fit analysis
         """
         try:
-            # Calibrate pixel to inch conversion
-            pixels_per_inch = self._calibrate_conversion(body_measurements, image_height)
-            
-            # Convert pixel measurements to inches
-            body_inches = self._convert_to_inches(body_measurements, pixels_per_inch)
+            # Convert pixel measurements to inches (calibrated on torso height)
+            body_inches = self.to_inches(body_measurements, image_height)
             
-            logger.info(f"Body measurements in inches: {body_inches}")
+            logger.debug(f"Body measurements in inches: {body_inches}")
             
             # Get size chart for clothing type
-            size_chart = self._get_size_chart(clothing_type)
+            compiled = self._get_compiled_chart(clothing_type)
+            size_chart = compiled['chart']
             
             # Find best matching size
             recommended_size, fit_score, alternatives = self._find_best_size(
-                body_inches, size_chart
+                body_inches, compiled
             )
             
             # Generate fit analysis
@@ -130,6 +168,20 @@ class SizeRecommendationService:
                 'error': str(e)
             }
     
+    def to_inches(self, body_measurements: Dict, image_height: int) -> Dict:
+        """
+        Convert pose pixel measurements to inches
+        
+        Args:
+            body_measurements: Dictionary with pixel measurements
+            image_height: Height of the image in pixels
+            
+        Returns:
+            Body measurements in inches (chest, waist, shoulder, torso_length)
+        """
+        pixels_per_inch = self._calibrate_conversion(body_measurements, image_height)
+        return self._convert_to_inches(body_measurements, pixels_per_inch)
+    
     def _calibrate_conversion(self, measurements: Dict, image_height: int) -> float:
         """
         Calibrate pixel to inch conversion based on torso height
@@ -140,7 +192,7 @@ class SizeRecommendationService:
         
         pixels_per_inch = torso_height_px / average_torso_inches
         
-        logger.info(f"Calibrated conversion: {pixels_per_inch:.2f} pixels per inch")
+        logger.debug(f"Calibrated conversion: {pixels_per_inch:.2f} pixels per inch")
         return pixels_per_inch
     
     def _convert_to_inches(self, measurements: Dict, pixels_per_inch: float) -> Dict:
@@ -152,86 +204,125 @@ class SizeRecommendationService:
             'torso_length': measurements.get('torso_height_px', 0) / pixels_per_inch
         }
     
+    def _get_compiled_chart(self, clothing_type: str) -> Dict:
+        """Get compiled size chart for clothing type (defaults to shirt)"""
+        # Normalize clothing type and map variations to standard types
+        clothing_type = clothing_type.lower()
+        clothing_type = self.TYPE_MAPPING.get(clothing_type, clothing_type)
+        
+        return self.compiled_charts.get(clothing_type, self.compiled_charts['shirt'])
+    
     def _get_size_chart(self, clothing_type: str) -> Dict:
         """Get size chart for clothing type"""
-        # Normalize clothing type
-        clothing_type = clothing_type.lower()
+        return self._get_compiled_chart(clothing_type)['chart']
+    
+    def _score_sizes(self, body: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Weighted fit score of every size for every body
         
-        # Map variations to standard types
-        type_mapping = {
-            'dresses': 'dress',
-            'shirts': 'shirt',
-            'tops': 'top',
-            'tshirts': 'tshirt',
-            't-shirt': 'tshirt',
-            'blouses': 'blouse',
-            'jackets': 'jacket',
-            'blazers': 'blazer'
-        }
+        Args:
+            body: (N, M) body measurements in inches, NaN where unknown
+            values: (S, M) size chart, NaN where undefined
+            
+        Returns:
+            (N, S) scores in [0, 1]
+        """
+        return self.score_differences(np.abs(body[:, None, :] - values[None, :, :]))
+    
+    def score_differences(self, diff: np.ndarray) -> np.ndarray:
+        """
+        Weighted fit score from absolute body/garment differences
         
-        clothing_type = type_mapping.get(clothing_type, clothing_type)
+        Each measurement scores max(0, 1 - |diff| / tolerance); scores are
+        weighted and normalised by the weights of the measurements both the
+        body and the garment define.
         
-        # Return appropriate size chart or default to shirt
-        return self.SIZE_CHARTS.get(clothing_type, self.SIZE_CHARTS['shirt'])
+        Args:
+            diff: (..., M) differences in inches, NaN where not comparable
+            
+        Returns:
+            (...) scores in [0, 1]
+        """
+        present = ~np.isnan(diff)
+        scores = np.clip(1 - np.nan_to_num(diff) / self.tolerances, 0, None)
+        weights = present * self.weights
+        
+        weight_sum = weights.sum(axis=-1)
+        total = (scores * weights).sum(axis=-1)
+        return np.divide(total, weight_sum, out=np.zeros_like(total), where=weight_sum > 0)
     
-    def _find_best_size(self, body_inches: Dict, size_chart: Dict) -> Tuple[str, float, List[str]]:
+    def _find_best_size(self, body_inches: Dict, compiled: Dict) -> Tuple[str, float, List[str]]:
         """
         Find best matching size using weighted scoring
         
         Returns:
             (recommended_size, fit_score, alternative_sizes)
         """
-        scores = {}
-        
-        for size, measurements in size_chart.items():
-            score = 0
-            weight_sum = 0
-            
-            # Chest measurement (most important)
-            if 'chest' in body_inches and 'chest' in measurements:
-                chest_diff = abs(body_inches['chest'] - measurements['chest'])
-                chest_score = max(0, 1 - (chest_diff / 4))  # 4 inch tolerance
-                score += chest_score * 3  # Weight: 3
-                weight_sum += 3
-            
-            # Waist measurement
-            if 'waist' in body_inches and 'waist' in measurements:
-                waist_diff = abs(body_inches['waist'] - measurements['waist'])
-                waist_score = max(0, 1 - (waist_diff / 4))
-                score += waist_score * 2  # Weight: 2
-                weight_sum += 2
-            
-            # Shoulder measurement
-            if 'shoulder' in body_inches and 'shoulder' in measurements:
-                shoulder_diff = abs(body_inches['shoulder'] - measurements['shoulder'])
-                shoulder_score = max(0, 1 - (shoulder_diff / 2))
-                score += shoulder_score * 2  # Weight: 2
-                weight_sum += 2
-            
-            # Length measurement
-            if 'torso_length' in body_inches and 'length' in measurements:
-                length_diff = abs(body_inches['torso_length'] - measurements['length'])
-                length_score = max(0, 1 - (length_diff / 3))
-                score += length_score * 1  # Weight: 1
-                weight_sum += 1
-            
-            # Normalize score
-            scores[size] = score / weight_sum if weight_sum > 0 else 0
+        body = np.array([[body_inches.get(key, np.nan) for key in self.body_keys]], dtype=np.float64)
+        scores = self._score_sizes(body, compiled['values'])[0]
         
-        # Sort by score
-        sorted_sizes = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        # Stable sort keeps chart order between equal scores
+        order = np.argsort(-scores, kind='stable')
+        sizes = compiled['sizes']
         
-        recommended_size = sorted_sizes[0][0]
-        fit_score = sorted_sizes[0][1]
+        recommended_size = sizes[order[0]]
+        fit_score = float(scores[order[0]])
         
         # Get alternative sizes (top 2 alternatives)
-        alternatives = [size for size, _ in sorted_sizes[1:3]]
+        alternatives = [sizes[i] for i in order[1:3]]
         
-        logger.info(f"Size scores: {scores}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Size scores: {dict(zip(sizes, scores.round(3).tolist()))}")
         logger.info(f"Recommended: {recommended_size} (score: {fit_score:.2f})")
         
         return recommended_size, fit_score, alternatives
     
+    def recommend_sizes(self, measurements_batch: Union[np.ndarray, Sequence[Dict]],
+                        clothing_type: str) -> Dict:
+        """
+        Recommend sizes for many bodies at once (e.g. analytics backfills)
+        
+        Args:
+            measurements_batch: Body measurements in inches, either dicts with
+                chest/waist/shoulder/torso_length/hips keys (as in
+                'body_measurements_inches') or an (N, 5) array in that
+                column order; missing values may be NaN
+            clothing_type: Type of clothing (dress, shirt, etc.)
+            
+        Returns:
+            Dictionary of arrays: 'recommended_size' (N,), 'fit_score' (N,),
+            'alternative_sizes' (N, 2) and 'scores' (N, sizes), plus the
+            'sizes' order used by 'scores'
+        """
+        compiled = self._get_compiled_chart(clothing_type)
+        sizes = np.array(compiled['sizes'])
+        
+        if isinstance(measurements_batch, np.ndarray):
+            body = measurements_batch.astype(np.float64, copy=False)
+        else:
+            body = np.array([
+                [row.get(key, np.nan) for key in self.body_keys] for row in measurements_batch
+            ], dtype=np.float64).reshape(-1, len(self.body_keys))
+        
+        if body.ndim != 2 or body.shape[1] != len(self.body_keys):
+            raise ValueError(f"Expected measurements of shape (N, {len(self.body_keys)}), got {body.shape}")
+        
+        scores = np.empty((len(body), len(sizes)), dtype=np.float64)
+        for start in range(0, len(body), self.BATCH_CHUNK_SIZE):
+            chunk = slice(start, start + self.BATCH_CHUNK_SIZE)
+            scores[chunk] = self._score_sizes(body[chunk], compiled['values'])
+        
+        order = np.argsort(-scores, axis=1, kind='stable')
+        best = order[:, 0]
+        
+        return {
+            'sizes': compiled['sizes'],
+            'recommended_size': sizes[best],
+            'fit_score': scores[np.arange(len(body)), best],
+            'alternative_sizes': sizes[order[:, 1:3]],
+            'scores': scores
+        }
+    
     def _analyze_fit(self, body_inches: Dict, size_measurements: Dict) -> Dict:
         """
         Analyze how well the size fits
@@ -8,11 +8,20 @@ from pathlib import Path
 from typing import Dict, Tuple, Optional
 from app.services.ml.pose_detection import PoseDetector
 from app.services.ml.size_recommendation import SizeRecommendationService
+from app.services.ml.garment_prep import (
+    GarmentPreparer, GarmentRenderCache, resize_garment, snap_region
+)
 from app.utils.image_processor import (
     load_image, save_image, resize_image, blend_images
 )
 from app.core.config import settings
+from app.core.timing import stage
+from app.core.tracing import annotate
 from app.core.exceptions import ImageProcessingError, PoseDetectionError
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 
 class TryOnService:
@@ -22,6 +31,8 @@ class TryOnService:
         """Initialize try-on service"""
         self.pose_detector = PoseDetector()
         self.size_recommender = SizeRecommendationService()
+        self.garment_preparer = GarmentPreparer()
+        self.render_cache = GarmentRenderCache()
     
     def process(self, user_image_path: str, cloth_image_path: str,
                 output_path: str, clothing_type: Optional[str] = None) -> Dict:
@@ -40,21 +51,61 @@ class TryOnService:
         
         try:
             # Load images
-            user_img = load_image(user_image_path)
-            cloth_img = load_image(cloth_image_path)
+            with stage("decode"):
+                user_img = load_image(user_image_path)
+                cloth_img = load_image(cloth_image_path, keep_alpha=True)
+                annotate(
+                    person_size=f"{user_img.shape[1]}x{user_img.shape[0]}",
+                    cloth_size=f"{cloth_img.shape[1]}x{cloth_img.shape[0]}"
+                )
+            
+            result = self.process_images(user_img, cloth_img, clothing_type=clothing_type)
+            
+            # Save result
+            with stage("encode"):
+                save_image(result.pop('result'), output_path)
+            
+            # Calculate processing time
+            result['output_path'] = output_path
+            result['time_taken'] = time.time() - start_time
+            
+            return result
             
+        except (PoseDetectionError, ImageProcessingError) as e:
+            raise
+        except Exception as e:
+            raise ImageProcessingError(f"Try-on processing failed: {str(e)}")
+    
+    def process_images(self, user_img: np.ndarray, cloth_img: np.ndarray,
+                       clothing_type: Optional[str] = None) -> Dict:
+        """
+        Process virtual try-on on in-memory images
+        
+        Args:
+            user_img: User image (BGR)
+            cloth_img: Cloth image (BGR, or BGRA to use its alpha matte)
+            clothing_type: Optional clothing type for size recommendation
+            
+        Returns:
+            Dictionary with the 'result' image and metadata
+        """
+        start_time = time.time()
+        
+        try:
             # Detect pose
-            pose_result = self.pose_detector.detect(user_img)
-            landmarks = pose_result['landmarks']
-            keypoints = self.pose_detector.get_keypoints(landmarks)
+            with stage("pose"):
+                pose_result = self.pose_detector.detect(user_img)
+                landmarks = pose_result['landmarks']
+                keypoints = self.pose_detector.get_keypoints(landmarks)
+                annotate(pose_tier=pose_result.get('method'), confidence=pose_result['confidence'])
             
             # Debug: Log keypoints
-            import logging
-            logger = logging.getLogger(__name__)
             logger.info(f"Detected keypoints: shoulders at y={keypoints.get('left_shoulder', (0,0))[1]:.2f}, hips at y={keypoints.get('left_hip', (0,0))[1]:.2f}")
             
             # Get body region with measurements
-            body_region = self._get_body_region(user_img, keypoints)
+            with stage("region"):
+                body_region = self._get_body_region(user_img, keypoints)
+                annotate(roi_size=f"{body_region['width']}x{body_region['height']}")
             logger.info(f"Body region: y1={body_region['y1']}, y2={body_region['y2']}, height={body_region['height']}")
             
             # Get size recommendation if clothing type provided
@@ -67,28 +118,46 @@ class TryOnService:
                 )
                 logger.info(f"Size recommendation: {size_recommendation['recommended_size']}")
             
-            # Warp cloth to fit body with improved perspective
-            warped_cloth = self._warp_cloth(cloth_img, body_region, keypoints)
+            # Matte, bounding box and colour stats are computed once per garment
+            with stage("prepare"):
+                garment = self.garment_preparer.prepare(cloth_img)
             
-            # Blend cloth with user image
-            result = self._blend_cloth(user_img, warped_cloth, body_region)
+            # Warp and blend mask depend only on the region size; snapping it
+            # to buckets lets similar bodies share one cached render
+            render_region = snap_region(body_region, user_img.shape, settings.TRYON_RENDER_BUCKET)
             
-            # Save result
-            save_image(result, output_path)
+            def render():
+                annotate(render_cache="miss")
+                warped_cloth, warped_alpha = self._warp_cloth(garment, render_region, keypoints)
+                mask = self._blend_mask(render_region['height'], render_region['width'], warped_alpha)
+                return warped_cloth, mask
             
-            # Calculate processing time
-            time_taken = time.time() - start_time
+            with stage("warp"):
+                warped_cloth, mask = self.render_cache.get_or_render(
+                    garment, render_region['width'], render_region['height'], render
+                )
+                annotate(render_size=f"{render_region['width']}x{render_region['height']}")
+            
+            # Blend cloth with user image
+            result = self._blend_cloth(
+                user_img, warped_cloth, render_region,
+                cloth_stats=(garment['lab_mean'], garment['lab_std']),
+                mask=mask
+            )
             
             response = {
                 'success': True,
-                'output_path': output_path,
-                'time_taken': time_taken,
+                'result': result,
+                'time_taken': time.time() - start_time,
                 'metadata': {
                     'person_size': f"{user_img.shape[1]}x{user_img.shape[0]}",
                     'cloth_size': f"{cloth_img.shape[1]}x{cloth_img.shape[0]}",
                     'landmarks_detected': len(landmarks),
                     'pose_confidence': pose_result['confidence'],
-                    'body_measurements': body_region['measurements']
+                    'body_measurements': body_region['measurements'],
+                    'body_measurements_inches': self.size_recommender.to_inches(
+                        body_region['measurements'], user_img.shape[0]
+                    )
                 }
             }
             
@@ -138,8 +207,6 @@ class TryOnService:
         shoulder_width = abs(shoulder_right_x - shoulder_left_x)
         torso_height = abs(hip_y - shoulder_y)
         
-        import logging
-        logger = logging.getLogger(__name__)
         logger.info(f"Body measurements: shoulder_width={shoulder_width}px, torso_height={torso_height}px")
         
         # CRITICAL FIX: Start clothing BELOW the neck, NEVER on face
@@ -208,19 +275,21 @@ class TryOnService:
             }
         }
     
-    def _warp_cloth(self, cloth: np.ndarray, body_region: Dict,
-                    keypoints: Dict[str, Tuple[float, float]]) -> np.ndarray:
+    def _warp_cloth(self, garment: Dict, body_region: Dict,
+                    keypoints: Dict[str, Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
         """
         Warp cloth to fit body region with improved sizing and perspective
         
         Args:
-            cloth: Cloth image
+            garment: Prepared garment (cloth cropped to its content, alpha matte, pyramid)
             body_region: Body region coordinates
             keypoints: Body keypoints
             
         Returns:
-            Warped and resized cloth image
+            Warped and resized cloth image, and its alpha matte
         """
+        cloth = garment['cloth']
+        
         # Get cloth dimensions
         cloth_h, cloth_w = cloth.shape[:2]
         
@@ -239,11 +308,12 @@ class TryOnService:
         new_w = int(cloth_w * scale)
         new_h = int(cloth_h * scale)
         
-        # Resize cloth
-        resized_cloth = cv2.resize(cloth, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+        # Resize cloth from the nearest pyramid level
+        resized_cloth, resized_alpha = resize_garment(garment, new_w, new_h)
         
-        # Create canvas of target size
+        # Create canvas of target size (transparent where the cloth doesn't reach)
         warped = np.zeros((target_h, target_w, 3), dtype=np.uint8)
+        warped_alpha = np.zeros((target_h, target_w), dtype=np.float32)
         
         # Center the cloth in the canvas
         offset_x = (target_w - new_w) // 2
@@ -255,23 +325,28 @@ class TryOnService:
             new_w = target_w
             offset_x = 0
             resized_cloth = resized_cloth[:, crop_x:crop_x+new_w]
+            resized_alpha = resized_alpha[:, crop_x:crop_x+new_w]
         
         if offset_y < 0:
             crop_y = -offset_y
             new_h = target_h
             offset_y = 0
             resized_cloth = resized_cloth[crop_y:crop_y+new_h, :]
+            resized_alpha = resized_alpha[crop_y:crop_y+new_h, :]
         
         # Place cloth on canvas
         end_y = min(offset_y + resized_cloth.shape[0], target_h)
         end_x = min(offset_x + resized_cloth.shape[1], target_w)
         
         warped[offset_y:end_y, offset_x:end_x] = resized_cloth[:end_y-offset_y, :end_x-offset_x]
+        warped_alpha[offset_y:end_y, offset_x:end_x] = resized_alpha[:end_y-offset_y, :end_x-offset_x]
         
-        return warped
+        return warped, warped_alpha
     
     def _blend_cloth(self, user_img: np.ndarray, cloth: np.ndarray,
-                     body_region: Dict) -> np.ndarray:
+                     body_region: Dict, cloth_alpha: Optional[np.ndarray] = None,
+                     cloth_stats: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                     mask: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Blend cloth with user image using advanced alpha blending and color matching
         
@@ -279,105 +354,102 @@ class TryOnService:
             user_img: User image
             cloth: Warped cloth
             body_region: Body region coordinates
+            cloth_alpha: Garment matte of the warped cloth (only garment pixels are blended)
+            cloth_stats: Precomputed LAB (mean, std) of the garment
+            mask: Precomputed blend mask from _blend_mask (replaces cloth_alpha)
             
         Returns:
             Blended result image
         """
         result = user_img.copy()
         
-        # Extract region
         x1, y1 = body_region['x1'], body_region['y1']
         x2, y2 = body_region['x2'], body_region['y2']
         
-        # Ensure cloth matches region size
-        if cloth.shape[0] != (y2 - y1) or cloth.shape[1] != (x2 - x1):
-            cloth = cv2.resize(cloth, (x2 - x1, y2 - y1), interpolation=cv2.INTER_LANCZOS4)
+        roi = result[y1:y2, x1:x2]
+        roi_h, roi_w = roi.shape[:2]
+        
+        # Ensure cloth exactly matches ROI dimensions
+        if cloth.shape[0] != roi_h or cloth.shape[1] != roi_w:
+            cloth = cv2.resize(cloth, (roi_w, roi_h), interpolation=cv2.INTER_LANCZOS4)
+            if cloth_alpha is not None:
+                cloth_alpha = cv2.resize(cloth_alpha, (roi_w, roi_h), interpolation=cv2.INTER_LINEAR)
+            mask = None
         
         # Apply slight color correction to match lighting
-        user_region = result[y1:y2, x1:x2]
-        cloth = self._match_lighting(cloth, user_region)
+        with stage("lighting"):
+            cloth = self._match_lighting(cloth, roi, cloth_stats)
+        
+        with stage("blend"):
+            if mask is None:
+                mask = self._blend_mask(roi_h, roi_w, cloth_alpha)
+            garment_pixels = mask > 0
+            
+            # Blend with very high opacity for better visibility
+            opacity = 0.95  # Very high opacity for cloth to be clearly visible
+            weight = (mask[garment_pixels] * opacity)[:, None]
+            roi_float = roi[garment_pixels].astype(np.float32)
+            cloth_float = cloth[garment_pixels].astype(np.float32)
+            blended = cloth_float * weight + roi_float * (1 - weight)
+            
+            roi[garment_pixels] = np.clip(blended, 0, 255).astype(np.uint8)
+        
+        return result
+    
+    def _blend_mask(self, h: int, w: int, cloth_alpha: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Blend weights for a warped cloth: feathered edges, centre emphasis and garment matte
         
+        Args:
+            h: Region height
+            w: Region width
+            cloth_alpha: Garment matte at (h, w)
+            
+        Returns:
+            Float32 mask in [0, 1]
+        """
         # Create a sophisticated mask with better edge blending
-        h, w = cloth.shape[:2]
         mask = np.ones((h, w), dtype=np.float32)
         
         # Create gradient mask for smooth blending
         feather = 30  # Increased for smoother transitions
         
-        # Top edge - gradual fade with cubic easing
+        # Top and bottom edges - gradual fade with cubic easing
         for i in range(min(feather, h)):
             alpha = (i / feather) ** 3  # Cubic for even smoother transition
             mask[i, :] *= alpha
-        
-        # Bottom edge - gradual fade
-        for i in range(min(feather, h)):
-            alpha = (i / feather) ** 3
-            if h - i - 1 >= 0:
-                mask[h - i - 1, :] *= alpha
+            mask[h - i - 1, :] *= alpha
         
         # Side edges - gradual fade
-        for i in range(feather):
+        for i in range(min(feather, w)):
             alpha = (i / feather) ** 2
             mask[:, i] *= alpha
             mask[:, -(i+1)] *= alpha
         
         # Create center emphasis (stronger in middle)
-        center_mask = np.ones((h, w), dtype=np.float32)
         cy, cx = h // 2, w // 2
-        for y in range(h):
-            for x in range(w):
-                dist_from_center = np.sqrt((y - cy)**2 + (x - cx)**2)
-                max_dist = np.sqrt(cy**2 + cx**2)
-                center_mask[y, x] = 1.0 - (dist_from_center / max_dist) * 0.3
+        ys, xs = np.ogrid[:h, :w]
+        dist_from_center = np.sqrt((ys - cy)**2 + (xs - cx)**2)
+        max_dist = max(np.sqrt(cy**2 + cx**2), 1.0)
+        center_mask = (1.0 - (dist_from_center / max_dist) * 0.3).astype(np.float32)
         
         mask = mask * center_mask
         
-        # Get ROI first to ensure dimensions match
-        roi = result[y1:y2, x1:x2]
-        roi_h, roi_w = roi.shape[:2]
-        
-        # Ensure cloth exactly matches ROI dimensions
-        if cloth.shape[0] != roi_h or cloth.shape[1] != roi_w:
-            cloth = cv2.resize(cloth, (roi_w, roi_h), interpolation=cv2.INTER_LANCZOS4)
-            # Recreate mask with correct dimensions
-            mask = np.ones((roi_h, roi_w), dtype=np.float32)
-            
-            # Recreate gradient mask
-            feather = min(30, roi_h // 3, roi_w // 3)
-            for i in range(min(feather, roi_h)):
-                alpha = (i / feather) ** 3
-                mask[i, :] *= alpha
-                if roi_h - i - 1 >= 0:
-                    mask[roi_h - i - 1, :] *= alpha
-            
-            for i in range(min(feather, roi_w)):
-                alpha = (i / feather) ** 2
-                mask[:, i] *= alpha
-                if roi_w - i - 1 >= 0:
-                    mask[:, -(i+1)] *= alpha
+        # Restrict blending to garment pixels
+        if cloth_alpha is not None:
+            mask = mask * cloth_alpha
         
-        # Expand mask to 3 channels
-        mask_3ch = np.stack([mask] * 3, axis=2)
-        
-        # Convert to float for blending
-        roi_float = roi.astype(np.float32)
-        cloth_float = cloth.astype(np.float32)
-        
-        # Blend with very high opacity for better visibility
-        alpha = 0.95  # Very high opacity for cloth to be clearly visible
-        blended_roi = (cloth_float * mask_3ch * alpha + roi_float * (1 - mask_3ch * alpha))
-        
-        result[y1:y2, x1:x2] = np.clip(blended_roi, 0, 255).astype(np.uint8)
-        
-        return result
+        return mask
     
-    def _match_lighting(self, cloth: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    def _match_lighting(self, cloth: np.ndarray, reference: np.ndarray,
+                        cloth_stats: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
         """
         Match cloth lighting to reference region for better blending
         
         Args:
             cloth: Cloth image to adjust
             reference: Reference region from user image
+            cloth_stats: Precomputed LAB (mean, std) of the garment pixels
             
         Returns:
             Adjusted cloth image
@@ -386,9 +458,12 @@ class TryOnService:
         cloth_lab = cv2.cvtColor(cloth, cv2.COLOR_BGR2LAB).astype(np.float32)
         ref_lab = cv2.cvtColor(reference, cv2.COLOR_BGR2LAB).astype(np.float32)
         
-        # Calculate mean and std for each channel
-        cloth_mean = cloth_lab.mean(axis=(0, 1))
-        cloth_std = cloth_lab.std(axis=(0, 1))
+        # Calculate mean and std for each channel (garment stats come from the cache)
+        if cloth_stats is not None:
+            cloth_mean, cloth_std = cloth_stats
+        else:
+            cloth_mean = cloth_lab.mean(axis=(0, 1))
+            cloth_std = cloth_lab.std(axis=(0, 1))
         ref_mean = ref_lab.mean(axis=(0, 1))
         ref_std = ref_lab.std(axis=(0, 1))
         
@@ -409,3 +484,15 @@ class TryOnService:
         
         return result
 
+
+_shared_service: Optional[TryOnService] = None
+_shared_lock = threading.Lock()
+
+
+def get_tryon_service() -> TryOnService:
+    """Process-wide warm try-on pipeline (pose model is built once)"""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = TryOnService()
+        return _shared_service
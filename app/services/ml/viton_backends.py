@@ -0,0 +1,254 @@
+"""
+Inference backends for VITONModel
+
+- TorchBackend: PyTorch on the service device, optionally CPU-optimised
+  (channels_last, TorchScript tracing or torch.compile)
+- OnnxRuntimeBackend: exported ONNX graph under onnxruntime (CPU)
+"""
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from app.core.config import settings
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# VITON input resolution (H, W)
+INPUT_SIZE = (256, 192)
+
+
+def export_onnx(model: nn.Module, output_path: str, opset: int = 17) -> str:
+    """
+    Export VITONModel to ONNX with a dynamic batch dimension
+
+    Args:
+        model: Model in eval mode
+        output_path: Where to write the .onnx file
+        opset: ONNX opset version
+
+    Returns:
+        Path of the exported graph
+    """
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+
+    device = model_device(model)
+    person = torch.zeros(1, 3, *INPUT_SIZE, device=device)
+    cloth = torch.zeros(1, 3, *INPUT_SIZE, device=device)
+
+    torch.onnx.export(
+        model,
+        (person, cloth),
+        output_path,
+        input_names=["person", "cloth"],
+        output_names=["result"],
+        dynamic_axes={"person": {0: "batch"}, "cloth": {0: "batch"}, "result": {0: "batch"}},
+        opset_version=opset,
+        dynamo=False
+    )
+    logger.info(f"Exported VITON model to {output_path}")
+    return output_path
+
+
+def model_device(model: nn.Module) -> torch.device:
+    """Device of a model's parameters (quantized models keep theirs packed, on CPU)"""
+    parameter = next(model.parameters(), None)
+    return parameter.device if parameter is not None else torch.device('cpu')
+
+
+def configure_torch_threads(intra_op_threads: Optional[int] = None,
+                            inter_op_threads: Optional[int] = None) -> None:
+    """
+    Apply PyTorch CPU thread settings (0 keeps the PyTorch default)
+
+    Inter-op threads can only be set before PyTorch starts any parallel work,
+    so a late call logs a warning instead of failing.
+    """
+    intra = settings.VITON_TORCH_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    inter = settings.VITON_TORCH_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+
+    if intra > 0:
+        torch.set_num_threads(intra)
+    if inter > 0:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError as e:
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+
+class TorchBackend:
+    """PyTorch inference, eager or compiled once at load"""
+    name = "torch"
+
+    COMPILE_MODES = ("none", "trace", "compile")
+
+    def __init__(self, model: nn.Module,
+                 channels_last: bool = False,
+                 compile_mode: str = "none"):
+        """
+        Initialize PyTorch backend
+
+        Args:
+            model: Loaded VITONModel in eval mode
+            channels_last: Run convolutions on NHWC tensors (faster on CPU)
+            compile_mode: "none" (eager), "trace" (TorchScript, frozen) or
+                "compile" (torch.compile)
+        """
+        if compile_mode not in self.COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode: {compile_mode}. Choose from: {list(self.COMPILE_MODES)}")
+
+        self.channels_last = channels_last
+        self.compile_mode = compile_mode
+        self.device = model_device(model)
+
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+
+        if compile_mode == "trace":
+            person, cloth = self._prepare(
+                torch.zeros(1, 3, *INPUT_SIZE, device=self.device),
+                torch.zeros(1, 3, *INPUT_SIZE, device=self.device)
+            )
+            with torch.no_grad():
+                traced = torch.jit.trace(model, (person, cloth))
+                model = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        elif compile_mode == "compile":
+            model = torch.compile(model)
+
+        self.model = model
+
+        if compile_mode != "none":
+            self.warmup()
+
+    def _prepare(self, person: torch.Tensor, cloth: torch.Tensor):
+        if self.channels_last:
+            person = person.contiguous(memory_format=torch.channels_last)
+            cloth = cloth.contiguous(memory_format=torch.channels_last)
+        return person, cloth
+
+    def warmup(self, batch_size: int = 1) -> None:
+        """Run one forward so tracing/compilation cost is paid at load time"""
+        self.run(
+            torch.zeros(batch_size, 3, *INPUT_SIZE, device=self.device),
+            torch.zeros(batch_size, 3, *INPUT_SIZE, device=self.device)
+        )
+
+    def run(self, person: torch.Tensor, cloth: torch.Tensor) -> torch.Tensor:
+        person, cloth = self._prepare(person, cloth)
+        with torch.inference_mode():
+            return self.model(person, cloth).contiguous()
+
+
+class OnnxRuntimeBackend:
+    """ONNX graph executed by onnxruntime on CPU"""
+    name = "onnxruntime"
+
+    GRAPH_OPTIMIZATION_LEVELS = {
+        "disable": "ORT_DISABLE_ALL",
+        "basic": "ORT_ENABLE_BASIC",
+        "extended": "ORT_ENABLE_EXTENDED",
+        "all": "ORT_ENABLE_ALL"
+    }
+
+    def __init__(self, onnx_path: str,
+                 intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None,
+                 graph_optimization: Optional[str] = None):
+        """
+        Initialize onnxruntime session
+
+        Args:
+            onnx_path: Exported VITON graph
+            intra_op_threads: Threads per operator (0 = onnxruntime default)
+            inter_op_threads: Threads across operators (0 = onnxruntime default)
+            graph_optimization: "disable", "basic", "extended" or "all"
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            raise RuntimeError("onnxruntime is not installed. Install with: pip install onnxruntime")
+
+        graph_optimization = graph_optimization or settings.VITON_ORT_GRAPH_OPTIMIZATION
+        if graph_optimization not in self.GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(
+                f"Unknown graph optimization level: {graph_optimization}. "
+                f"Choose from: {list(self.GRAPH_OPTIMIZATION_LEVELS.keys())}"
+            )
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = (
+            settings.VITON_ORT_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        )
+        options.inter_op_num_threads = (
+            settings.VITON_ORT_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+        )
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, self.GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+        )
+
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        logger.info(f"onnxruntime session ready ({graph_optimization} optimizations)")
+
+    def run(self, person: torch.Tensor, cloth: torch.Tensor) -> torch.Tensor:
+        outputs = self.session.run(
+            ["result"],
+            {
+                "person": np.ascontiguousarray(person.detach().cpu().numpy()),
+                "cloth": np.ascontiguousarray(cloth.detach().cpu().numpy())
+            }
+        )
+        return torch.from_numpy(outputs[0])
+
+
+def create_backend(name: str, model: nn.Module,
+                   onnx_path: Optional[str] = None,
+                   weights_path: Optional[str] = None,
+                   quantized: bool = False):
+    """
+    Build an inference backend for a loaded model
+
+    Args:
+        name: "torch" or "onnxruntime"
+        model: Loaded VITONModel in eval mode
+        onnx_path: Location of the ONNX graph (exported if missing or stale)
+        weights_path: Checkpoint the model was loaded from, for staleness checks
+        quantized: Model has been converted to INT8 (torch backend only)
+    """
+    if quantized:
+        if name != "torch":
+            raise ValueError("Quantized VITON models can only run on the torch backend")
+        # INT8 kernels pick their own layout; tracing/compiling adds nothing
+        return TorchBackend(model)
+
+    if name == "torch":
+        on_cpu = model_device(model).type == "cpu"
+        if on_cpu and settings.VITON_CPU_MODE:
+            configure_torch_threads()
+            return TorchBackend(
+                model,
+                channels_last=settings.VITON_CHANNELS_LAST,
+                compile_mode=settings.VITON_TORCH_COMPILE
+            )
+        return TorchBackend(model)
+
+    if name == "onnxruntime":
+        onnx_path = onnx_path or settings.VITON_ONNX_PATH
+        onnx_file = Path(onnx_path)
+        stale = (
+            onnx_file.exists() and weights_path is not None
+            and onnx_file.stat().st_mtime < Path(weights_path).stat().st_mtime
+        )
+        if stale or not onnx_file.exists():
+            export_onnx(model, onnx_path)
+        return OnnxRuntimeBackend(onnx_path)
+
+    raise ValueError(f"Unknown VITON backend: {name}. Choose from: ['torch', 'onnxruntime']")
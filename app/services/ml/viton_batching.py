@@ -0,0 +1,148 @@
+"""
+Dynamic micro-batching for VITON inference
+
+Concurrent requests are queued and gathered into a single forward pass of up
+to ``max_batch_size`` items, waiting at most ``max_wait`` seconds after the
+first item arrives. Results are scattered back to each caller's future.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+batch_size_histogram = metrics.histogram(
+    "viton_batch_size",
+    "Number of requests per VITON forward pass",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+)
+queue_wait_histogram = metrics.histogram(
+    "viton_batch_queue_wait_seconds",
+    "Time a VITON request waited before its batch ran",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+forward_latency_histogram = metrics.histogram(
+    "viton_batch_forward_seconds",
+    "Duration of one batched VITON forward pass"
+)
+
+# (person (3,H,W), cloth (3,H,W), enqueue time, result future)
+_Item = Tuple[torch.Tensor, torch.Tensor, float, Future]
+
+
+class MicroBatcher:
+    """Gathers single-image requests into batched forward passes"""
+
+    def __init__(self, model_fn: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+                 max_batch_size: Optional[int] = None,
+                 max_wait: Optional[float] = None):
+        """
+        Initialize micro-batcher
+
+        Args:
+            model_fn: Batched forward taking (B,3,H,W) person and cloth tensors
+            max_batch_size: Largest batch to run
+            max_wait: Seconds to wait for more requests after the first arrives
+        """
+        self.model_fn = model_fn
+        self.max_batch_size = max_batch_size or settings.VITON_MAX_BATCH_SIZE
+        self.max_wait = settings.VITON_BATCH_TIMEOUT_MS / 1000 if max_wait is None else max_wait
+
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the batching worker thread (idempotent)"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="viton-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def stop(self) -> None:
+        """Stop the worker after draining queued requests"""
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+
+    def submit(self, person: torch.Tensor, cloth: torch.Tensor) -> Future:
+        """
+        Queue one request
+
+        Args:
+            person: Person tensor (3, H, W)
+            cloth: Cloth tensor (3, H, W)
+
+        Returns:
+            Future resolving to the result tensor (3, H, W)
+        """
+        self.start()
+        future: Future = Future()
+        self._queue.put((person, cloth, time.perf_counter(), future))
+        return future
+
+    def infer(self, person: torch.Tensor, cloth: torch.Tensor) -> torch.Tensor:
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(person, cloth).result()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _gather(self, first: _Item) -> Tuple[List[_Item], bool]:
+        """Collect a batch starting with `first`; returns (batch, stop_requested)"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch, stopping = self._gather(first)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Item]) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued, _ in batch:
+            queue_wait_histogram.observe(started - enqueued)
+        batch_size_histogram.observe(len(batch))
+
+        try:
+            persons = torch.stack([item[0] for item in batch])
+            cloths = torch.stack([item[1] for item in batch])
+            outputs = self.model_fn(persons, cloths)
+        except Exception as e:
+            logger.error(f"VITON batch of {len(batch)} failed: {e}")
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        forward_latency_histogram.observe(time.perf_counter() - started)
+        for i, (_, _, _, future) in enumerate(batch):
+            future.set_result(outputs[i])
@@ -0,0 +1,154 @@
+"""
+Cache of preprocessed garment tensors for VITON
+
+Catalog garments are a small set reused on almost every request, so their
+resized, normalised (3, 256, 192) tensors are kept on the inference device,
+keyed by garment id or image content hash. Total size is bounded; the least
+recently used garments are evicted first.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+import torch
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ml.response_cache import hash_image
+from app.utils.image_processor import load_image
+
+logger = logging.getLogger(__name__)
+
+cache_requests = metrics.counter(
+    "viton_cloth_cache_requests_total",
+    "VITON garment tensor cache lookups by result",
+    ["result"]
+)
+cache_size = metrics.gauge(
+    "viton_cloth_cache_bytes",
+    "Bytes held by the VITON garment tensor cache",
+    multiprocess_mode="sum"
+)
+
+
+def garment_key(cloth_img: np.ndarray, garment_id: Optional[str] = None) -> str:
+    """Cache key: the catalog id when known, otherwise the image content hash"""
+    return f"garment:{garment_id}" if garment_id is not None else hash_image(cloth_img)
+
+
+class ClothTensorCache:
+    """Size-bounded LRU cache of preprocessed garment tensors"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Initialize garment tensor cache
+
+        Args:
+            max_bytes: Maximum total size of cached tensors
+        """
+        self.max_bytes = settings.VITON_CLOTH_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[torch.Tensor]:
+        """Cached (3, H, W) tensor, or None on a miss"""
+        with self._lock:
+            tensor = self._entries.get(key)
+            if tensor is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        cache_requests.inc(result="miss" if tensor is None else "hit")
+        return tensor
+
+    def put(self, key: str, tensor: torch.Tensor) -> None:
+        """Store a tensor, evicting least recently used garments if needed"""
+        size = tensor.element_size() * tensor.nelement()
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old.element_size() * old.nelement()
+            self._entries[key] = tensor
+            self._total += size
+            while self._total > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= evicted.element_size() * evicted.nelement()
+            cache_size.set(self._total)
+
+    def get_or_create(self, key: str, preprocess: Callable[[], torch.Tensor]) -> torch.Tensor:
+        """
+        Cached tensor for `key`, preprocessing and storing it on a miss
+
+        Args:
+            key: Garment key (see garment_key)
+            preprocess: Builds the (3, H, W) tensor
+        """
+        tensor = self.get(key)
+        if tensor is None:
+            tensor = preprocess()
+            self.put(key, tensor)
+        return tensor
+
+    def prewarm(self, preprocess: Callable[[np.ndarray], torch.Tensor],
+                clothes_dir: Optional[str] = None) -> int:
+        """
+        Preprocess every catalog garment listed in clothes.json
+
+        Entries are keyed by catalog id (garment_key(..., garment_id)), the
+        key of requests that name the garment, and built from the RGB image
+        those requests pass in.
+
+        Args:
+            preprocess: RGB image (H, W, 3) -> (3, H, W) tensor
+            clothes_dir: Catalog directory (defaults to settings.CLOTHES_DIR)
+
+        Returns:
+            Number of garments cached
+        """
+        clothes_dir = Path(clothes_dir or settings.CLOTHES_DIR)
+        try:
+            with open(clothes_dir / "clothes.json", encoding="utf-8") as f:
+                catalog = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read garment catalog for prewarming: {e}")
+            return 0
+
+        warmed = 0
+        for item in catalog:
+            image = item.get('image', '')
+            if item.get('id') is None or not image or image.startswith('data:'):
+                continue
+            try:
+                cloth_img = cv2.cvtColor(load_image(str(clothes_dir / image)), cv2.COLOR_BGR2RGB)
+            except Exception as e:
+                logger.warning(f"Skipping garment {item.get('id')}: {e}")
+                continue
+            self.put(garment_key(cloth_img, item['id']), preprocess(cloth_img))
+            warmed += 1
+
+        logger.info(f"Prewarmed {warmed} garment tensors ({self._total / 1e6:.1f} MB)")
+        return warmed
+
+    def stats(self) -> Dict:
+        """Hit rate and size for reporting"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
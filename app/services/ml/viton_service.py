@@ -16,11 +16,63 @@ import torch.nn as nn
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
 import logging
+import threading
+import time
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ml.viton_batching import MicroBatcher
+from app.services.ml.viton_backends import create_backend
+from app.services.ml.viton_cloth_cache import ClothTensorCache, garment_key
+from app.services.ml.viton_quantization import build_calibration_set, quantize_static
+
+try:
+    from safetensors.torch import load_file as load_safetensors
+    SAFETENSORS_AVAILABLE = True
+except ImportError:
+    SAFETENSORS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+cold_start_gauge = metrics.gauge(
+    "viton_cold_start_seconds",
+    "Time to load the VITON model and to serve its first inference",
+    ["phase"]
+)
+
+
+def load_state_dict(path: str, mmap: bool = True) -> Dict[str, torch.Tensor]:
+    """
+    Read VITON weights on CPU, memory-mapped when possible
+
+    Memory-mapped tensors are backed by the page cache, so worker processes
+    loading the same file share its read-only pages instead of each holding
+    a private copy.
+
+    Args:
+        path: .safetensors file, or a torch checkpoint with 'model_state_dict'
+        mmap: Memory-map the file rather than reading it into memory
+
+    Returns:
+        State dict of CPU tensors
+    """
+    if path.endswith(".safetensors"):
+        if not SAFETENSORS_AVAILABLE:
+            raise RuntimeError("safetensors is not installed. Install with: pip install safetensors")
+        # safetensors always maps the file
+        return load_safetensors(path, device="cpu")
+
+    try:
+        checkpoint = torch.load(path, map_location="cpu", mmap=mmap, weights_only=True)
+    except RuntimeError as e:
+        if not mmap:
+            raise
+        # Legacy (non-zipfile) checkpoints cannot be mapped
+        logger.warning(f"Could not memory-map {path} ({e}), reading it instead")
+        checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+    return checkpoint.get('model_state_dict', checkpoint)
+
 
 class VITONService:
     """
@@ -32,26 +84,88 @@ class VITONService:
     3. Install PyTorch with CUDA support
     """
     
-    def __init__(self, model_path: str = "models/viton_weights.pth"):
+    def __init__(self, model_path: str = "models/viton_weights.pth",
+                 backend: Optional[str] = None,
+                 quantization: Optional[str] = None):
         """
         Initialize VITON service
         
         Args:
             model_path: Path to pre-trained model weights
+            backend: Inference backend ("torch" or "onnxruntime"), defaults to settings
+            quantization: "none" or "static" (INT8 on CPU), defaults to settings
         """
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.backend_name = backend or settings.VITON_BACKEND
+        self.quantization = quantization or settings.VITON_QUANTIZATION
+        if self.quantization not in ("none", "static"):
+            raise ValueError(f"Unknown quantization mode: {self.quantization}. Choose from: ['none', 'static']")
+        
+        # onnxruntime and INT8 kernels run on CPU, so tensors stay there
+        use_cuda = (
+            torch.cuda.is_available()
+            and self.backend_name == "torch"
+            and self.quantization == "none"
+        )
+        self.device = torch.device('cuda' if use_cuda else 'cpu')
         self.model_path = model_path
         self.model = None
+        self.backend = None
         self.is_loaded = False
+        self.batcher = None
+        self.cloth_cache = ClothTensorCache() if settings.VITON_CLOTH_CACHE_ENABLED else None
+        self.load_error: Optional[str] = None
+        self.cold_start = {'load_seconds': None, 'first_inference_seconds': None}
+        self._load_lock = threading.Lock()
         
         logger.info(f"VITON Service initialized on device: {self.device}")
         
-        # Try to load model
-        try:
-            self.load_model()
-        except Exception as e:
-            logger.warning(f"Could not load VITON model: {e}")
-            logger.warning("VITON service will not be available. Using basic algorithm instead.")
+        # Load now, or on first use / warmup()
+        if not settings.VITON_LAZY_LOAD:
+            self.ensure_loaded()
+    
+    def ensure_loaded(self) -> bool:
+        """
+        Load the model once, on first call
+        
+        Returns:
+            True if the model is loaded; a failed load is not retried
+        """
+        if self.is_loaded or self.load_error is not None:
+            return self.is_loaded
+        
+        with self._load_lock:
+            if self.is_loaded or self.load_error is not None:
+                return self.is_loaded
+            
+            start = time.perf_counter()
+            try:
+                self.load_model()
+            except Exception as e:
+                self.load_error = str(e)
+                logger.warning(f"Could not load VITON model: {e}")
+                logger.warning("VITON service will not be available. Using basic algorithm instead.")
+                return False
+            
+            self.cold_start['load_seconds'] = round(time.perf_counter() - start, 3)
+            cold_start_gauge.set(self.cold_start['load_seconds'], phase="load")
+            logger.info(f"VITON model loaded in {self.cold_start['load_seconds']}s")
+            
+            if self.cloth_cache is not None and settings.VITON_CLOTH_CACHE_PREWARM:
+                self.cloth_cache.prewarm(lambda img: self.preprocess_cloth(img)[0])
+        
+        return True
+    
+    def warmup(self) -> Dict:
+        """
+        Load the model and run one forward pass, so the first request is warm
+        
+        Returns:
+            Cold-start timings in seconds
+        """
+        if self.ensure_loaded() and self.cold_start['first_inference_seconds'] is None:
+            blank = np.zeros((256, 192, 3), dtype=np.uint8)
+            self.process_tryon(blank, blank)
+        return dict(self.cold_start)
     
     def load_model(self):
         """Load pre-trained VITON model"""
@@ -61,33 +175,62 @@ class VITONService:
                 "Please download from: https://github.com/xthan/VITON/releases"
             )
         
-        # Load model architecture (you need to define this based on VITON paper)
-        self.model = VITONModel()
+        # Build on the meta device: no memory is allocated for the random init,
+        # and assign=True makes the parameters the (memory-mapped) loaded tensors
+        with torch.device('meta'):
+            self.model = VITONModel()
         
-        # Load pre-trained weights
-        checkpoint = torch.load(self.model_path, map_location=self.device)
-        self.model.load_state_dict(checkpoint['model_state_dict'])
+        state_dict = load_state_dict(self.model_path, mmap=settings.VITON_MMAP_WEIGHTS)
+        self.model.load_state_dict(state_dict, assign=True)
         
-        # Move to device and set to eval mode
+        # Move to device (a no-op on CPU) and set to eval mode
         self.model.to(self.device)
         self.model.eval()
         
+        quantized = self.quantization == "static"
+        if quantized:
+            calibration = build_calibration_set(self.preprocess_person)
+            self.model = quantize_static(self.model, calibration)
+        
+        self.backend = create_backend(
+            self.backend_name, self.model,
+            weights_path=self.model_path,
+            quantized=quantized
+        )
+        
         self.is_loaded = True
         logger.info("VITON model loaded successfully")
+        
+        if settings.VITON_BATCHING_ENABLED:
+            self.batcher = MicroBatcher(self._forward)
+            self.batcher.start()
+    
+    def _forward(self, person: torch.Tensor, cloth: torch.Tensor) -> torch.Tensor:
+        """Run the model on a (B, 3, 256, 192) batch"""
+        return self.backend.run(person, cloth)
     
     def is_available(self) -> bool:
-        """Check if VITON service is available"""
-        return self.is_loaded and torch.cuda.is_available()
+        """Check if VITON service is available (GPU, onnxruntime, or torch CPU mode)"""
+        supported = (
+            self.device.type == "cuda"
+            or self.backend_name == "onnxruntime"
+            or self.quantization != "none"
+            or settings.VITON_CPU_MODE
+        )
+        # Loads the model lazily on first use
+        return supported and self.ensure_loaded()
     
     def process_tryon(self, 
                      person_img: np.ndarray, 
-                     cloth_img: np.ndarray) -> np.ndarray:
+                     cloth_img: np.ndarray,
+                     garment_id: Optional[str] = None) -> np.ndarray:
         """
         Process virtual try-on using VITON
         
         Args:
             person_img: Person image (H, W, 3) RGB
             cloth_img: Clothing image (H, W, 3) RGB
+            garment_id: Catalog id of the garment, used as its cache key
             
         Returns:
             Try-on result image (H, W, 3) RGB
@@ -95,21 +238,38 @@ class VITONService:
         if not self.is_available():
             raise RuntimeError(
                 "VITON service not available. "
-                "Please ensure GPU is available and model is loaded."
+                "Please ensure the model is loaded and a GPU, the onnxruntime "
+                "backend or VITON_CPU_MODE is available."
             )
         
+        first_inference = self.cold_start['first_inference_seconds'] is None
+        start = time.perf_counter()
+        
         try:
-            # 1. Preprocess images
-            person_tensor = self.preprocess_person(person_img)
-            cloth_tensor = self.preprocess_cloth(cloth_img)
+            # 1. Preprocess images (garments come from the tensor cache when enabled)
+            person_tensor = self.preprocess_person(person_img)[0]
+            if self.cloth_cache is not None:
+                cloth_tensor = self.cloth_cache.get_or_create(
+                    garment_key(cloth_img, garment_id),
+                    lambda: self.preprocess_cloth(cloth_img)[0]
+                )
+            else:
+                cloth_tensor = self.preprocess_cloth(cloth_img)[0]
             
-            # 2. Run inference
-            with torch.no_grad():
-                result_tensor = self.model(person_tensor, cloth_tensor)
+            # 2. Run inference (batched with concurrent requests when enabled)
+            if self.batcher is not None:
+                result_tensor = self.batcher.infer(person_tensor, cloth_tensor).unsqueeze(0)
+            else:
+                result_tensor = self._forward(person_tensor.unsqueeze(0), cloth_tensor.unsqueeze(0))
             
             # 3. Postprocess result
             result_img = self.postprocess_result(result_tensor, person_img.shape[:2])
             
+            if first_inference:
+                self.cold_start['first_inference_seconds'] = round(time.perf_counter() - start, 3)
+                cold_start_gauge.set(self.cold_start['first_inference_seconds'], phase="first_inference")
+                logger.info(f"First VITON inference took {self.cold_start['first_inference_seconds']}s")
+            
             return result_img
             
         except Exception as e:
@@ -0,0 +1,56 @@
+"""
+In-memory store of per-person body measurements
+
+A try-on request measures the person once (pose detection); the inch
+measurements are kept here under the person id returned in the try-on
+metadata, so later calls such as catalog-wide size recommendation need no
+image processing. Entries expire after a TTL; the store is bounded and
+evicts the least recently used person first.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+class PersonSessionStore:
+    """TTL + LRU bounded map of person id -> body measurements (inches)"""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        Initialize person session store
+
+        Args:
+            ttl: Seconds a person's measurements stay valid
+            max_entries: Maximum number of people kept
+        """
+        self.ttl = settings.PERSON_SESSION_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.PERSON_SESSION_MAX_ENTRIES
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, person_id: str, body_inches: Dict) -> None:
+        """Store a person's measurements"""
+        with self._lock:
+            self._entries.pop(person_id, None)
+            self._entries[person_id] = (time.monotonic() + self.ttl, dict(body_inches))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, person_id: str) -> Optional[Dict]:
+        """Measurements for a person, or None if unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(person_id)
+            if entry is None:
+                return None
+            expires, body_inches = entry
+            if expires < time.monotonic():
+                del self._entries[person_id]
+                return None
+            self._entries.move_to_end(person_id)
+            return dict(body_inches)
+
+
+person_sessions = PersonSessionStore()
@@ -9,18 +9,37 @@ from typing import Tuple, Optional
 from app.core.exceptions import ImageProcessingError
 
 
-def load_image(image_path: str) -> np.ndarray:
+def _has_alpha(image_path: str) -> bool:
+    """True if the file has an alpha channel or transparent palette entries"""
+    try:
+        with Image.open(image_path) as img:
+            return 'A' in img.getbands() or 'transparency' in img.info
+    except Exception:
+        return False
+
+
+def load_image(image_path: str, keep_alpha: bool = False) -> np.ndarray:
     """
     Load image from file
     
     Args:
         image_path: Path to image
+        keep_alpha: Keep the alpha channel of images that have one
         
     Returns:
-        Image as numpy array (BGR)
+        Image as numpy array (BGR, or BGRA with keep_alpha)
     """
     try:
-        img = cv2.imread(image_path)
+        # IMREAD_UNCHANGED ignores EXIF orientation, so only use it when
+        # there is an alpha channel to keep (PNG/WebP, not phone JPEGs)
+        if keep_alpha and _has_alpha(image_path):
+            img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+            if img is not None and img.dtype == np.uint16:
+                img = (img >> 8).astype(np.uint8)
+            if img is not None and img.ndim == 2:
+                img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        else:
+            img = cv2.imread(image_path)
         if img is None:
             raise ImageProcessingError(f"Failed to load image: {image_path}")
         return img
@@ -0,0 +1,99 @@
+"""
+Garment resize microbenchmark
+
+Usage:
+    python benchmark_resize.py [--garment-sizes 400x500 1200x1500 2400x3000]
+                               [--targets 120x160 240x320 480x640] [--iterations 50]
+
+Compares the per-request cost of the try-on warp resize: LANCZOS4 from the
+full-size garment (previous behaviour) against resizing from the nearest
+mip-map level (resize_garment). Targets are body region sizes; the warp
+scales the garment to cover them with a 1.3x margin, as _warp_cloth does.
+Also reports the one-off pyramid build time and, for each method, the mean
+absolute difference from an INTER_AREA resize of the full-size garment
+(the alias-free reference for downscaling).
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from app.services.ml.garment_prep import prepare_garment, resize_garment
+
+
+def parse_size(value: str):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def make_garment(width: int, height: int) -> np.ndarray:
+    """Textured garment on a white background"""
+    rng = np.random.default_rng(0)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    body = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    body = cv2.resize(body, (width * 3 // 4, height * 4 // 5), interpolation=cv2.INTER_CUBIC)
+    top, left = height // 10, width // 8
+    img[top:top + body.shape[0], left:left + body.shape[1]] = body
+    return img
+
+
+def warp_size(garment: dict, target_w: int, target_h: int):
+    """Resized garment size used by _warp_cloth for a body region"""
+    cloth_h, cloth_w = garment['cloth'].shape[:2]
+    scale = max(target_w / cloth_w, target_h / cloth_h) * 1.3
+    return int(cloth_w * scale), int(cloth_h * scale)
+
+
+def time_ms(fn, iterations: int) -> float:
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Garment resize microbenchmark")
+    parser.add_argument("--garment-sizes", nargs="+", default=["400x500", "1200x1500", "2400x3000"])
+    parser.add_argument("--targets", nargs="+", default=["120x160", "240x320", "480x640"])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'garment':>10} {'resize to':>10} {'lanczos4 ms':>12} {'pyramid ms':>11} "
+          f"{'speedup':>8} {'lanczos4 err':>13} {'pyramid err':>12}")
+    for garment_size in args.garment_sizes:
+        img = make_garment(*parse_size(garment_size))
+        start = time.perf_counter()
+        garment = prepare_garment(img)
+        prepare_ms = (time.perf_counter() - start) * 1000
+
+        for target in args.targets:
+            width, height = warp_size(garment, *parse_size(target))
+
+            def lanczos():
+                cv2.resize(garment['cloth'], (width, height), interpolation=cv2.INTER_LANCZOS4)
+                cv2.resize(garment['alpha'], (width, height), interpolation=cv2.INTER_LINEAR)
+
+            def pyramid():
+                resize_garment(garment, width, height)
+
+            lanczos_ms = time_ms(lanczos, args.iterations)
+            pyramid_ms = time_ms(pyramid, args.iterations)
+            reference = cv2.resize(garment['cloth'], (width, height),
+                                   interpolation=cv2.INTER_AREA).astype(np.float32)
+            lanczos_err = np.abs(cv2.resize(garment['cloth'], (width, height),
+                                            interpolation=cv2.INTER_LANCZOS4) - reference).mean()
+            pyramid_err = np.abs(resize_garment(garment, width, height)[0] - reference).mean()
+            print(f"{garment_size:>10} {f'{width}x{height}':>10} {lanczos_ms:12.2f} {pyramid_ms:11.2f} "
+                  f"{lanczos_ms / pyramid_ms:7.1f}x {lanczos_err:13.2f} {pyramid_err:12.2f}")
+
+        print(f"{garment_size:>10} prepare (matte + {len(garment['pyramid'])} levels, once per garment): "
+              f"{prepare_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+VITON inference benchmarks
+
+Usage:
+    python benchmark_viton.py backends [--weights models/viton_weights.pth]
+    python benchmark_viton.py cpu [--batch-sizes 1 4 8] [--threads 4]
+    python benchmark_viton.py quantization [--engine x86] [--calibration-images 32]
+    python benchmark_viton.py memory [--workers 4]
+
+backends: checks that the onnxruntime backend matches eager PyTorch
+          (parity) and compares per-batch latency of the two.
+cpu:      images/s of plain eager PyTorch against the CPU performance mode
+          (inference_mode + channels_last, eager / traced / compiled).
+quantization: FP32 vs static INT8 speed, and output quality (PSNR/SSIM of
+          INT8 against FP32) on local calibration images.
+memory:   per-worker RSS/PSS with N processes loading the same weights,
+          memory-mapped vs read into private memory, plus cold-start times.
+
+Without --weights a randomly initialised VITONModel is used, which is enough
+for parity and timing.
+"""
+import argparse
+import multiprocessing
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from app.core.config import settings
+from app.services.ml.viton_service import VITONModel, VITONService
+from app.services.ml.viton_backends import (
+    INPUT_SIZE, TorchBackend, configure_torch_threads, create_backend
+)
+from app.services.ml.viton_quantization import build_calibration_set, quantize_static
+
+
+def load_model(weights: str = None) -> VITONModel:
+    """VITONModel in eval mode on CPU, with weights if given"""
+    model = VITONModel()
+    if weights:
+        checkpoint = torch.load(weights, map_location="cpu")
+        model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model
+
+
+def make_inputs(batch_size: int, seed: int = 0):
+    """Random inputs in the model's [-1, 1] range"""
+    generator = torch.Generator().manual_seed(seed)
+    person = torch.rand(batch_size, 3, *INPUT_SIZE, generator=generator) * 2 - 1
+    cloth = torch.rand(batch_size, 3, *INPUT_SIZE, generator=generator) * 2 - 1
+    return person, cloth
+
+
+def time_backend(backend, batch_size: int, iterations: int, warmup: int = 3) -> dict:
+    """Median and p90 latency per batch, plus throughput"""
+    person, cloth = make_inputs(batch_size)
+    for _ in range(warmup):
+        backend.run(person, cloth)
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        backend.run(person, cloth)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        'median_ms': median * 1000,
+        'p90_ms': timings[int(0.9 * (len(timings) - 1))] * 1000,
+        'images_per_s': batch_size / median
+    }
+
+
+def run_backends(args) -> None:
+    model = load_model(args.weights)
+    torch_backend = TorchBackend(model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ort_backend = create_backend("onnxruntime", model, onnx_path=str(Path(tmp) / "viton.onnx"))
+
+        # Parity against eager PyTorch
+        person, cloth = make_inputs(args.batch_size, seed=1)
+        expected = torch_backend.run(person, cloth)
+        actual = ort_backend.run(person, cloth)
+        max_diff = (expected - actual).abs().max().item()
+        status = "OK" if max_diff <= args.tolerance else "FAIL"
+        print(f"Parity (onnxruntime vs torch): max abs diff {max_diff:.2e} "
+              f"[{status}, tolerance {args.tolerance:.0e}]")
+
+        print(f"\nLatency, batch size {args.batch_size}, {args.iterations} iterations:")
+        for backend in (torch_backend, ort_backend):
+            result = time_backend(backend, args.batch_size, args.iterations)
+            print(f"  {backend.name:12s} median {result['median_ms']:8.2f} ms  "
+                  f"p90 {result['p90_ms']:8.2f} ms  {result['images_per_s']:7.2f} img/s")
+
+    if status == "FAIL":
+        raise SystemExit(1)
+
+
+class PlainEagerBackend:
+    """Baseline: the original no_grad forward with default memory format"""
+    name = "eager"
+
+    def __init__(self, model: VITONModel):
+        self.model = model
+
+    def run(self, person: torch.Tensor, cloth: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(person, cloth)
+
+
+def run_cpu(args) -> None:
+    configure_torch_threads(args.threads, args.interop_threads)
+    print(f"PyTorch {torch.__version__}, {torch.get_num_threads()} intra-op threads")
+
+    variants = [
+        ("eager (baseline)", lambda: PlainEagerBackend(load_model(args.weights))),
+        ("cpu mode", lambda: TorchBackend(load_model(args.weights), channels_last=True)),
+        ("cpu mode + trace", lambda: TorchBackend(load_model(args.weights), channels_last=True,
+                                                  compile_mode="trace")),
+    ]
+    if args.compile:
+        variants.append(("cpu mode + compile", lambda: TorchBackend(
+            load_model(args.weights), channels_last=True, compile_mode="compile"
+        )))
+
+    for name, build in variants:
+        start = time.perf_counter()
+        backend = build()
+        load_s = time.perf_counter() - start
+        results = [
+            f"b{batch_size}: {time_backend(backend, batch_size, args.iterations)['images_per_s']:7.2f}"
+            for batch_size in args.batch_sizes
+        ]
+        print(f"  {name:20s} load {load_s:6.2f}s  images/s  " + "  ".join(results))
+
+
+def to_image(tensor: torch.Tensor) -> np.ndarray:
+    """Model output (3,H,W) in [-1, 1] -> (H,W,3) float in [0, 255]"""
+    return ((tensor.permute(1, 2, 0).numpy() + 1) * 127.5).clip(0, 255)
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a - b) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean SSIM over channels (Gaussian window, sigma 1.5)"""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    blur = lambda x: cv2.GaussianBlur(x, (11, 11), 1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a ** 2
+    var_b = blur(b * b) - mu_b ** 2
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / (
+        (mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2)
+    )
+    return float(ssim_map.mean())
+
+
+def preprocess(img: np.ndarray) -> torch.Tensor:
+    """Same transform as VITONService.preprocess_person, on CPU"""
+    img = cv2.resize(img, (INPUT_SIZE[1], INPUT_SIZE[0])).astype(np.float32) / 127.5 - 1
+    return torch.from_numpy(img).permute(2, 0, 1).unsqueeze(0)
+
+
+def run_quantization(args) -> None:
+    configure_torch_threads(args.threads, 0)
+    print(f"PyTorch {torch.__version__}, {torch.get_num_threads()} intra-op threads, "
+          f"engine {args.engine}")
+
+    calibration = build_calibration_set(preprocess, limit=args.calibration_images)
+    fp32 = TorchBackend(load_model(args.weights))
+
+    start = time.perf_counter()
+    int8 = TorchBackend(quantize_static(load_model(args.weights), calibration, engine=args.engine))
+    print(f"Quantized in {time.perf_counter() - start:.2f}s "
+          f"({len(calibration)} calibration pairs)")
+
+    # Quality of INT8 against the FP32 output on the calibration images
+    psnrs, ssims = [], []
+    for person, cloth in calibration:
+        expected = to_image(fp32.run(person, cloth)[0])
+        actual = to_image(int8.run(person, cloth)[0])
+        psnrs.append(psnr(expected, actual))
+        ssims.append(ssim(expected, actual))
+    print(f"INT8 vs FP32: PSNR {statistics.mean(psnrs):.2f} dB (min {min(psnrs):.2f}), "
+          f"SSIM {statistics.mean(ssims):.4f} (min {min(ssims):.4f})")
+
+    for batch_size in args.batch_sizes:
+        base = time_backend(fp32, batch_size, args.iterations)
+        quant = time_backend(int8, batch_size, args.iterations)
+        print(f"  b{batch_size}: fp32 {base['median_ms']:8.2f} ms  int8 {quant['median_ms']:8.2f} ms  "
+              f"speedup {base['median_ms'] / quant['median_ms']:.2f}x")
+
+
+def read_memory() -> dict:
+    """RSS and PSS of this process in MB (Linux /proc/self/smaps_rollup)"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+
+def memory_worker(weights: str, mmap: bool, ready, done, results) -> None:
+    settings.VITON_MMAP_WEIGHTS = mmap
+    settings.VITON_CPU_MODE = True
+    settings.VITON_CHANNELS_LAST = False  # Repacking weights would un-share the mapped pages
+    settings.VITON_BATCHING_ENABLED = False
+    service = VITONService(weights)
+    cold_start = service.warmup()
+    ready.wait()  # Measure once every worker holds its model
+    results.put({**read_memory(), **cold_start})
+    done.wait()
+
+
+def run_memory(args) -> None:
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = args.weights
+        if not weights:
+            weights = str(Path(tmp) / "viton_weights.pth")
+            torch.save({'model_state_dict': load_model().state_dict()}, weights)
+        print(f"Weights: {weights} ({Path(weights).stat().st_size / 1e6:.1f} MB), "
+              f"{args.workers} workers")
+
+        for mmap in (False, True):
+            ready = context.Barrier(args.workers + 1)
+            done = context.Event()
+            results = context.Queue()
+            workers = [
+                context.Process(target=memory_worker, args=(weights, mmap, ready, done, results))
+                for _ in range(args.workers)
+            ]
+            for worker in workers:
+                worker.start()
+            ready.wait()
+            samples = [results.get() for _ in workers]
+            done.set()
+            for worker in workers:
+                worker.join()
+
+            print(f"  {'mmap' if mmap else 'read':5s} "
+                  f"RSS/worker {statistics.mean(s['rss'] for s in samples):8.1f} MB  "
+                  f"PSS/worker {statistics.mean(s['pss'] for s in samples):8.1f} MB  "
+                  f"load {statistics.mean(s['load_seconds'] for s in samples):6.3f}s  "
+                  f"first inference {statistics.mean(s['first_inference_seconds'] for s in samples):6.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VITON inference benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backends = subparsers.add_parser("backends", help="Parity and latency: torch vs onnxruntime")
+    backends.add_argument("--weights", help="VITON checkpoint (random weights if omitted)")
+    backends.add_argument("--batch-size", type=int, default=1)
+    backends.add_argument("--iterations", type=int, default=20)
+    backends.add_argument("--tolerance", type=float, default=1e-4)
+    backends.set_defaults(func=run_backends)
+
+    cpu = subparsers.add_parser("cpu", help="Images/s of the CPU performance mode")
+    cpu.add_argument("--weights", help="VITON checkpoint (random weights if omitted)")
+    cpu.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    cpu.add_argument("--iterations", type=int, default=10)
+    cpu.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = default)")
+    cpu.add_argument("--interop-threads", type=int, default=0)
+    cpu.add_argument("--compile", action="store_true", help="Also benchmark torch.compile")
+    cpu.set_defaults(func=run_cpu)
+
+    quantization = subparsers.add_parser("quantization", help="FP32 vs static INT8 speed and quality")
+    quantization.add_argument("--weights", help="VITON checkpoint (random weights if omitted)")
+    quantization.add_argument("--engine", default="x86", help="Quantized kernel backend")
+    quantization.add_argument("--calibration-images", type=int, default=32)
+    quantization.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    quantization.add_argument("--iterations", type=int, default=10)
+    quantization.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = default)")
+    quantization.set_defaults(func=run_quantization)
+
+    memory = subparsers.add_parser("memory", help="Per-worker memory with memory-mapped weights")
+    memory.add_argument("--weights", help="VITON checkpoint (random weights if omitted)")
+    memory.add_argument("--workers", type=int, default=4)
+    memory.set_defaults(func=run_memory)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
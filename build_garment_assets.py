@@ -0,0 +1,31 @@
+"""
+Build garment image derivatives (thumbnails, WebP, working sizes)
+
+Usage:
+    python build_garment_assets.py [--force]
+
+Unchanged garments are skipped; derivatives of changed or removed images are
+deleted. The server also runs this incrementally at startup when
+GARMENT_BUILD_ON_STARTUP is set.
+"""
+import argparse
+import logging
+
+from app.services.garment_assets import build_derivatives
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build garment image derivatives")
+    parser.add_argument("--clothes-dir", help="Catalog directory (defaults to CLOTHES_DIR)")
+    parser.add_argument("--output-dir", help="Derivative directory (defaults to GARMENT_DERIVATIVES_DIR)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every garment")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    stats = build_derivatives(args.clothes_dir, args.output_dir, force=args.force)
+    print(f"Built {stats['built']}, skipped {stats['skipped']}, "
+          f"failed {stats['failed']}, removed {stats['removed']} stale files")
+
+
+if __name__ == "__main__":
+    main()
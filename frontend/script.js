@@ -7,6 +7,15 @@ let userImage = null;
 let selectedCloth = null;
 let selectedSize = null;
 let clothData = [];
+let customClothes = [];
+// Gallery pagination: pages are fetched as the user scrolls to the end of the grid
+let catalogCategory = 'all';
+let catalogPage = 0;
+let catalogLoaded = 0;
+let catalogTotal = null;
+let catalogLoading = false;
+let catalogGeneration = 0;
+let clothPageObserver = null;
 let currentViewMode = 'compare';
 let cameraStream = null;
 let livePreviewEnabled = false;
@@ -190,29 +199,87 @@ function initializeClothSelection() {
     // Custom cloth upload
     customClothBtn.addEventListener('click', () => customClothInput.click());
     customClothInput.addEventListener('change', handleCustomCloth);
+
+    // Load the next catalog page when the end of the grid scrolls into view
+    const sentinel = document.createElement('div');
+    sentinel.className = 'cloth-grid-sentinel';
+    clothGrid.after(sentinel);
+    clothPageObserver = new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextClothPage();
+        }
+    }, { rootMargin: '400px' });
+    clothPageObserver.observe(sentinel);
+}
+
+async function loadClothData(category = 'all') {
+    // Start over; a page still loading for the previous category is ignored
+    catalogGeneration += 1;
+    catalogCategory = category;
+    catalogPage = 0;
+    catalogLoaded = 0;
+    catalogTotal = null;
+    catalogLoading = false;
+    clothData = category === 'all' ? [...customClothes] : [];
+    renderClothes(clothData);
+    await loadNextClothPage();
 }
 
-async function loadClothData() {
+async function loadNextClothPage() {
+    if (catalogLoading || (catalogTotal !== null && catalogLoaded >= catalogTotal)) {
+        return;
+    }
+    const generation = catalogGeneration;
+    catalogLoading = true;
     try {
-        const response = await fetch('/assets/clothes/clothes.json');
+        // Filtered and paginated server-side
+        const params = new URLSearchParams({ page: catalogPage + 1 });
+        if (catalogCategory !== 'all') {
+            params.set('category', catalogCategory);
+        }
+        const response = await fetch(`/api/v1/garments?${params}`);
         if (!response.ok) {
             throw new Error('Failed to load clothes data');
         }
-        clothData = await response.json();
-        console.log('Loaded clothes:', clothData.length);
-        renderClothes(clothData);
+        const catalog = await response.json();
+        if (generation !== catalogGeneration) {
+            return;
+        }
+        catalogPage = catalog.page;
+        catalogLoaded += catalog.items.length;
+        // An empty page means the catalog shrank under us: stop here
+        catalogTotal = catalog.items.length ? catalog.total : catalogLoaded;
+        clothData.push(...catalog.items);
+        appendClothes(catalog.items);
+        console.log('Loaded clothes:', catalogLoaded, 'of', catalogTotal);
     } catch (error) {
+        if (generation !== catalogGeneration) {
+            return;
+        }
         console.error('Error loading clothes:', error);
         showToast('Failed to load clothing items', 'error');
-        // Fallback to empty array
-        clothData = [];
-        renderClothes(clothData);
+        // Stop paging until the category is chosen again
+        catalogTotal = catalogLoaded;
+    } finally {
+        if (generation === catalogGeneration) {
+            catalogLoading = false;
+        }
+    }
+
+    // A short page may leave the sentinel in view; observing again re-checks it
+    if (generation === catalogGeneration && clothPageObserver) {
+        const sentinel = clothGrid.nextElementSibling;
+        clothPageObserver.unobserve(sentinel);
+        clothPageObserver.observe(sentinel);
     }
 }
 
 function renderClothes(clothes) {
     clothGrid.innerHTML = '';
-    
+    appendClothes(clothes);
+}
+
+function appendClothes(clothes) {
     clothes.forEach(cloth => {
         const item = document.createElement('div');
         item.className = 'cloth-item';
@@ -220,8 +287,10 @@ function renderClothes(clothes) {
         
         const genderBadge = cloth.gender ? `<span class="cloth-gender">${cloth.gender}</span>` : '';
         
-        // Handle both regular images and base64 data URLs
-        const imageSrc = cloth.image.startsWith('data:') ? cloth.image : `/assets/clothes/${cloth.image}`;
+        // Handle base64 data URLs, gallery thumbnails and full images
+        const imageSrc = cloth.image.startsWith('data:')
+            ? cloth.image
+            : (cloth.thumbnail || `/assets/clothes/${cloth.image}`);
         
         item.innerHTML = `
             <img src="${imageSrc}" alt="${cloth.name}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22250%22 height=%22250%22%3E%3Crect fill=%22%23f0f0f0%22 width=%22250%22 height=%22250%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22 font-size=%2220%22%3E${cloth.name}%3C/text%3E%3C/svg%3E'">
@@ -238,10 +307,7 @@ function renderClothes(clothes) {
 }
 
 function filterClothes(category) {
-    const filtered = category === 'all' 
-        ? clothData 
-        : clothData.filter(c => c.category === category);
-    renderClothes(filtered);
+    loadClothData(category);
 }
 
 function selectCloth(cloth, element) {
@@ -297,6 +363,7 @@ function handleCustomCloth(e) {
             };
             
             // Add to grid
+            customClothes.unshift(customCloth);
             clothData.unshift(customCloth);
             renderClothes(clothData);
             
@@ -328,28 +395,11 @@ async function processTryOn() {
         const formData = new FormData();
         formData.append('user_image', userImage);
         
-        // Get cloth image
+        // Get cloth image (catalog garments are resolved server-side by id)
         if (selectedCloth.file) {
             formData.append('cloth_image', selectedCloth.file);
         } else {
-            // Fetch cloth image from URL
-            const response = await fetch(selectedCloth.image);
-            
-            // Check if fetch was successful
-            if (!response.ok) {
-                throw new Error(`Failed to load clothing image: ${selectedCloth.name}. Please ensure the image file exists.`);
-            }
-            
-            const clothBlob = await response.blob();
-            
-            // Verify it's actually an image
-            if (!clothBlob.type.startsWith('image/')) {
-                throw new Error(`Invalid image file for: ${selectedCloth.name}. Got ${clothBlob.type} instead of image.`);
-            }
-            
-            // Get proper extension from URL
-            const ext = selectedCloth.image.split('.').pop().split('?')[0] || 'png';
-            formData.append('cloth_image', clothBlob, `cloth.${ext}`);
+            formData.append('garment_id', selectedCloth.id);
         }
         
         // Add use_api as form field
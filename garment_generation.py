@@ -0,0 +1,172 @@
+"""
+Shared runner for the synthetic garment generators
+
+generate_better_clothes.py and generate_placeholder_images.py describe each
+garment as parameters (file, name, colour, type) and a render function. This
+module renders them across a process pool, skips outputs whose parameters
+have not changed since the last run (manifest of parameter hashes), and adds
+missing garments to clothes.json in one atomic write at the end.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+MANIFEST_NAME = ".generator_manifest.json"
+
+# Rendered garment type -> catalog category
+CATEGORY_ALIASES = {'gown': 'dress'}
+
+# (filename, display name, colour, garment type)
+GarmentSpec = Tuple[str, str, str, str]
+
+
+def parse_args(description: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--output-dir", default="frontend/assets/clothes")
+    parser.add_argument("--config", help="JSON list of [filename, name, colour, type] to render "
+                                         "instead of the built-in catalog")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Rendering processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-render every garment")
+    parser.add_argument("--no-catalog", action="store_true", help="Do not update clothes.json")
+    return parser.parse_args()
+
+
+def load_specs(default_specs: List[GarmentSpec], config_path: str = None) -> List[GarmentSpec]:
+    if not config_path:
+        return default_specs
+    with open(config_path, encoding="utf-8") as f:
+        return [tuple(spec) for spec in json.load(f)]
+
+
+def params_hash(generator: str, version: int, spec: GarmentSpec, size: Tuple[int, int]) -> str:
+    payload = json.dumps([generator, version, list(spec), list(size)])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _render_to_file(render: Callable, spec: GarmentSpec, output_path: str) -> str:
+    """Worker: render one garment and move it into place atomically"""
+    img = render(*spec)
+    tmp_path = f"{output_path}.tmp"
+    img.save(tmp_path, 'PNG')
+    os.replace(tmp_path, output_path)
+    return spec[0]
+
+
+def update_catalog(catalog_path: Path, specs: List[GarmentSpec]) -> int:
+    """
+    Add garments missing from clothes.json (existing entries are kept as-is)
+
+    Returns:
+        Number of garments added
+
+    Raises:
+        ValueError: If clothes.json exists but is not valid JSON (it is left untouched)
+    """
+    try:
+        catalog = json.loads(catalog_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        catalog = []
+    except ValueError as e:
+        # Never replace a curated catalog that is mid-edit or corrupt
+        raise ValueError(f"{catalog_path} is not valid JSON, not updating it: {e}") from e
+
+    known = {item.get('image') for item in catalog}
+    next_id = max((item['id'] for item in catalog if isinstance(item.get('id'), int)), default=0) + 1
+    added = 0
+    for filename, name, _, clothing_type in specs:
+        if filename in known:
+            continue
+        name = name.replace("\n", " ")
+        catalog.append({
+            'id': next_id,
+            'name': name,
+            'category': CATEGORY_ALIASES.get(clothing_type, clothing_type),
+            'image': filename,
+            'description': name
+        })
+        known.add(filename)
+        next_id += 1
+        added += 1
+
+    if added:
+        _write_json_atomic(catalog_path, catalog)
+    return added
+
+
+def run(generator: str, version: int, render: Callable, specs: List[GarmentSpec],
+        size: Tuple[int, int], args: argparse.Namespace) -> Dict:
+    """
+    Render changed garments in parallel, then update the manifest and catalog
+
+    Args:
+        generator: Generator name, part of each parameter hash
+        version: Bump when the render function changes to re-render everything
+        render: Module-level function(filename, name, colour, type) -> PIL image
+        specs: Garments to render
+        size: Output image size, part of each parameter hash
+        args: Parsed CLI arguments (see parse_args)
+
+    Returns:
+        Dictionary with rendered/skipped/failed counts
+    """
+    start = time.time()
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+
+    hashes = {spec[0]: params_hash(generator, version, spec, size) for spec in specs}
+    pending = [
+        spec for spec in specs
+        if args.force or manifest.get(spec[0]) != hashes[spec[0]]
+        or not (output_dir / spec[0]).exists()
+    ]
+    stats = {'rendered': 0, 'skipped': len(specs) - len(pending), 'failed': 0}
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers or 1)) as pool:
+            futures = {
+                pool.submit(_render_to_file, render, spec, str(output_dir / spec[0])): spec
+                for spec in pending
+            }
+            for future in as_completed(futures):
+                filename = futures[future][0]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Failed: {filename}: {e}")
+                    stats['failed'] += 1
+                    continue
+                manifest[filename] = hashes[filename]
+                stats['rendered'] += 1
+                print(f"Created: {filename}")
+
+        _write_json_atomic(manifest_path, manifest)
+
+    if not args.no_catalog:
+        try:
+            added = update_catalog(output_dir / "clothes.json", specs)
+        except ValueError as e:
+            raise SystemExit(f"Error: {e}")
+        if added:
+            print(f"Added {added} garments to clothes.json")
+
+    print(f"\nRendered {stats['rendered']}, skipped {stats['skipped']} unchanged, "
+          f"failed {stats['failed']} in {time.time() - start:.1f}s")
+    return stats
@@ -1,12 +1,22 @@
 """
 Generate better quality clothing images with solid fills and realistic appearance
+
+Usage:
+    python generate_better_clothes.py [--workers N] [--force] [--config variants.json]
+
+Garments render in parallel; unchanged ones (same colour, type and size) are
+skipped. See garment_generation.py.
 """
 from PIL import Image, ImageDraw, ImageFont
-import os
+import garment_generation
+
+GENERATOR = "better_clothes"
+VERSION = 1  # Bump when create_realistic_clothing changes
+IMAGE_SIZE = (400, 500)
 
 def create_realistic_clothing(filename, text, base_color, clothing_type):
     """Create realistic clothing image with proper fills"""
-    width, height = 400, 500
+    width, height = IMAGE_SIZE
     
     # Create image with transparent background
     img = Image.new('RGBA', (width, height), (255, 255, 255, 0))
@@ -146,17 +156,16 @@ clothes_config = [
     ("tshirt2.png", "Graphic T-Shirt", "#2F4F4F", "tshirt"),
 ]
 
-# Create output directory
-output_dir = 'frontend/assets/clothes'
-os.makedirs(output_dir, exist_ok=True)
 
-print("Generating improved clothing images...")
-for filename, text, color, clothing_type in clothes_config:
-    output_path = os.path.join(output_dir, filename)
-    img = create_realistic_clothing(filename, text, color, clothing_type)
-    img.save(output_path, 'PNG', quality=95)
-    print(f"Created: {filename}")
+def main():
+    args = garment_generation.parse_args("Generate improved clothing images")
+    specs = garment_generation.load_specs(clothes_config, args.config)
+    
+    print("Generating improved clothing images...")
+    garment_generation.run(GENERATOR, VERSION, create_realistic_clothing, specs, IMAGE_SIZE, args)
+
 
-print(f"\nSuccessfully generated {len(clothes_config)} improved clothing images!")
+if __name__ == "__main__":
+    main()
 
 # Made with Bob
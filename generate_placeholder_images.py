@@ -1,41 +1,51 @@
 """
 Generate placeholder clothing images with proper styling
+
+Usage:
+    python generate_placeholder_images.py [--workers N] [--force] [--config variants.json]
+
+Garments render in parallel; unchanged ones (same colour, type and size) are
+skipped. See garment_generation.py.
 """
 from PIL import Image, ImageDraw, ImageFont
-import os
+import garment_generation
 
-# Clothing items configuration
+GENERATOR = "placeholder"
+VERSION = 1  # Bump when create_clothing_image changes
+IMAGE_SIZE = (400, 500)
+
+# Clothing items configuration: (filename, label, colour, type)
 clothes = [
-    ("dress1.png", "Black Evening\nDress", "#000000"),
-    ("dress2.png", "Summer Floral\nDress", "#FFB6C1"),
-    ("dress3.png", "Red A-Line\nDress", "#DC143C"),
-    ("dress4.png", "Blue Maxi\nDress", "#4169E1"),
-    ("dress5.png", "Pink Cocktail\nDress", "#FF69B4"),
-    ("dress6.png", "White Lace\nDress", "#FFFFFF"),
-    ("dress7.png", "Navy Formal\nDress", "#000080"),
-    ("dress8.png", "Green Wrap\nDress", "#228B22"),
-    ("dress9.png", "Yellow\nSundress", "#FFD700"),
-    ("dress10.png", "Purple Evening\nGown", "#9370DB"),
-    ("dress11.png", "Floral Midi\nDress", "#FF1493"),
-    ("dress12.png", "Coral Summer\nDress", "#FF7F50"),
-    ("dress13.png", "Burgundy\nEvening Gown", "#800020"),
-    ("dress14.png", "Mint Green\nMidi Dress", "#98FF98"),
-    ("dress15.png", "Peach Cocktail\nDress", "#FFDAB9"),
-    ("jacket1.png", "Denim\nJacket", "#4682B4"),
-    ("jacket2.png", "Leather\nJacket", "#2F4F4F"),
-    ("blazer1.png", "Black\nBlazer", "#1C1C1C"),
-    ("blouse1.png", "Casual\nBlouse", "#87CEEB"),
-    ("top1.png", "Silk\nTop", "#F5F5DC"),
-    ("shirt1.png", "Classic\nShirt", "#DC143C"),
-    ("shirt2.png", "Casual\nShirt", "#228B22"),
-    ("tshirt1.png", "Cotton\nT-Shirt", "#4169E1"),
-    ("tshirt2.png", "Graphic\nT-Shirt", "#000000"),
+    ("dress1.png", "Black Evening\nDress", "#000000", "dress"),
+    ("dress2.png", "Summer Floral\nDress", "#FFB6C1", "dress"),
+    ("dress3.png", "Red A-Line\nDress", "#DC143C", "dress"),
+    ("dress4.png", "Blue Maxi\nDress", "#4169E1", "dress"),
+    ("dress5.png", "Pink Cocktail\nDress", "#FF69B4", "dress"),
+    ("dress6.png", "White Lace\nDress", "#FFFFFF", "dress"),
+    ("dress7.png", "Navy Formal\nDress", "#000080", "dress"),
+    ("dress8.png", "Green Wrap\nDress", "#228B22", "dress"),
+    ("dress9.png", "Yellow\nSundress", "#FFD700", "dress"),
+    ("dress10.png", "Purple Evening\nGown", "#9370DB", "dress"),
+    ("dress11.png", "Floral Midi\nDress", "#FF1493", "dress"),
+    ("dress12.png", "Coral Summer\nDress", "#FF7F50", "dress"),
+    ("dress13.png", "Burgundy\nEvening Gown", "#800020", "dress"),
+    ("dress14.png", "Mint Green\nMidi Dress", "#98FF98", "dress"),
+    ("dress15.png", "Peach Cocktail\nDress", "#FFDAB9", "dress"),
+    ("jacket1.png", "Denim\nJacket", "#4682B4", "jacket"),
+    ("jacket2.png", "Leather\nJacket", "#2F4F4F", "jacket"),
+    ("blazer1.png", "Black\nBlazer", "#1C1C1C", "blazer"),
+    ("blouse1.png", "Casual\nBlouse", "#87CEEB", "blouse"),
+    ("top1.png", "Silk\nTop", "#F5F5DC", "top"),
+    ("shirt1.png", "Classic\nShirt", "#DC143C", "shirt"),
+    ("shirt2.png", "Casual\nShirt", "#228B22", "shirt"),
+    ("tshirt1.png", "Cotton\nT-Shirt", "#4169E1", "tshirt"),
+    ("tshirt2.png", "Graphic\nT-Shirt", "#000000", "tshirt"),
 ]
 
 def create_clothing_image(filename, text, color):
     """Create a stylized clothing placeholder image"""
     # Create image
-    width, height = 400, 500
+    width, height = IMAGE_SIZE
     img = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(img)
     
@@ -103,19 +113,22 @@ def create_clothing_image(filename, text, color):
     
     return img
 
-# Create output directory
-output_dir = 'frontend/assets/clothes'
-os.makedirs(output_dir, exist_ok=True)
 
-# Generate all images
-print("Generating clothing placeholder images...")
-for filename, text, color in clothes:
-    output_path = os.path.join(output_dir, filename)
-    img = create_clothing_image(filename, text, color)
-    img.save(output_path, 'PNG')
-    print(f"Created: {filename}")
+def render_placeholder(filename, text, color, clothing_type):
+    """Pool entry point; the shape is chosen from the filename"""
+    return create_clothing_image(filename, text, color)
+
+
+def main():
+    args = garment_generation.parse_args("Generate clothing placeholder images")
+    specs = garment_generation.load_specs(clothes, args.config)
+    
+    print("Generating clothing placeholder images...")
+    garment_generation.run(GENERATOR, VERSION, render_placeholder, specs, IMAGE_SIZE, args)
+    print(f"Images saved to: {args.output_dir}")
+
 
-print(f"\nSuccessfully generated {len(clothes)} clothing images!")
-print(f"Images saved to: {output_dir}")
+if __name__ == "__main__":
+    main()
 
 # Made with Bob
@@ -0,0 +1,36 @@
+"""
+Shared test fixtures
+"""
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """TestClient for the app, run from the repository root with uploads and results in tmp_path"""
+    monkeypatch.chdir(ROOT)
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+    from app.main import app
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "RESULTS_DIR", str(tmp_path / "results"))
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def tryon_files():
+    """Multipart files for a try-on request: a plain photo and a catalog garment"""
+    _, person = cv2.imencode('.jpg', np.full((640, 480, 3), 180, np.uint8))
+    cloth = (ROOT / "frontend/assets/clothes/dress1.png").read_bytes()
+    return {
+        'user_image': ('person.jpg', person.tobytes(), 'image/jpeg'),
+        'cloth_image': ('cloth.png', cloth, 'image/png'),
+    }
@@ -0,0 +1,149 @@
+"""
+HedgedExecutor: head start, fallback, quality/fastest preference, deadline
+and discard of the losing branch
+"""
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.services.ml.hedging import HedgedExecutor
+
+
+@pytest.fixture(autouse=True)
+def short_min_delay(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY", 0.01)
+
+
+def executor(**kwargs) -> HedgedExecutor:
+    # A fresh provider name keeps latency history from other tests out of the hedge delay
+    return HedgedExecutor(f"test-{uuid.uuid4().hex[:8]}", **kwargs)
+
+
+def sleeper(seconds: float, value):
+    def run():
+        time.sleep(seconds)
+        return value
+    return run
+
+
+def failing(message: str, seconds: float = 0.0):
+    def run():
+        time.sleep(seconds)
+        raise RuntimeError(message)
+    return run
+
+
+def test_fast_remote_wins_without_starting_local():
+    local_started = threading.Event()
+
+    def local():
+        local_started.set()
+        return "local"
+
+    outcome = asyncio.run(executor(hedge_delay=0.5).run(lambda: "remote", local))
+
+    assert outcome['branch'] == "remote"
+    assert outcome['result'] == "remote"
+    assert outcome['hedged'] is False
+    assert not local_started.is_set()
+
+
+def test_remote_failure_before_delay_falls_back_to_local():
+    outcome = asyncio.run(executor(hedge_delay=1.0).run(failing("down"), lambda: "local"))
+
+    assert outcome['branch'] == "local"
+    assert outcome['hedged'] is True
+
+
+def test_quality_waits_for_slow_remote_and_discards_local():
+    discarded = []
+    outcome = asyncio.run(
+        executor(hedge_delay=0.05, deadline=2.0, preference="quality").run(
+            sleeper(0.3, "remote"), sleeper(0.05, "local"),
+            on_discard=lambda branch, value: discarded.append((branch, value))
+        )
+    )
+
+    assert outcome['branch'] == "remote"
+    assert outcome['hedged'] is True
+    assert discarded == [("local", "local")]
+
+
+def test_fastest_takes_local_and_discards_remote_when_it_finishes():
+    discarded = threading.Event()
+    seen = []
+
+    def on_discard(branch, value):
+        seen.append((branch, value))
+        discarded.set()
+
+    outcome = asyncio.run(
+        executor(hedge_delay=0.05, deadline=2.0, preference="fastest").run(
+            sleeper(0.3, "remote"), sleeper(0.05, "local"), on_discard=on_discard
+        )
+    )
+
+    assert outcome['branch'] == "local"
+    assert discarded.wait(2.0)
+    assert seen == [("remote", "remote")]
+
+
+def test_deadline_abandons_remote_for_local():
+    start = time.perf_counter()
+    outcome = asyncio.run(
+        executor(hedge_delay=0.05, deadline=0.2, preference="quality").run(
+            sleeper(1.0, "remote"), sleeper(0.05, "local")
+        )
+    )
+
+    assert outcome['branch'] == "local"
+    assert time.perf_counter() - start < 0.8
+
+
+def test_local_floor_is_awaited_past_the_deadline():
+    outcome = asyncio.run(
+        executor(hedge_delay=0.02, deadline=0.1).run(sleeper(1.0, "remote"), sleeper(0.3, "local"))
+    )
+
+    assert outcome['branch'] == "local"
+    assert outcome['result'] == "local"
+
+
+def test_both_branches_failing_raises_the_local_error():
+    with pytest.raises(RuntimeError, match="local broke"):
+        asyncio.run(executor(hedge_delay=0.02).run(failing("down"), failing("local broke")))
+
+
+def test_settled_waits_for_the_losing_branch():
+    settled = threading.Event()
+    remote_done = threading.Event()
+
+    def remote():
+        time.sleep(0.3)
+        remote_done.set()
+        return "remote"
+
+    outcome = asyncio.run(
+        executor(hedge_delay=0.05, deadline=2.0, preference="fastest").run(
+            remote, sleeper(0.05, "local"), on_settled=settled.set
+        )
+    )
+
+    assert outcome['branch'] == "local"
+    assert not settled.is_set()
+    assert settled.wait(2.0)
+    assert remote_done.is_set()
+
+
+def test_settled_called_once_when_no_branch_is_left_running():
+    calls = []
+
+    asyncio.run(executor(hedge_delay=0.5).run(
+        lambda: "remote", lambda: "local", on_settled=lambda: calls.append(1)
+    ))
+
+    assert calls == [1]
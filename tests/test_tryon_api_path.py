@@ -0,0 +1,40 @@
+"""
+Try-on requests served through the API provider path (mock provider)
+"""
+import pytest
+
+from app.core.config import settings
+
+PIPELINE_STAGES = {'pose', 'region', 'prepare', 'warp', 'lighting', 'blend'}
+
+
+@pytest.mark.parametrize("hedge_enabled", [True, False])
+def test_api_request_reports_pipeline_stages(client, tryon_files, monkeypatch, hedge_enabled):
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", hedge_enabled)
+    response = client.post("/api/v1/tryon/process", files=tryon_files, data={'use_api': 'true'})
+
+    assert response.status_code == 200
+    timings = response.json()['metadata']['timings']
+    assert PIPELINE_STAGES <= set(timings)
+    assert 'api' in timings
+    for name in PIPELINE_STAGES:
+        assert f"{name};dur=" in response.headers['Server-Timing']
+
+
+def test_hedged_request_traces_pipeline_spans(client, tryon_files, monkeypatch):
+    from app.core import tracing
+    records = []
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "export", records.append)
+
+    response = client.post("/api/v1/tryon/process", files=tryon_files, data={'use_api': 'true'})
+
+    assert response.status_code == 200
+    trace = next(record for record in records if record['type'] == 'trace')
+    spans = {span['name']: span for span in trace['spans']}
+    assert PIPELINE_STAGES <= set(spans)
+    # Branch spans nest under the endpoint's "api" stage
+    assert spans['pose']['parent_id'] == spans['api']['span_id']
+    assert 'pose_tier' in spans['pose']['attributes']